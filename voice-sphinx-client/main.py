@@ -256,6 +256,12 @@ class VoiceSphinxClient:
     def _process_audio(self, audio_data: bytes) -> None:
         """Обработка записанного аудио"""
         try:
+            if getattr(self.config, 'stream_results', False):
+                # Вставляем сегменты по мере их распознавания сервером
+                self.text_inserter.begin_segments()
+                self.api_client.transcribe_audio_stream(audio_data, self.text_inserter.insert_segment)
+                return
+
             # Отправляем аудио на сервер
             text = self.api_client.transcribe_audio(audio_data)
             if text:
@@ -289,6 +295,8 @@ class Config:
         # Серверные настройки
         server_config = config_data.get('server', {})
         self.server_url = server_config.get('url', "http://localhost:8000/transcribe")
+        self.stream_results = server_config.get('stream_results', False)
+        self.language_session = server_config.get('language_session', False)
         
         # Аудио настройки
         audio_config = config_data.get('audio', {})
@@ -300,6 +308,8 @@ class Config:
         self.max_recording_time = audio_config.get('max_recording_time', 30.0)
         self.gain = audio_config.get('gain', 10.0)
         self.min_speech_level = audio_config.get('min_speech_level', 0.008)
+        self.transport_format = audio_config.get('transport_format', 'wav')
+        self.opus_bitrate = audio_config.get('opus_bitrate', 24000)
         
         # Горячие клавиши
         hotkeys_config = config_data.get('hotkeys', {})
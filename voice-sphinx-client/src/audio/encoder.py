@@ -0,0 +1,84 @@
+import io
+import time
+import wave
+import numpy as np
+from typing import Tuple
+from loguru import logger
+
+# Поддерживаемые форматы передачи аудио на сервер
+SUPPORTED_FORMATS = ("wav", "flac", "opus")
+
+# MIME-типы и имена файлов для загрузки
+FORMAT_MIME_TYPES = {
+    "wav": ("audio.wav", "audio/wav"),
+    "flac": ("audio.flac", "audio/flac"),
+    "opus": ("audio.opus", "audio/ogg"),
+}
+
+# Диапазон битрейта Opus, на который libsndfile отображает уровень сжатия 0.0-1.0
+OPUS_MAX_BITRATE = 256000
+OPUS_MIN_BITRATE = 6000
+
+def detect_audio_format(data: bytes) -> str:
+    """Определение формата аудио по сигнатуре"""
+    if data[:4] == b"fLaC":
+        return "flac"
+    if data[:4] == b"OggS":
+        return "opus"
+    return "wav"
+
+def _encode_wav(audio_int16: np.ndarray, sample_rate: int, channels: int) -> bytes:
+    """Кодирование в несжатый 16-битный WAV"""
+    wav_io = io.BytesIO()
+    with wave.open(wav_io, 'wb') as wav_file:
+        wav_file.setnchannels(channels)
+        wav_file.setsampwidth(2)  # 16 bit
+        wav_file.setframerate(sample_rate)
+        wav_file.writeframes(audio_int16.tobytes())
+    return wav_io.getvalue()
+
+def _encode_compressed(audio_int16: np.ndarray, sample_rate: int, fmt: str, opus_bitrate: int) -> bytes:
+    """Кодирование в FLAC или Ogg/Opus через libsndfile"""
+    import soundfile as sf
+
+    buffer = io.BytesIO()
+    if fmt == "flac":
+        sf.write(buffer, audio_int16, sample_rate, format='FLAC', subtype='PCM_16')
+    else:
+        # libsndfile задает битрейт Opus через уровень сжатия (0.0 - максимальный битрейт)
+        level = (OPUS_MAX_BITRATE - opus_bitrate) / (OPUS_MAX_BITRATE - OPUS_MIN_BITRATE)
+        level = min(1.0, max(0.0, level))
+        try:
+            sf.write(buffer, audio_int16, sample_rate, format='OGG', subtype='OPUS', compression_level=level)
+        except TypeError:
+            # Старые версии soundfile не поддерживают compression_level
+            buffer = io.BytesIO()
+            sf.write(buffer, audio_int16, sample_rate, format='OGG', subtype='OPUS')
+    return buffer.getvalue()
+
+def encode_audio(audio_int16: np.ndarray, sample_rate: int, channels: int,
+                 fmt: str = "wav", opus_bitrate: int = 24000) -> Tuple[bytes, str]:
+    """Кодирование аудио для передачи на сервер.
+
+    Возвращает данные и фактический формат: при ошибке сжатия
+    используется WAV.
+    """
+    if fmt not in SUPPORTED_FORMATS:
+        logger.warning(f"Неизвестный формат передачи '{fmt}', используется WAV")
+        fmt = "wav"
+
+    start_time = time.perf_counter()
+    if fmt != "wav":
+        try:
+            data = _encode_compressed(audio_int16, sample_rate, fmt, opus_bitrate)
+            elapsed_ms = (time.perf_counter() - start_time) * 1000
+            logger.info(f"Аудио закодировано в {fmt.upper()}: {len(data)} байт за {elapsed_ms:.1f} мс")
+            return data, fmt
+        except Exception as e:
+            logger.warning(f"Не удалось закодировать аудио в {fmt.upper()}, используется WAV: {e}")
+            start_time = time.perf_counter()
+
+    data = _encode_wav(audio_int16, sample_rate, channels)
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+    logger.info(f"Аудио закодировано в WAV: {len(data)} байт за {elapsed_ms:.1f} мс")
+    return data, "wav"
@@ -5,10 +5,10 @@ import numpy as np
 import sounddevice as sd
 import webrtcvad
 import wave
-from io import BytesIO
 from typing import Optional, List, Dict, Any
 from loguru import logger
 from utils.audio_utils import get_default_microphone, get_available_microphones
+from audio.encoder import encode_audio
 import logging
 
 # Подключаем путь к src для импортов
@@ -30,6 +30,10 @@ class AudioRecorder:
         self.device_id = config.audio_device
         self.gain = config.gain
         
+        # Формат передачи аудио на сервер
+        self.transport_format = getattr(config, 'transport_format', 'wav')
+        self.opus_bitrate = getattr(config, 'opus_bitrate', 24000)
+        
         # Параметры VAD
         self.vad_mode = getattr(config, 'vad_mode', 1)  # По умолчанию используем менее строгий режим
         self.logger.info(f"Инициализация VAD с режимом {self.vad_mode} (1-3, где 1 - менее строгий, 3 - самый строгий)")
@@ -239,7 +243,7 @@ class AudioRecorder:
             raise
 
     def stop_recording(self) -> Optional[bytes]:
-        """Остановка записи звука и возврат данных в формате WAV"""
+        """Остановка записи звука и возврат данных в формате передачи (WAV, FLAC или Opus)"""
         if not self.is_recording:
             return None
         
@@ -286,25 +290,16 @@ class AudioRecorder:
                 
             audio_int16 = (audio_array * 32767).astype(np.int16)
             
-            # Создаем WAV данные в памяти
-            wav_io = BytesIO()
-            
-            try:
-                with wave.open(wav_io, 'wb') as wav_file:
-                    wav_file.setnchannels(self.channels)
-                    wav_file.setsampwidth(2)  # 16 bit
-                    wav_file.setframerate(self.sample_rate)
-                    wav_file.writeframes(audio_int16.tobytes())
-                    
-                wav_data = wav_io.getvalue()
-                self.logger.info(f"Запись завершена успешно, размер данных: {len(wav_data)} байт")
-                return wav_data
-            finally:
-                # Убедимся, что BytesIO объект закрыт в любом случае
-                try:
-                    wav_io.close()
-                except Exception as e:
-                    self.logger.error(f"Ошибка при закрытии BytesIO: {e}")
+            # Кодируем в формат передачи (при ошибке сжатия - WAV)
+            audio_data, audio_format = encode_audio(
+                audio_int16,
+                self.sample_rate,
+                self.channels,
+                self.transport_format,
+                self.opus_bitrate
+            )
+            self.logger.info(f"Запись завершена успешно, размер данных: {len(audio_data)} байт ({audio_format})")
+            return audio_data
         except Exception as e:
             self.logger.error(f"Ошибка при остановке записи: {e}")
             self.is_recording = False
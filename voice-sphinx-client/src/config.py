@@ -13,7 +13,7 @@ class Config:
         
         # Устанавливаем значения по умолчанию
         self.config = {
-            "server": {"url": "http://localhost:8000/transcribe"},
+            "server": {"url": "http://localhost:8000/transcribe", "stream_results": False, "language_session": False},
             "audio": {
                 "sample_rate": 16000,
                 "channels": 1,
@@ -21,7 +21,9 @@ class Config:
                 "vad_mode": 3,
                 "silence_threshold": 1.0,
                 "max_recording_time": 30.0,
-                "gain": 5.0
+                "gain": 5.0,
+                "transport_format": "wav",
+                "opus_bitrate": 24000
             },
             "hotkeys": {
                 "record": ["alt", "win", "z"],
@@ -69,6 +71,30 @@ class Config:
             self.config['server'] = {}
         self.config['server']['url'] = url
     
+    @property
+    def stream_results(self) -> bool:
+        """Получать и вставлять текст по сегментам по мере распознавания"""
+        return self.config.get('server', {}).get('stream_results', False)
+    
+    @stream_results.setter
+    def stream_results(self, enabled: bool) -> None:
+        """Включение потокового получения сегментов"""
+        if 'server' not in self.config:
+            self.config['server'] = {}
+        self.config['server']['stream_results'] = enabled
+    
+    @property
+    def language_session(self) -> bool:
+        """Определять язык один раз за сессию клиента (заголовок X-Session-ID)"""
+        return self.config.get('server', {}).get('language_session', False)
+    
+    @language_session.setter
+    def language_session(self, enabled: bool) -> None:
+        """Включение кэширования языка на сервере для сессии клиента"""
+        if 'server' not in self.config:
+            self.config['server'] = {}
+        self.config['server']['language_session'] = enabled
+    
     @property
     def sample_rate(self) -> int:
         """Частота дискретизации аудио"""
@@ -141,6 +167,30 @@ class Config:
             self.config['audio'] = {}
         self.config['audio']['max_recording_time'] = time
     
+    @property
+    def transport_format(self) -> str:
+        """Формат передачи аудио на сервер: 'wav', 'flac' или 'opus'"""
+        return self.config.get('audio', {}).get('transport_format', 'wav')
+    
+    @transport_format.setter
+    def transport_format(self, fmt: str) -> None:
+        """Установка формата передачи аудио"""
+        if 'audio' not in self.config:
+            self.config['audio'] = {}
+        self.config['audio']['transport_format'] = fmt
+    
+    @property
+    def opus_bitrate(self) -> int:
+        """Битрейт Opus, бит/с"""
+        return self.config.get('audio', {}).get('opus_bitrate', 24000)
+    
+    @opus_bitrate.setter
+    def opus_bitrate(self, bitrate: int) -> None:
+        """Установка битрейта Opus"""
+        if 'audio' not in self.config:
+            self.config['audio'] = {}
+        self.config['audio']['opus_bitrate'] = bitrate
+    
     @property
     def record_hotkey(self) -> List[str]:
         """Горячая клавиша для начала записи"""
@@ -8,6 +8,8 @@ class TextInserter:
         # Настройка безопасности pyautogui
         pyautogui.FAILSAFE = True
         pyautogui.PAUSE = 0.1
+        # Количество вставленных сегментов текущей фразы
+        self.segments_inserted = 0
 
     def insert_text(self, text: str) -> bool:
         """Вставка текста в активное окно"""
@@ -25,4 +27,30 @@ class TextInserter:
             
         except Exception as e:
             logger.error(f"Ошибка при вставке текста: {e}")
-            return False 
\ No newline at end of file
+            return False
+
+    def begin_segments(self) -> None:
+        """Начало пошаговой вставки новой фразы"""
+        self.segments_inserted = 0
+
+    def insert_segment(self, text: str) -> bool:
+        """Вставка очередного сегмента фразы по мере его получения"""
+        text = text.strip()
+        if not text:
+            return False
+
+        try:
+            # Задержка нужна только перед первым сегментом фразы
+            if self.segments_inserted == 0:
+                time.sleep(0.5)
+            else:
+                text = " " + text
+            
+            pyautogui.write(text)
+            self.segments_inserted += 1
+            logger.debug(f"Сегмент вставлен: {text[:50]}...")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Ошибка при вставке сегмента: {e}")
+            return False
@@ -1,22 +1,56 @@
 import requests
-from typing import Optional
+import json
+import time
+import uuid
+from typing import Callable, Optional
 from loguru import logger
+from audio.encoder import detect_audio_format, FORMAT_MIME_TYPES
+
+# Заголовок с идентификатором запроса: сервер пишет его в каждую строку лога
+REQUEST_ID_HEADER = 'X-Request-ID'
+# Заголовок с идентификатором сессии: сервер определяет язык один раз за сессию
+SESSION_ID_HEADER = 'X-Session-ID'
 
 class APIClient:
     def __init__(self, config):
         self.config = config
         self.session = requests.Session()
+        # Сессия длится, пока запущен клиент
+        if getattr(config, 'language_session', False):
+            self.session.headers[SESSION_ID_HEADER] = uuid.uuid4().hex
+
+    def _files(self, audio_data: bytes) -> dict:
+        """Поле multipart с аудио; формат определяется по сигнатуре данных"""
+        audio_format = detect_audio_format(audio_data)
+        filename, mime_type = FORMAT_MIME_TYPES[audio_format]
+        logger.info(f"Отправка аудио на сервер: {len(audio_data)} байт ({audio_format})")
+        return {'file': (filename, audio_data, mime_type)}
+
+    @staticmethod
+    def _new_request_id() -> str:
+        """Новый идентификатор запроса"""
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def _log_timing(request_id: str, response: requests.Response, elapsed: float):
+        """Время ответа и разбивка по этапам на сервере (Server-Timing)"""
+        server_timing = response.headers.get('Server-Timing')
+        logger.debug(f"[{request_id}] Ответ сервера получен через {elapsed:.2f} сек"
+                     + (f" ({server_timing})" if server_timing else ""))
 
     def transcribe_audio(self, audio_data: bytes) -> Optional[str]:
         """Отправка аудио на сервер и получение транскрипции"""
+        request_id = self._new_request_id()
         try:
-            files = {'file': ('audio.wav', audio_data, 'audio/wav')}
+            start_time = time.time()
             response = self.session.post(
                 self.config.server_url,
-                files=files,
+                files=self._files(audio_data),
+                headers={REQUEST_ID_HEADER: request_id},
                 timeout=30
             )
             response.raise_for_status()
+            self._log_timing(request_id, response, time.time() - start_time)
             
             result = response.json()
             if 'text' not in result:
@@ -26,8 +60,54 @@ class APIClient:
             return result['text']
             
         except requests.exceptions.RequestException as e:
-            logger.error(f"Ошибка при отправке аудио на сервер: {e}")
+            logger.error(f"[{request_id}] Ошибка при отправке аудио на сервер: {e}")
             return None
         except Exception as e:
-            logger.error(f"Неожиданная ошибка при работе с API: {e}")
-            return None 
\ No newline at end of file
+            logger.error(f"[{request_id}] Неожиданная ошибка при работе с API: {e}")
+            return None
+
+    def transcribe_audio_stream(self, audio_data: bytes, on_segment: Callable[[str], None]) -> Optional[str]:
+        """Отправка аудио с потоковым получением сегментов (NDJSON).
+
+        on_segment вызывается для каждого сегмента сразу после его получения.
+        Возвращает полный текст или None при ошибке.
+        """
+        request_id = self._new_request_id()
+        try:
+            start_time = time.time()
+            with self.session.post(
+                self.config.server_url,
+                files=self._files(audio_data),
+                headers={'Accept': 'application/x-ndjson', REQUEST_ID_HEADER: request_id},
+                stream=True,
+                timeout=30
+            ) as response:
+                response.raise_for_status()
+                self._log_timing(request_id, response, time.time() - start_time)
+
+                first_segment_time = None
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    message = json.loads(line)
+
+                    if message.get('type') == 'segment':
+                        if first_segment_time is None:
+                            first_segment_time = time.time() - start_time
+                            logger.debug(f"[{request_id}] Первый сегмент получен через {first_segment_time:.2f} сек")
+                        on_segment(message.get('text', ''))
+                    elif message.get('type') == 'final':
+                        return message.get('text', '')
+                    elif message.get('type') == 'error':
+                        logger.error(f"[{request_id}] Сервер вернул ошибку: {message.get('detail')}")
+                        return None
+
+            logger.error(f"[{request_id}] Поток ответа сервера завершился без итогового текста")
+            return None
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"[{request_id}] Ошибка при отправке аудио на сервер: {e}")
+            return None
+        except Exception as e:
+            logger.error(f"[{request_id}] Неожиданная ошибка при работе с API: {e}")
+            return None
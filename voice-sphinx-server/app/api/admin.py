@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Header, HTTPException
+from typing import Optional
+import secrets
+
+from ..config import get_config
+from ..utils.tracing import profiler
+
+router = APIRouter(prefix="/admin")
+
+def check_admin(token: Optional[str]):
+    """Доступ только с токеном server.admin_token; без токена в конфигурации эндпоинты выключены"""
+    admin_token = get_config()['server'].get('admin_token')
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Административные эндпоинты выключены")
+    if token is None or not secrets.compare_digest(token, admin_token):
+        raise HTTPException(status_code=403, detail="Неверный токен администратора")
+
+@router.post("/profile")
+async def start_profile(requests: int = 20, x_admin_token: Optional[str] = Header(None)):
+    """Запуск выборочного профилирования на следующие requests запросов"""
+    check_admin(x_admin_token)
+    try:
+        profiler.start(requests)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return profiler.stats()
+
+@router.get("/profile")
+async def profile_status(x_admin_token: Optional[str] = Header(None)):
+    """Состояние профилирования и путь к последнему профилю"""
+    check_admin(x_admin_token)
+    return profiler.stats()
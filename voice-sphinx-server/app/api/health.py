@@ -0,0 +1,47 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from . import streaming
+from ..runtime import runtime
+
+router = APIRouter()
+
+@router.get("/health")
+async def health():
+    """Нагрузка сервера для балансировщика.
+
+    Глубина очередей, выполняющиеся задачи, оценка ожидания нового запроса
+    и готовность модели; 503, пока сервер не готов или останавливается.
+    """
+    body = runtime.load()
+    body["active_streams"] = streaming.active_streams
+    processes = body.get("inference_processes")
+    if not runtime.accepting or (processes is not None and processes['alive'] == 0):
+        return JSONResponse(status_code=503, content=body)
+    return body
+
+@router.get("/health/live")
+async def health_live():
+    """Проверка жизнеспособности: процесс запущен и обрабатывает запросы"""
+    return {"status": "alive"}
+
+@router.get("/health/ready")
+async def health_ready():
+    """Проверка готовности: модель загружена и прогрета, сервер не останавливается.
+
+    В режиме раздельных процессов сервер не готов, пока не работает ни
+    один процесс инференса; число работающих процессов есть в ответе.
+    """
+    body = {
+        "status": runtime.status,
+        "phases": {name: round(seconds, 3) for name, seconds in runtime.phases.items()},
+    }
+    if runtime.error is not None:
+        body["error"] = runtime.error
+    processes = runtime.inference_processes()
+    if processes is not None:
+        body["inference_processes"] = processes
+
+    if not runtime.accepting or (processes is not None and processes['alive'] == 0):
+        return JSONResponse(status_code=503, content=body)
+    return body
@@ -0,0 +1,307 @@
+from fastapi import APIRouter, File, Form, HTTPException, Response, UploadFile
+from starlette.concurrency import run_in_threadpool
+from loguru import logger
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+import asyncio
+import json
+import time
+import urllib.request
+
+from .transcription import ensure_ready, resolve_model, transcribe_pcm
+from ..config import get_config
+from ..models.executor import BATCH, ExecutorClosedError, QueueFullError
+from ..models.job_store import DONE, FAILED, QUEUED, RUNNING, JobStore
+from ..models.inference_process import InferenceUnavailableError
+from ..models.registry import ModelUnavailableError
+from ..runtime import runtime
+from ..utils.audio import decode_audio_file, validate_audio
+
+router = APIRouter()
+
+# Адреса, на которые разрешено отправлять уведомления о завершении задач
+LOCAL_WEBHOOK_HOSTS = ("localhost", "127.0.0.1", "::1")
+# Попытки отправки уведомления и пауза между ними, секунды
+WEBHOOK_ATTEMPTS = 3
+WEBHOOK_RETRY_DELAY = 5
+WEBHOOK_TIMEOUT = 10
+# Сколько задача ждет готовности модели после запуска сервера, секунды
+READY_TIMEOUT = 600
+
+class JobRunner:
+    """Фоновое выполнение задач транскрипции из хранилища на диске.
+
+    Файлы задачи распознаются по одному с классом приоритета batch, поэтому
+    интерактивные запросы /transcribe обходят их в очереди инференса.
+    Незавершенные задачи подхватываются после перезапуска; в режиме
+    нескольких HTTP-процессов задачу выполняет процесс, захвативший ее
+    блокировку. При остановке сервера задача прерывается после текущего
+    файла и продолжается со следующего файла после перезапуска. Если
+    модель не удалось загрузить или она не готова за ready_timeout_s,
+    задача завершается с ошибкой.
+    """
+
+    def __init__(self):
+        self.store: Optional[JobStore] = None
+        self.retention_s = 0.0
+        self.webhook_hosts: List[str] = list(LOCAL_WEBHOOK_HOSTS)
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        """Включены ли фоновые задачи"""
+        return self.store is not None
+
+    @property
+    def stopping(self) -> bool:
+        """Новые файлы не начинаются: сервер останавливается"""
+        return self._stopping or runtime.draining
+
+    def start(self, config: Dict[str, Any]):
+        """Запуск рабочих задач и постановка в очередь задач, не завершенных до перезапуска"""
+        jobs_config = config.get('jobs', {})
+        if not jobs_config.get('enabled', True):
+            return
+        self.store = JobStore(jobs_config.get('dir', "jobs"))
+        self.retention_s = jobs_config.get('retention_h', 24) * 3600
+        self.webhook_hosts = list(LOCAL_WEBHOOK_HOSTS) + list(jobs_config.get('webhook_hosts', []))
+        self.store.cleanup(self.retention_s)
+
+        self._queue = asyncio.Queue()
+        unfinished = self.store.unfinished()
+        for job_id in unfinished:
+            self._queue.put_nowait(job_id)
+        if unfinished:
+            logger.info(f"Возобновлено незавершенных задач: {len(unfinished)}")
+
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(max(1, jobs_config.get('max_parallel', 1)))]
+
+    async def shutdown(self, timeout: float = 0.0):
+        """Остановка рабочих задач; прерванные задачи продолжатся после перезапуска.
+
+        Рабочие задачи дораспознают текущий файл в пределах timeout секунд.
+        """
+        self._stopping = True
+        if self._workers and timeout > 0:
+            # Свободные рабочие задачи просыпаются и завершаются
+            for _ in self._workers:
+                self._queue.put_nowait(None)
+            await asyncio.wait(self._workers, timeout=timeout)
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, job_id: str):
+        """Постановка сохраненной задачи в очередь"""
+        self._queue.put_nowait(job_id)
+
+    def check_webhook(self, url: Optional[str]):
+        """Уведомления отправляются только на локальные адреса"""
+        if url is None:
+            return
+        parsed = urlparse(url)
+        if parsed.scheme not in ("http", "https") or parsed.hostname not in self.webhook_hosts:
+            raise HTTPException(
+                status_code=400,
+                detail=f"webhook_url должен указывать на разрешенный адрес: {', '.join(self.webhook_hosts)}"
+            )
+
+    async def _worker(self):
+        """Рабочая задача: выполняет задачи из очереди по одной"""
+        while True:
+            job_id = await self._queue.get()
+            if self.stopping:
+                return
+            # Задачи ждут готовности модели после перезапуска
+            error = await self._wait_ready()
+            if self.stopping:
+                return
+
+            lock = self.store.lock(job_id)
+            if lock is None:
+                # Задачу выполняет другой HTTP-процесс
+                continue
+            try:
+                with logger.contextualize(request_id=job_id):
+                    if error is not None:
+                        await self._fail(job_id, error)
+                    else:
+                        await self._run(job_id)
+            except Exception as e:
+                logger.error(f"Ошибка при выполнении задачи {job_id}: {str(e)}")
+            finally:
+                lock.close()
+
+    async def _wait_ready(self) -> Optional[str]:
+        """Ожидание готовности модели; причина, если модель не будет готова"""
+        timeout = get_config().get('jobs', {}).get('ready_timeout_s', READY_TIMEOUT)
+        deadline = time.monotonic() + timeout
+        while not runtime.ready:
+            if runtime.error is not None:
+                return f"Модель не загружена: {runtime.error}"
+            if time.monotonic() >= deadline:
+                return f"Модель не готова за {timeout} с"
+            if self.stopping:
+                return None
+            await asyncio.sleep(1)
+        return None
+
+    async def _fail(self, job_id: str, error: str):
+        """Завершение задачи с ошибкой без распознавания оставшихся файлов"""
+        job = self.store.load(job_id)
+        if job is None or job['status'] not in (QUEUED, RUNNING):
+            return
+        for item in job['files']:
+            if item['status'] not in (DONE, FAILED):
+                item.update(status=FAILED, error=error)
+        logger.error(f"Задача {job_id} не выполнена: {error}")
+        await self._finish(job)
+
+    async def _run(self, job_id: str):
+        """Распознавание всех файлов задачи с сохранением результата после каждого файла"""
+        job = self.store.load(job_id)
+        if job is None or job['status'] not in (QUEUED, RUNNING):
+            return
+
+        job['status'] = RUNNING
+        job['started_at'] = job['started_at'] or time.time()
+        self.store.save(job)
+        logger.info(f"Задача {job_id} начата: файлов {len(job['files'])}")
+
+        for index, item in enumerate(job['files']):
+            if item['status'] in (DONE, FAILED):
+                continue
+            if self.stopping:
+                # Задача остается в состоянии running и продолжится после перезапуска
+                logger.info(f"Задача {job_id} прервана остановкой сервера")
+                return
+            started_at = time.perf_counter()
+            try:
+                result = await self._transcribe(job, index)
+                item.update(status=DONE, **result)
+            except Exception as e:
+                logger.error(f"Не удалось распознать файл {item['name']} задачи {job_id}: {str(e)}")
+                item.update(status=FAILED, error=str(e))
+            item['processing_ms'] = round((time.perf_counter() - started_at) * 1000)
+            self.store.save(job)
+
+        failed = sum(1 for item in job['files'] if item['status'] == FAILED)
+        logger.info(f"Задача {job_id} завершена за {time.time() - job['started_at']:.1f} с, "
+                    f"ошибок {failed} из {len(job['files'])}")
+        await self._finish(job)
+
+    async def _finish(self, job: Dict[str, Any]):
+        """Сохранение итогового состояния задачи, удаление загруженных файлов и уведомление"""
+        failed = sum(1 for item in job['files'] if item['status'] == FAILED)
+        job['status'] = FAILED if failed == len(job['files']) else DONE
+        job['finished_at'] = time.time()
+        self.store.save(job)
+        self.store.remove_inputs(job['id'], len(job['files']))
+
+        if job['webhook_url']:
+            await self._notify(job)
+        await run_in_threadpool(self.store.cleanup, self.retention_s)
+
+    async def _transcribe(self, job: Dict[str, Any], index: int) -> Dict[str, Any]:
+        """Распознавание одного файла задачи с классом приоритета batch"""
+        max_duration_s = get_config().get('jobs', {}).get('max_audio_duration_s', 14400)
+
+        def read():
+            with open(self.store.input_path(job['id'], index), 'rb') as f:
+                return decode_audio_file(f, max_duration_s)
+
+        audio_data, sample_rate = await run_in_threadpool(read)
+        if not validate_audio(audio_data, sample_rate):
+            raise ValueError("Неверный формат аудио: ожидается 16 kHz моно")
+        if audio_data.ndim > 1:
+            audio_data = audio_data.reshape(-1)
+
+        while True:
+            try:
+                result = await transcribe_pcm(audio_data, sample_rate, Response(),
+                                              job['model'] or runtime.models.default, priority=BATCH)
+                break
+            except (QueueFullError, ModelUnavailableError, ExecutorClosedError, InferenceUnavailableError) as e:
+                # Фоновая задача не отклоняется, а ждет освобождения очереди
+                await asyncio.sleep(max(1.0, e.retry_after))
+
+        return {
+            "text": result['text'],
+            "duration": round(len(audio_data) / sample_rate, 2),
+            "removed_seconds": round(result['removed_seconds'], 2),
+        }
+
+    async def _notify(self, job: Dict[str, Any]):
+        """Отправка состояния завершенной задачи на webhook_url"""
+        body = json.dumps(job, ensure_ascii=False).encode('utf-8')
+
+        def post():
+            request = urllib.request.Request(
+                job['webhook_url'], data=body, headers={"Content-Type": "application/json"}, method="POST"
+            )
+            with urllib.request.urlopen(request, timeout=WEBHOOK_TIMEOUT) as response:
+                return response.status
+
+        for attempt in range(1, WEBHOOK_ATTEMPTS + 1):
+            try:
+                status = await run_in_threadpool(post)
+                logger.info(f"Уведомление о задаче {job['id']} отправлено: HTTP {status}")
+                return
+            except Exception as e:
+                logger.warning(f"Уведомление о задаче {job['id']} не отправлено "
+                               f"(попытка {attempt} из {WEBHOOK_ATTEMPTS}): {str(e)}")
+                if attempt < WEBHOOK_ATTEMPTS:
+                    await asyncio.sleep(WEBHOOK_RETRY_DELAY)
+
+job_runner = JobRunner()
+
+def ensure_jobs_enabled():
+    """Фоновые задачи выключены в конфигурации"""
+    if not job_runner.enabled:
+        raise HTTPException(status_code=404, detail="Фоновые задачи выключены")
+
+@router.post("/jobs", status_code=202)
+async def create_job(files: List[UploadFile] = File(...), model: Optional[str] = Form(None),
+                     webhook_url: Optional[str] = Form(None)):
+    """Создание фоновой задачи транскрипции одного или нескольких файлов.
+
+    Файлы сохраняются на диск, а ответ с идентификатором задачи
+    возвращается сразу; результат доступен на GET /jobs/{id}.
+    """
+    ensure_jobs_enabled()
+    ensure_ready()
+    model_name = resolve_model(model)
+    job_runner.check_webhook(webhook_url)
+
+    max_files = get_config().get('jobs', {}).get('max_files', 100)
+    if len(files) > max_files:
+        raise HTTPException(status_code=413, detail=f"Не больше {max_files} файлов в одной задаче")
+
+    store = job_runner.store
+    job = await run_in_threadpool(store.create, [file.filename or f"file-{i}" for i, file in enumerate(files)],
+                                  model_name, webhook_url)
+    try:
+        for index, file in enumerate(files):
+            await run_in_threadpool(store.save_input, job['id'], index, file.file)
+        job['status'] = QUEUED
+        await run_in_threadpool(store.save, job)
+    except Exception as e:
+        await run_in_threadpool(store.remove, job['id'])
+        logger.error(f"Не удалось сохранить задачу: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Не удалось сохранить задачу: {str(e)}")
+
+    job_runner.submit(job['id'])
+    logger.info(f"Создана задача {job['id']}: файлов {len(files)}, модель {model_name}")
+    return {"id": job['id'], "status": job['status'], "files": len(files)}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Состояние задачи и результаты распознанных файлов"""
+    ensure_jobs_enabled()
+    job = await run_in_threadpool(job_runner.store.load, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задача {job_id} не найдена")
+    return job
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+import os
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def metrics():
+    """Метрики в формате Prometheus"""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Несколько HTTP-процессов: метрики собираются из общего каталога
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
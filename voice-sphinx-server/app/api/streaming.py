@@ -0,0 +1,109 @@
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+from loguru import logger
+import json
+
+from ..config import get_config
+from ..models.registry import ModelUnavailableError
+from ..models.streaming import StreamingSession
+from ..runtime import runtime
+from ..utils.audio import pcm16_to_float32
+
+router = APIRouter()
+
+# Количество активных потоковых соединений
+active_streams = 0
+
+# Код закрытия WebSocket "Try Again Later"
+WS_TRY_AGAIN_LATER = 1013
+# Код закрытия WebSocket "Policy Violation"
+WS_POLICY_VIOLATION = 1008
+
+@router.websocket("/ws/transcribe")
+async def transcribe_stream(websocket: WebSocket):
+    """Потоковая транскрипция: бинарные кадры PCM int16 16kHz моно на вход,
+    промежуточные (partial) и окончательные (final) результаты на выход.
+    Текстовое сообщение {"type": "stop"} завершает поток."""
+    global active_streams
+
+    streaming_config = get_config().get('streaming', {})
+    max_streams = streaming_config.get('max_streams', 4)
+
+    await websocket.accept()
+    if not runtime.ready:
+        await websocket.close(code=WS_TRY_AGAIN_LATER, reason="Модель еще загружается")
+        return
+    if runtime.draining:
+        await websocket.close(code=WS_TRY_AGAIN_LATER, reason="Сервер останавливается")
+        return
+    if active_streams >= max_streams:
+        logger.warning(f"Превышен лимит потоковых соединений ({max_streams})")
+        await websocket.close(code=WS_TRY_AGAIN_LATER, reason="Превышен лимит потоковых соединений")
+        return
+
+    model_name = websocket.query_params.get('model', runtime.models.default)
+    if model_name not in runtime.models.entries:
+        await websocket.close(code=WS_POLICY_VIOLATION, reason=f"Неизвестная модель '{model_name}'")
+        return
+    try:
+        model = await runtime.models.acquire(model_name)
+    except ModelUnavailableError as e:
+        await websocket.close(code=WS_TRY_AGAIN_LATER, reason=str(e))
+        return
+
+    active_streams += 1
+    session = StreamingSession(
+        model.executor,
+        step_ms=streaming_config.get('step_ms', 1000),
+        max_buffer_s=streaming_config.get('max_buffer_s', 30),
+        silence_rms=streaming_config.get('silence_rms', 0.01)
+    )
+    logger.info(f"Открыто потоковое соединение (активных: {active_streams})")
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+
+            if message.get('bytes') is not None:
+                try:
+                    session.append(pcm16_to_float32(message['bytes']))
+                except ValueError as e:
+                    await websocket.send_json({"type": "error", "detail": str(e)})
+                    continue
+
+                if session.step_due:
+                    # После замены модели шаги выполняются новым исполнителем
+                    session.executor = model.executor
+                    for result in await session.step():
+                        await websocket.send_json(result)
+
+            elif message.get('text') is not None:
+                try:
+                    command = json.loads(message['text'])
+                except ValueError:
+                    await websocket.send_json({"type": "error", "detail": "Некорректное сообщение"})
+                    continue
+
+                if command.get('type') == 'stop':
+                    session.executor = model.executor
+                    for result in await session.finish():
+                        await websocket.send_json(result)
+                    await websocket.send_json({"type": "done"})
+                    await websocket.close()
+                    break
+
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        logger.error(f"Ошибка потокового распознавания: {str(e)}")
+        try:
+            await websocket.close(code=1011)
+        except RuntimeError:
+            # Соединение уже закрыто
+            pass
+    finally:
+        active_streams -= 1
+        runtime.models.release(model)
+        logger.info(f"Потоковое соединение закрыто (активных: {active_streams})")
+        logger.debug(f"Шаги потокового распознавания: {session.stats()}")
@@ -1,39 +1,555 @@
-from fastapi import APIRouter, UploadFile, HTTPException
+from fastapi import APIRouter, UploadFile, File, Request, Response, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from loguru import logger
+from typing import Any, Dict, Optional, Tuple
 import numpy as np
-import soundfile as sf
-import io
+import asyncio
+import json
+import math
+import os
+import threading
+import time
 
-from ..models.whisper_model import WhisperTranscriber
-from ..utils.audio import validate_audio, save_audio, cleanup_temp_file
+from ..config import get_config
+from ..models.chunking import transcribe_chunked
+from ..models.executor import INTERACTIVE, PRIORITY_CLASSES, ExecutorClosedError, QueueFullError
+from ..models.inference_process import InferenceUnavailableError
+from ..models.registry import ModelUnavailableError
+from ..models.whisper_model import CONFIG_LANGUAGE, TranscriptionCancelled
+from ..runtime import runtime
+from ..utils.audio import (
+    validate_audio, decode_audio_file, detect_audio_format, save_audio, cleanup_temp_file,
+    AudioTooLongError, PcmDecoder, MAX_CHANNELS, TARGET_SAMPLE_RATE
+)
+from ..utils.metrics import ERRORS, IN_FLIGHT, REQUESTS, observe_stage
+from ..utils.logging import transcript
+from ..utils.tracing import record_field, record_timing
+from ..utils.vad import CompactedAudio, compact_silence
 
 router = APIRouter()
-transcriber = WhisperTranscriber()
 
-@router.post("/transcribe")
-async def transcribe_audio(file: UploadFile):
-    """Эндпоинт для транскрипции аудио"""
+# Заголовки с параметрами сырого PCM-потока
+SAMPLE_RATE_HEADER = "X-Sample-Rate"
+CHANNELS_HEADER = "X-Channels"
+# Заголовок с идентификатором сессии (альтернатива параметру session_id)
+SESSION_ID_HEADER = "X-Session-ID"
+# Заголовок с классом приоритета (альтернатива параметру priority)
+PRIORITY_HEADER = "X-Priority"
+
+# Форматы потоковой выдачи сегментов
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+SSE_MEDIA_TYPE = "text/event-stream"
+
+def ensure_ready():
+    """Отказ в обслуживании, пока модель загружается и прогревается или сервер останавливается"""
+    if runtime.draining:
+        # Клиент повторит запрос на другом экземпляре сервера
+        raise HTTPException(
+            status_code=503,
+            detail="Сервер останавливается",
+            headers={"Retry-After": "5", "Connection": "close"}
+        )
+    if not runtime.ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Модель еще загружается",
+            headers={"Retry-After": "5"}
+        )
+
+def upload_size(file: UploadFile) -> int:
+    """Размер загруженного файла без чтения его в память"""
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+async def read_audio(request: Request, file: Optional[UploadFile]) -> Tuple[np.ndarray, int]:
+    """Чтение аудио из запроса: multipart-файл или сырой PCM int16 (application/octet-stream).
+
+    Размер тела ограничен UploadLimitMiddleware; длительность проверяется
+    до декодирования (по заголовку файла или по Content-Length PCM), а
+    аудио декодируется по частям в заранее выделенный буфер float32.
+    """
+    content_type = request.headers.get("content-type", "")
+    max_duration_s = get_config()['server'].get('max_audio_duration_s', 3600)
+
+    if file is not None:
+        # Multipart-парсер уже сохранил файл во временный файл (большие загрузки - на диск);
+        # время получения тела учитывает UploadLimitMiddleware (этап upload_read)
+        signature = await file.read(4)
+        size = upload_size(file)
+
+        audio_format = detect_audio_format(signature)
+        accepted_formats = get_config()['server'].get('accepted_formats', ["wav", "flac", "opus"])
+        if audio_format != "unknown" and audio_format not in accepted_formats:
+            raise HTTPException(status_code=415, detail=f"Формат {audio_format} не принимается сервером")
+
+        try:
+            start_time = time.perf_counter()
+            with observe_stage("decode"):
+                audio_data, sample_rate = await run_in_threadpool(decode_audio_file, file.file, max_duration_s)
+        except AudioTooLongError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Не удалось декодировать аудио: {str(e)}")
+
+        decode_ms = (time.perf_counter() - start_time) * 1000
+        record_field("upload_bytes", size)
+        logger.debug(f"Получено аудио {audio_format}: {size} байт, "
+                    f"{len(audio_data) / max(sample_rate, 1):.2f} с, декодирование {decode_ms:.1f} мс")
+        return audio_data, sample_rate
+
+    if content_type.startswith("application/octet-stream"):
+        try:
+            sample_rate = int(request.headers.get(SAMPLE_RATE_HEADER, TARGET_SAMPLE_RATE))
+            channels = int(request.headers.get(CHANNELS_HEADER, 1))
+            content_length = int(request.headers["content-length"]) if "content-length" in request.headers else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Некорректные заголовки параметров PCM")
+        # Параметры проверяются до расчета лимитов и выделения буфера
+        if sample_rate != TARGET_SAMPLE_RATE:
+            raise HTTPException(status_code=400, detail=f"{SAMPLE_RATE_HEADER} должен быть {TARGET_SAMPLE_RATE}")
+        if not 1 <= channels <= MAX_CHANNELS:
+            raise HTTPException(status_code=400, detail=f"{CHANNELS_HEADER} должен быть от 1 до {MAX_CHANNELS}")
+        if content_length is not None and content_length < 0:
+            raise HTTPException(status_code=400, detail="Некорректный Content-Length")
+
+        # Длительность PCM известна по размеру: лимит проверяется до чтения тела
+        max_bytes = int(max_duration_s * sample_rate * channels * 2) if max_duration_s else None
+        if max_bytes is not None and content_length is not None and content_length > max_bytes:
+            raise HTTPException(status_code=413, detail=str(AudioTooLongError(
+                content_length / (2 * channels * sample_rate), max_duration_s)))
+
+        try:
+            decoder = PcmDecoder(channels, content_length)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # Время получения тела учитывает UploadLimitMiddleware (этап upload_read)
+        async for chunk in request.stream():
+            decoder.feed(chunk)
+            if max_bytes is not None and decoder.bytes_received > max_bytes:
+                raise HTTPException(status_code=413, detail=str(AudioTooLongError(
+                    decoder.bytes_received / (2 * channels * sample_rate), max_duration_s)))
+        try:
+            with observe_stage("decode"):
+                audio_data = decoder.result()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        record_field("upload_bytes", decoder.bytes_received)
+        logger.debug(f"Получен PCM: {decoder.bytes_received} байт, {len(audio_data) / sample_rate:.2f} с")
+        return audio_data, sample_rate
+
+    raise HTTPException(status_code=400, detail="Ожидается multipart-файл или application/octet-stream с PCM int16")
+
+async def preprocess_audio(audio_data: np.ndarray) -> Optional[CompactedAudio]:
+    """Предобработка перед инференсом: удаление тишины с помощью VAD"""
+    vad_config = get_config().get('vad', {})
+    if not vad_config.get('enabled', True):
+        return None
+    with observe_stage("preprocess"):
+        return await run_in_threadpool(
+            compact_silence,
+            audio_data,
+            threshold=vad_config.get('threshold', 0.5),
+            min_silence_ms=vad_config.get('min_silence_ms', 500),
+            keep_silence_ms=vad_config.get('keep_silence_ms', 200)
+        )
+
+def resolve_model(model: Optional[str]) -> str:
+    """Имя модели реестра из параметра запроса (по умолчанию - модель по умолчанию)"""
+    if model is None:
+        return runtime.models.default
+    if model not in runtime.models.entries:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестная модель '{model}', доступны: {', '.join(runtime.models.names())}"
+        )
+    return model
+
+def resolve_priority(priority: Optional[str]) -> str:
+    """Класс приоритета из параметра запроса (по умолчанию - interactive)"""
+    if priority is None:
+        return INTERACTIVE
+    if priority not in PRIORITY_CLASSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Неизвестный класс приоритета '{priority}', доступны: {', '.join(PRIORITY_CLASSES)}"
+        )
+    return priority
+
+def session_language(session_id: Optional[str]) -> Optional[str]:
+    """Язык распознавания: из кэша сессии, None (определить) или язык конфигурации"""
+    if session_id is None or runtime.sessions is None:
+        return CONFIG_LANGUAGE
+    return runtime.sessions.language_for(session_id)
+
+def update_session(session_id: Optional[str], language: Optional[str], result: Dict[str, Any]):
+    """Учет определенного языка или качества распознавания с сохраненным языком"""
+    if language == CONFIG_LANGUAGE or runtime.sessions is None:
+        return
+    if language is None:
+        runtime.sessions.record_detection(session_id, result['language'], result['language_probability'])
+    else:
+        runtime.sessions.record_result(session_id, result.get('avg_logprob'))
+
+def decode_options(model_name: str, stream: bool = False, language: Optional[str] = CONFIG_LANGUAGE) -> Dict[str, Any]:
+    """Параметры, влияющие на результат: входят в ключ кэша"""
+    config = get_config()
+    model_config = runtime.models.entries[model_name].config['model']
+    if language == CONFIG_LANGUAGE:
+        language = model_config['language']
+    return {
+        "mode": "stream" if stream else "text",
+        "model": model_config['model_size'],
+        "compute_type": model_config.get('compute_type'),
+        "language": language,
+        "beam_size": model_config['beam_size'],
+        "vad": config.get('vad', {}),
+        "chunking": config.get('chunking', {}),
+    }
+
+def stream_media_type(request: Request) -> Optional[str]:
+    """Формат потоковой выдачи, запрошенный клиентом (Accept или ?stream=true)"""
+    accept = request.headers.get("accept", "")
+    for media_type in (NDJSON_MEDIA_TYPE, SSE_MEDIA_TYPE):
+        if media_type in accept:
+            return media_type
+    if request.query_params.get("stream", "").lower() in ("1", "true", "ndjson"):
+        return NDJSON_MEDIA_TYPE
+    return None
+
+def format_stream_message(message: Dict[str, Any], media_type: str) -> str:
+    """Сериализация сообщения потока в NDJSON или SSE"""
+    data = json.dumps(message, ensure_ascii=False)
+    if media_type == SSE_MEDIA_TYPE:
+        return f"event: {message['type']}\ndata: {data}\n\n"
+    return data + "\n"
+
+def replay_stream(cached: Dict[str, Any], media_type: str) -> StreamingResponse:
+    """Потоковая выдача сохраненного в кэше результата"""
+    messages = [format_stream_message({"type": "segment", **segment}, media_type)
+                for segment in cached['segments']]
+    messages.append(format_stream_message({
+        "type": "final",
+        "text": cached['text'],
+        "removed_seconds": cached['removed_seconds'],
+        "cache": "hit"
+    }, media_type))
+    return StreamingResponse(iter(messages), media_type=media_type, headers={"X-Cache": "hit"})
+
+async def stream_segments(audio_data: np.ndarray, media_type: str, model_name: str,
+                          compacted: Optional[CompactedAudio] = None,
+                          cache_key: Optional[str] = None,
+                          session_id: Optional[str] = None,
+                          language: Optional[str] = CONFIG_LANGUAGE,
+                          priority: str = INTERACTIVE) -> StreamingResponse:
+    """Потоковая выдача сегментов по мере их декодирования моделью.
+
+    Если из аудио удалена тишина, время сегментов пересчитывается
+    относительно исходной записи. Успешный результат сохраняется в кэш.
+    """
+    removed_seconds = compacted.removed_seconds if compacted is not None else 0.0
+    if compacted is not None and not compacted.has_speech:
+        final = {"type": "final", "text": "", "removed_seconds": removed_seconds}
+        return StreamingResponse(iter([format_stream_message(final, media_type)]), media_type=media_type)
+
+    loop = asyncio.get_running_loop()
+    segments: asyncio.Queue = asyncio.Queue()
+    cancelled = threading.Event()
+
+    def on_segment(segment: Dict[str, Any]):
+        # Вызывается в потоке реплики
+        if cancelled.is_set():
+            raise TranscriptionCancelled()
+        if compacted is not None:
+            segment = dict(segment,
+                           start=compacted.original_time(segment['start']),
+                           end=compacted.original_time(segment['end']))
+        loop.call_soon_threadsafe(segments.put_nowait, segment)
+
+    # Переполнение очереди обнаруживается до начала ответа, чтобы вернуть 503;
+    # модель не выгружается, пока идет выдача
+    model = await runtime.models.acquire(model_name)
     try:
-        # Читаем аудиофайл
-        contents = await file.read()
-        audio_data, sample_rate = sf.read(io.BytesIO(contents))
-        
-        # Проверяем формат аудио
-        if not validate_audio(audio_data, sample_rate):
-            raise HTTPException(status_code=400, detail="Неверный формат аудио")
-        
-        # Сохраняем во временный файл
-        temp_file = save_audio(audio_data, sample_rate)
-        
+        job = await model.executor.enqueue("transcribe_segments", audio_data, priority=priority,
+                                           on_segment=on_segment, language=language)
+    except BaseException:
+        runtime.models.release(model)
+        raise
+
+    async def body():
+        sent_segments = []
         try:
-            # Транскрибируем
-            text = transcriber.transcribe(temp_file)
-            return {"text": text}
-            
+            while True:
+                next_segment = asyncio.ensure_future(segments.get())
+                await asyncio.wait({next_segment, job.future}, return_when=asyncio.FIRST_COMPLETED)
+                if not next_segment.done():
+                    next_segment.cancel()
+                    break
+                sent_segments.append(next_segment.result())
+                yield format_stream_message({"type": "segment", **sent_segments[-1]}, media_type)
+
+            # Сегменты, пришедшие одновременно с завершением задачи
+            while not segments.empty():
+                sent_segments.append(segments.get_nowait())
+                yield format_stream_message({"type": "segment", **sent_segments[-1]}, media_type)
+
+            if job.future.exception() is not None:
+                logger.error(f"Ошибка при потоковой транскрипции: {str(job.future.exception())}")
+                yield format_stream_message({"type": "error", "detail": str(job.future.exception())}, media_type)
+                return
+
+            update_session(session_id, language, job.result)
+            yield format_stream_message({
+                "type": "final",
+                "text": job.result['text'],
+                "language": job.result['language'],
+                "removed_seconds": removed_seconds,
+                "queue_wait_ms": round(job.wait_time * 1000),
+                "inference_ms": round(job.run_time * 1000)
+            }, media_type)
+
+            if cache_key is not None:
+                await runtime.cache.put(cache_key, {
+                    "text": job.result['text'],
+                    "segments": sent_segments,
+                    "removed_seconds": removed_seconds
+                })
         finally:
-            # Удаляем временный файл
-            cleanup_temp_file(temp_file)
-            
+            # Клиент отключился: прерываем декодирование и снимаем задачу с очереди
+            cancelled.set()
+            if not job.future.done():
+                job.future.cancel()
+            runtime.models.release(model)
+
+    headers = {"X-Queue-Depth": str(job.queue_depth), "X-Model": model_name, "Cache-Control": "no-cache"}
+    return StreamingResponse(body(), media_type=media_type, headers=headers)
+
+async def transcribe_pcm(audio_data: np.ndarray, sample_rate: int, response: Response,
+                         model_name: str, session_id: Optional[str] = None,
+                         language: Optional[str] = CONFIG_LANGUAGE,
+                         priority: str = INTERACTIVE) -> Dict[str, Any]:
+    """Предобработка и распознавание декодированного аудио с заголовками ответа"""
+    result = await compute_transcription(audio_data, sample_rate, model_name, language, priority)
+    apply_result(response, result, session_id, language, priority)
+    return result
+
+async def compute_transcription(audio_data: np.ndarray, sample_rate: int, model_name: str,
+                                language: Optional[str] = CONFIG_LANGUAGE,
+                                priority: str = INTERACTIVE) -> Dict[str, Any]:
+    """Предобработка и распознавание декодированного аудио.
+
+    Результат не зависит от запроса: сведения для заголовков и сессии
+    хранятся в поле info, поэтому его можно отдать из кэша любому
+    запросу с тем же ключом.
+    """
+    # Удаляем тишину перед инференсом
+    compacted = await preprocess_audio(audio_data)
+
+    removed_seconds = 0.0
+    if compacted is not None:
+        removed_seconds = compacted.removed_seconds
+        if not compacted.has_speech:
+            logger.debug(f"Речь не обнаружена, распознавание пропущено ({removed_seconds:.2f} с тишины)")
+            return {"text": "", "removed_seconds": removed_seconds, "info": {"model": model_name}}
+        audio_data = compacted.audio
+
+    chunking_config = get_config().get('chunking', {})
+    chunked = (chunking_config.get('enabled', True)
+               and len(audio_data) > chunking_config.get('min_duration_s', 60) * TARGET_SAMPLE_RATE)
+
+    model = await runtime.models.acquire(model_name)
+    try:
+        # Режим отладки: транскрибируем через временный WAV файл
+        if get_config()['server'].get('debug_temp_files', False):
+            temp_file = save_audio(audio_data, sample_rate)
+            try:
+                job = await model.executor.submit("transcribe", temp_file, priority=priority)
+            finally:
+                cleanup_temp_file(temp_file)
+        elif chunked:
+            # Длинное аудио: фрагменты по паузам распознаются параллельно на репликах
+            job = await transcribe_chunked(
+                model.executor, audio_data,
+                compacted.boundaries if compacted is not None else [],
+                chunk_s=chunking_config.get('chunk_s', 30),
+                overlap_s=chunking_config.get('overlap_s', 1.0),
+                max_parallel=chunking_config.get('max_parallel', 0),
+                language=language,
+                priority=priority
+            )
+        elif language != CONFIG_LANGUAGE:
+            # Язык сессии: известный язык или определение языка моделью
+            job = await model.executor.submit("transcribe_language", audio_data, language, priority=priority)
+        else:
+            job = await model.executor.submit("transcribe", audio_data, batch_key="transcribe", priority=priority)
+    finally:
+        runtime.models.release(model)
+
+    record_timing("queue_wait", job.wait_time)
+    record_timing("inference", job.run_time)
+    logger.debug(f"Очередь ({priority}): глубина {job.queue_depth}, ожидание {job.wait_time * 1000:.0f} мс, "
+                 f"инференс {job.run_time * 1000:.0f} мс, батч {job.batch_size}")
+
+    info = {
+        "model": model_name,
+        "queue_depth": job.queue_depth,
+        "queue_wait_ms": round(job.wait_time * 1000),
+        "batch_size": job.batch_size,
+        "chunks": getattr(job, "chunks", 1),
+    }
+    text = job.result
+    if isinstance(job.result, dict):
+        text = job.result['text']
+        info.update({key: job.result.get(key) for key in ("language", "language_probability", "avg_logprob")})
+    return {"text": text, "removed_seconds": removed_seconds, "info": info}
+
+def apply_result(response: Response, result: Dict[str, Any], session_id: Optional[str] = None,
+                 language: Optional[str] = CONFIG_LANGUAGE, priority: str = INTERACTIVE,
+                 cache_status: Optional[str] = None):
+    """Заголовки ответа и обновление сессии по результату (вычисленному или из кэша)"""
+    info = result.get('info', {})
+    if 'model' in info:
+        response.headers["X-Model"] = info['model']
+    if result['removed_seconds']:
+        response.headers["X-Removed-Audio-Seconds"] = f"{result['removed_seconds']:.2f}"
+    if info.get('language') is not None:
+        response.headers["X-Language"] = info['language']
+        record_field("language", info['language'])
+        update_session(session_id, language, info)
+    if info.get('chunks', 1) > 1:
+        response.headers["X-Chunks"] = str(info['chunks'])
+
+    response.headers["X-Priority"] = priority
+    if 'queue_depth' in info:
+        # Результат из кэша не ждал в очереди; общее вычисление ждало вместе с первым запросом
+        hit = cache_status == "hit"
+        response.headers["X-Queue-Depth"] = "0" if hit else str(info['queue_depth'])
+        response.headers["X-Queue-Wait-Ms"] = "0" if hit else str(info['queue_wait_ms'])
+        response.headers["X-Batch-Size"] = "0" if hit else str(info['batch_size'])
+        record_field("queue_depth", 0 if hit else info['queue_depth'])
+        record_field("batch_size", 0 if hit else info['batch_size'])
+        record_field("chunks", info.get('chunks', 1))
+
+@router.post("/transcribe")
+async def transcribe_audio(request: Request, response: Response, file: Optional[UploadFile] = File(None),
+                           model: Optional[str] = None, session_id: Optional[str] = None,
+                           priority: Optional[str] = None):
+    """Эндпоинт для транскрипции аудио.
+
+    model - имя модели реестра; session_id - идентификатор сессии, для
+    которой язык определяется один раз и затем берется из кэша; priority -
+    класс приоритета в очереди (interactive или batch).
+    """
+    REQUESTS.labels(endpoint="transcribe").inc()
+    IN_FLIGHT.inc()
+    try:
+        with runtime.track_request():
+            return await handle_transcription(request, response, file, model,
+                                              session_id or request.headers.get(SESSION_ID_HEADER),
+                                              priority or request.headers.get(PRIORITY_HEADER))
+    except HTTPException as e:
+        ERRORS.labels(endpoint="transcribe", status=str(e.status_code)).inc()
+        raise
+    finally:
+        IN_FLIGHT.dec()
+
+async def handle_transcription(request: Request, response: Response, file: Optional[UploadFile],
+                               model: Optional[str] = None, session_id: Optional[str] = None,
+                               priority: Optional[str] = None):
+    """Чтение, проверка, предобработка и распознавание аудио из запроса"""
+    ensure_ready()
+    model_name = resolve_model(model)
+    priority = resolve_priority(priority)
+    language = session_language(session_id)
+    cache = runtime.cache
+    try:
+        # Читаем и декодируем аудио сразу в память (float32)
+        audio_data, sample_rate = await read_audio(request, file)
+
+        # Проверяем формат аудио
+        with observe_stage("validation"):
+            if not validate_audio(audio_data, sample_rate):
+                raise HTTPException(status_code=400, detail="Неверный формат аудио")
+
+            # Модель ожидает одномерный массив
+            if audio_data.ndim > 1:
+                audio_data = audio_data.reshape(-1)
+
+        media_type = stream_media_type(request)
+        record_field("model", model_name)
+        record_field("priority", priority)
+        record_field("audio_seconds", round(len(audio_data) / sample_rate, 2))
+        record_field("stream", media_type is not None)
+
+        # Ключ кэша по содержимому; в режиме отладки кэш не используется
+        cache_key = None
+        if cache is not None and not get_config()['server'].get('debug_temp_files', False):
+            # Хэш всего PCM считается вне цикла событий
+            cache_key = await run_in_threadpool(
+                cache.make_key, audio_data, decode_options(model_name, media_type is not None, language)
+            )
+
+        # Потоковая выдача сегментов по мере декодирования
+        if media_type is not None:
+            if cache_key is not None:
+                cached = await cache.get(cache_key)
+                if cached is not None:
+                    return replay_stream(cached, media_type)
+            compacted = await preprocess_audio(audio_data)
+            return await stream_segments(compacted.audio if compacted else audio_data, media_type,
+                                         model_name, compacted, cache_key, session_id, language, priority)
+
+        cache_status = None
+        if cache_key is None:
+            result = await compute_transcription(audio_data, sample_rate, model_name, language, priority)
+        else:
+            # Одинаковые одновременные запросы ждут одно вычисление
+            result, cache_status = await cache.get_or_compute(
+                cache_key, lambda: compute_transcription(audio_data, sample_rate, model_name, language, priority)
+            )
+            response.headers["X-Cache"] = cache_status
+            record_field("cache", cache_status)
+            if cache_status != "miss":
+                logger.debug(f"Результат получен из кэша ({cache_status})")
+        # Заголовки и сессия обновляются для каждого запроса, в том числе получившего результат из кэша
+        apply_result(response, result, session_id, language, priority, cache_status)
+
+        record_field("removed_seconds", round(result['removed_seconds'], 2))
+        record_field("text", transcript(result['text']))
+        return {"text": result['text'], "removed_seconds": result['removed_seconds']}
+
+    except QueueFullError as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except (ModelUnavailableError, ExecutorClosedError, InferenceUnavailableError) as e:
+        raise HTTPException(
+            status_code=503,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Ошибка при обработке запроса: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/stats")
+async def inference_stats():
+    """Статистика очереди инференса, распределение размеров батчей, моделей и кэша"""
+    ensure_ready()
+    stats = runtime.executor.stats()
+    stats["models"] = runtime.models.stats()
+    for name, entry in runtime.models.entries.items():
+        if entry.loaded and name != runtime.models.default:
+            stats["models"]["models"][name]["executor"] = entry.executor.stats()
+    stats["cache"] = runtime.cache.stats() if runtime.cache is not None else None
+    stats["sessions"] = runtime.sessions.stats() if runtime.sessions is not None else None
+    stats["config_reloads"] = runtime.reloads
+    return stats
@@ -0,0 +1,57 @@
+from loguru import logger
+from typing import Any, Dict, Optional
+import json
+import os
+import time
+
+# Переменная окружения с путем к файлу конфигурации (по умолчанию config.json)
+CONFIG_PATH_ENV = "VOICE_SPHINX_CONFIG"
+
+# Конфигурация загружается при старте процесса и заменяется при горячей перезагрузке
+_config: Optional[Dict[str, Any]] = None
+# Файл конфигурации и время его изменения при последней загрузке
+_config_path: Optional[str] = None
+_config_mtime: Optional[float] = None
+
+def load_config(config_path: Optional[str] = None) -> Dict[str, Any]:
+    """Загрузка конфигурации сервера из файла"""
+    global _config, _config_path, _config_mtime
+
+    if config_path is None:
+        config_path = os.environ.get(CONFIG_PATH_ENV, "config.json")
+    start_time = time.perf_counter()
+    mtime = os.path.getmtime(config_path)
+    with open(config_path, 'r', encoding='utf-8') as f:
+        _config = json.load(f)
+    _config_path, _config_mtime = config_path, mtime
+    logger.debug(f"Конфигурация загружена из {config_path} за {(time.perf_counter() - start_time) * 1000:.1f} мс")
+    return _config
+
+def get_config() -> Dict[str, Any]:
+    """Текущая конфигурация сервера (загружается при первом обращении)"""
+    if _config is None:
+        return load_config()
+    return _config
+
+def read_changed_config() -> Optional[Dict[str, Any]]:
+    """Новое содержимое файла конфигурации, если он изменился с последней загрузки.
+
+    Текущая конфигурация не заменяется: новую применяет set_config после
+    проверки. Ошибка разбора JSON пробрасывается, а файл будет прочитан
+    снова только после следующего изменения.
+    """
+    global _config_mtime
+
+    if _config_path is None:
+        return None
+    mtime = os.path.getmtime(_config_path)
+    if mtime == _config_mtime:
+        return None
+    _config_mtime = mtime
+    with open(_config_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def set_config(config: Dict[str, Any]):
+    """Замена текущей конфигурации: обработчики запросов читают новую со следующего запроса"""
+    global _config
+    _config = config
@@ -0,0 +1,243 @@
+from concurrent.futures import wait
+from loguru import logger
+from typing import Any, Dict, List, Optional
+import copy
+import gc
+import hashlib
+import json
+import math
+import os
+import platform
+import time
+import numpy as np
+
+from .replica_pool import ReplicaPool
+from ..utils.audio import TARGET_SAMPLE_RATE, decode_audio
+
+# Типы вычислений, которые проверяются по умолчанию
+DEFAULT_COMPUTE_TYPES = {
+    "cuda": ["float16", "int8_float16", "int8", "float32"],
+    "cpu": ["int8", "int8_float32", "float32"],
+}
+
+# Сколько реплик (на CPU) или одновременных вызовов (на GPU) проверяется по умолчанию
+DEFAULT_REPLICA_COUNTS = [1, 2, 4]
+
+# Минимум потоков CPU на реплику
+MIN_CPU_THREADS = 2
+
+def clip_digest(clip: np.ndarray) -> str:
+    """Отпечаток эталонного клипа: решение, принятое на другом клипе, не используется"""
+    return hashlib.blake2b(np.ascontiguousarray(clip).tobytes(), digest_size=8).hexdigest()
+
+def host_key(model_config: Dict[str, Any], latency_target_ms: float, clip: np.ndarray) -> str:
+    """Ключ решения: машина, число доступных ядер, модель, устройство, цель по задержке и клип"""
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+    device = model_config['device']
+    if device == 'cuda':
+        device = f"cuda:{model_config.get('cuda_device', 0)}"
+    return "|".join([platform.node(), platform.machine(), f"{cores}cpu", model_config['model_size'], device,
+                     f"p95<={latency_target_ms:g}ms", f"clip:{clip_digest(clip)}"])
+
+def load_reference_clip(autotune_config: Dict[str, Any]) -> Optional[np.ndarray]:
+    """Эталонный клип с речью из конфигурации; None, если клип не задан.
+
+    Синтетический сигнал не подходит: декодер на нем почти не работает,
+    и замер выбирает вариант, который на речи не укладывается в задержку.
+    """
+    path = autotune_config.get('reference_clip')
+    if not path:
+        return None
+    with open(path, 'rb') as f:
+        audio, sample_rate = decode_audio(f.read())
+    if sample_rate != TARGET_SAMPLE_RATE:
+        raise ValueError(f"Эталонный клип должен быть {TARGET_SAMPLE_RATE} Гц, получено {sample_rate}")
+    return audio.reshape(-1) if audio.ndim == 1 else audio.mean(axis=1)
+
+def build_candidates(model_config: Dict[str, Any], autotune_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Варианты настройки: тип вычислений и разбиение на реплики"""
+    device = model_config['device']
+    compute_types = autotune_config.get('compute_types') or DEFAULT_COMPUTE_TYPES.get(device, ["float32"])
+    replica_counts = autotune_config.get('replica_counts') or DEFAULT_REPLICA_COUNTS
+
+    candidates = []
+    if device == 'cpu':
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        for count in replica_counts:
+            threads = cores // count
+            if threads < MIN_CPU_THREADS:
+                continue
+            for compute_type in compute_types:
+                candidates.append({
+                    "compute_type": compute_type,
+                    "replicas": [
+                        {"device": "cpu", "compute_type": compute_type, "cpu_threads": threads, "num_workers": 1}
+                        for _ in range(count)
+                    ],
+                })
+    else:
+        device_index = model_config.get('cuda_device', 0)
+        for count in replica_counts:
+            for compute_type in compute_types:
+                candidates.append({
+                    "compute_type": compute_type,
+                    "replicas": [
+                        {"device": device, "device_index": device_index,
+                         "compute_type": compute_type, "num_workers": count}
+                    ],
+                })
+    return candidates
+
+def benchmark_candidate(config: Dict[str, Any], candidate: Dict[str, Any], clip: np.ndarray,
+                        requests: int) -> Dict[str, Any]:
+    """Замер пропускной способности и задержки варианта под полной нагрузкой"""
+    candidate_config = copy.deepcopy(config)
+    candidate_config['model']['replicas'] = candidate['replicas']
+    candidate_config['model']['compute_type'] = candidate['compute_type']
+
+    pool = ReplicaPool(config=candidate_config)
+    try:
+        # Прогрев каждой реплики
+        wait([replica.executor.submit(replica.transcriber.transcribe, clip) for replica in pool.replicas])
+
+        latencies: List[float] = []
+
+        def timed(replica):
+            started_at = time.perf_counter()
+            replica.transcriber.transcribe(clip)
+            latencies.append(time.perf_counter() - started_at)
+
+        # Не меньше одного запроса на каждый поток реплик
+        total = max(requests, pool.capacity * 2)
+        started_at = time.perf_counter()
+        futures = [
+            pool.replicas[i % len(pool.replicas)].executor.submit(timed, pool.replicas[i % len(pool.replicas)])
+            for i in range(total)
+        ]
+        wait(futures)
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - started_at
+    finally:
+        pool.shutdown()
+        del pool
+        gc.collect()
+
+    latencies.sort()
+    p95 = latencies[max(0, math.ceil(0.95 * len(latencies)) - 1)]
+    return {
+        "compute_type": candidate['compute_type'],
+        "replicas": candidate['replicas'],
+        "throughput": total * len(clip) / TARGET_SAMPLE_RATE / elapsed,
+        "latency_p95_ms": p95 * 1000,
+    }
+
+def run_autotune(config: Dict[str, Any], clip: np.ndarray) -> Dict[str, Any]:
+    """Замер всех вариантов и выбор лучшего по пропускной способности при заданной задержке"""
+    model_config = config['model']
+    autotune_config = config.get('autotune', {})
+    latency_target_ms = autotune_config.get('latency_target_ms', 2000)
+    requests = autotune_config.get('requests', 8)
+
+    candidates = build_candidates(model_config, autotune_config)
+    logger.info(f"Автонастройка {model_config['model_size']} на {model_config['device']}: "
+                f"{len(candidates)} вариантов, цель p95 {latency_target_ms} мс")
+
+    results = []
+    for candidate in candidates:
+        description = f"{candidate['compute_type']}, реплик {len(candidate['replicas'])}, " \
+                      f"потоков {candidate['replicas'][0].get('cpu_threads', candidate['replicas'][0].get('num_workers'))}"
+        try:
+            result = benchmark_candidate(config, candidate, clip, requests)
+        except Exception as e:
+            # Тип вычислений может не поддерживаться устройством
+            logger.warning(f"Вариант {description} пропущен: {str(e)}")
+            continue
+        logger.info(f"Вариант {description}: {result['throughput']:.2f} с аудио/с, p95 {result['latency_p95_ms']:.0f} мс")
+        results.append(result)
+
+    if not results:
+        raise RuntimeError("Автонастройка: ни один вариант не удалось запустить")
+
+    within_target = [result for result in results if result['latency_p95_ms'] <= latency_target_ms]
+    if within_target:
+        best = max(within_target, key=lambda result: result['throughput'])
+    else:
+        logger.warning(f"Ни один вариант не укладывается в p95 {latency_target_ms} мс, выбран самый быстрый")
+        best = min(results, key=lambda result: result['latency_p95_ms'])
+
+    return {
+        "compute_type": best['compute_type'],
+        "replicas": best['replicas'],
+        "throughput": round(best['throughput'], 3),
+        "latency_p95_ms": round(best['latency_p95_ms'], 1),
+        "latency_target_ms": latency_target_ms,
+        "reference_clip": autotune_config.get('reference_clip'),
+        "clip_digest": clip_digest(clip),
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "candidates": len(results),
+    }
+
+def _read_cache(path: str) -> Dict[str, Any]:
+    """Сохраненные решения автонастройки"""
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"Не удалось прочитать кэш автонастройки {path}: {str(e)}")
+        return {}
+
+def _write_cache(path: str, cache: Dict[str, Any]):
+    """Сохранение решений автонастройки (через временный файл)"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+def autotune(config: Dict[str, Any], force: bool = False, cached_only: bool = False) -> Optional[Dict[str, Any]]:
+    """Решение автонастройки для текущей машины и модели.
+
+    Решение берется из кэша; замер выполняется, если его нет или force.
+    Без эталонного клипа автонастройка не выполняется (None). С
+    cached_only замер не выполняется: без сохраненного решения - None.
+    """
+    autotune_config = config.get('autotune', {})
+    cache_path = autotune_config.get('cache_path', "autotune_cache.json")
+    clip = load_reference_clip(autotune_config)
+    if clip is None:
+        logger.warning("Автонастройка пропущена: не задан эталонный клип с речью (autotune.reference_clip), "
+                       "используются model.compute_type и model.replicas из конфигурации")
+        return None
+    key = host_key(config['model'], autotune_config.get('latency_target_ms', 2000), clip)
+
+    cache = _read_cache(cache_path)
+    if key in cache and not force:
+        logger.info(f"Автонастройка: используется сохраненное решение для {key}")
+        return cache[key]
+    if cached_only:
+        logger.warning(f"Автонастройка: сохраненного решения для {key} нет, используются model.compute_type "
+                       f"и model.replicas из конфигурации; замер выполнится при следующем запуске")
+        return None
+
+    decision = run_autotune(config, clip)
+    cache[key] = decision
+    _write_cache(cache_path, cache)
+    logger.info(f"Автонастройка: выбрано {decision['compute_type']}, реплик {len(decision['replicas'])} "
+                f"({decision['throughput']:.2f} с аудио/с, p95 {decision['latency_p95_ms']:.0f} мс), "
+                f"решение сохранено в {cache_path}")
+    return decision
+
+def apply_autotune(config: Dict[str, Any], decision: Optional[Dict[str, Any]] = None,
+                   cached_only: bool = False) -> Dict[str, Any]:
+    """Конфигурация с выбранными типом вычислений и репликами модели по умолчанию"""
+    if decision is None:
+        decision = autotune(config, cached_only=cached_only)
+    if decision is None:
+        return config
+    model_config = dict(config['model'], compute_type=decision['compute_type'], replicas=decision['replicas'])
+    return dict(config, model=model_config)
@@ -0,0 +1,138 @@
+from collections import Counter
+from loguru import logger
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import re
+import numpy as np
+
+from .executor import INTERACTIVE, InferenceExecutor, InferenceJob
+from .whisper_model import CONFIG_LANGUAGE
+from ..utils.audio import TARGET_SAMPLE_RATE
+
+# Длина кадра для поиска самого тихого места разреза, сэмплы (30 мс)
+ENERGY_FRAME_SAMPLES = 480
+
+def quietest_point(audio: np.ndarray, start: int, end: int) -> int:
+    """Середина самого тихого кадра на участке [start, end) аудио"""
+    frames = (end - start) // ENERGY_FRAME_SAMPLES
+    if frames < 1:
+        return end
+    window = audio[start:start + frames * ENERGY_FRAME_SAMPLES].reshape(frames, ENERGY_FRAME_SAMPLES)
+    energy = np.einsum('ij,ij->i', window, window)
+    return start + int(np.argmin(energy)) * ENERGY_FRAME_SAMPLES + ENERGY_FRAME_SAMPLES // 2
+
+def plan_chunks(audio: np.ndarray, boundaries: List[int], max_samples: int,
+                overlap_samples: int) -> List[Tuple[int, int]]:
+    """Разбиение аудио на фрагменты не длиннее max_samples.
+
+    Фрагмент режется по последней паузе (boundaries - границы участков речи
+    после VAD) во второй половине допустимой длины. Если пауз там нет,
+    аудио режется в самом тихом месте, а следующий фрагмент начинается на
+    overlap_samples раньше, чтобы слово на границе не потерялось; повтор
+    слов в перекрытии убирается при склейке.
+    """
+    chunks = []
+    start = 0
+    total = len(audio)
+    while total - start > max_samples:
+        limit = start + max_samples
+        earliest = start + max_samples // 2
+        cuts = [boundary for boundary in boundaries if earliest <= boundary <= limit]
+        if cuts:
+            cut = cuts[-1]
+            next_start = cut
+        else:
+            cut = quietest_point(audio, earliest, limit)
+            next_start = max(start + 1, cut - overlap_samples)
+        chunks.append((start, cut))
+        start = next_start
+    chunks.append((start, total))
+    return chunks
+
+def _normalize(word: str) -> str:
+    """Слово без регистра и знаков препинания для сравнения перекрытий"""
+    return re.sub(r"[^\w]", "", word.lower())
+
+def stitch_texts(texts: List[str], max_overlap_words: int = 8) -> str:
+    """Склейка текстов фрагментов с удалением слов, повторенных в перекрытии"""
+    words: List[str] = []
+    for text in texts:
+        chunk_words = text.split()
+        # Самое длинное совпадение конца склеенного текста с началом фрагмента
+        limit = min(max_overlap_words, len(words), len(chunk_words))
+        for size in range(limit, 0, -1):
+            tail = [_normalize(word) for word in words[-size:]]
+            head = [_normalize(word) for word in chunk_words[:size]]
+            if tail == head and any(tail):
+                chunk_words = chunk_words[size:]
+                break
+        words.extend(chunk_words)
+    return " ".join(words)
+
+def _merge_results(results: List[Any], text: str) -> Any:
+    """Общий результат фрагментов: текст или словарь с языком"""
+    if not isinstance(results[0], dict):
+        return text
+    languages: Counter = Counter()
+    for result in results:
+        languages[result['language']] += result['language_probability']
+    language, total = languages.most_common(1)[0]
+    log_probs = [result['avg_logprob'] for result in results if result.get('avg_logprob') is not None]
+    return {
+        "text": text,
+        "language": language,
+        "language_probability": total / len(results),
+        "avg_logprob": sum(log_probs) / len(log_probs) if log_probs else None,
+    }
+
+class ChunkedJob:
+    """Результат распознавания по фрагментам и статистика, как у InferenceJob"""
+
+    def __init__(self, jobs: List[InferenceJob], result: Any, run_time: float):
+        self.jobs = jobs
+        self.result = result
+        self.chunks = len(jobs)
+        self.queue_depth = jobs[0].queue_depth
+        self.wait_time = jobs[0].wait_time
+        self.batch_size = max(job.batch_size for job in jobs)
+        # Время от начала первого фрагмента до конца последнего
+        self.run_time = run_time
+
+async def transcribe_chunked(executor: InferenceExecutor, audio: np.ndarray, boundaries: List[int],
+                             chunk_s: float = 30.0, overlap_s: float = 1.0, max_parallel: int = 0,
+                             language: Optional[str] = CONFIG_LANGUAGE,
+                             priority: str = INTERACTIVE) -> ChunkedJob:
+    """Параллельное распознавание длинного аудио по фрагментам.
+
+    Фрагменты ставятся в очередь исполнителя не больше max_parallel
+    одновременно (0 - по числу одновременных вызовов исполнителя) и
+    распределяются по репликам; тексты склеиваются в исходном порядке.
+    Фрагменты не объединяются в микро-батчи.
+    """
+    chunks = plan_chunks(audio, boundaries, int(chunk_s * TARGET_SAMPLE_RATE), int(overlap_s * TARGET_SAMPLE_RATE))
+    parallel = max_parallel or executor.max_concurrency
+    semaphore = asyncio.Semaphore(parallel)
+
+    async def run(start: int, end: int) -> InferenceJob:
+        async with semaphore:
+            if language != CONFIG_LANGUAGE:
+                return await executor.submit("transcribe_language", audio[start:end], language, priority=priority)
+            # Без batch_key: фрагменты одного запроса не объединяются в батч на одной
+            # реплике, а выполняются параллельно на разных и с полным декодированием
+            return await executor.submit("transcribe", audio[start:end], priority=priority)
+
+    tasks = [asyncio.ensure_future(run(start, end)) for start, end in chunks]
+    try:
+        jobs = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+    results = [job.result for job in jobs]
+    texts = [result['text'] if isinstance(result, dict) else result for result in results]
+    text = stitch_texts(texts)
+    run_time = max(job.finished_at for job in jobs) - min(job.started_at for job in jobs)
+    logger.debug(f"Аудио {len(audio) / TARGET_SAMPLE_RATE:.1f} с распознано по {len(chunks)} фрагментам "
+                 f"(параллельно до {parallel}) за {run_time:.2f} с")
+    return ChunkedJob(jobs, _merge_results(results, text), run_time)
@@ -0,0 +1,390 @@
+from collections import Counter, deque
+from loguru import logger
+from typing import Any, Dict, Hashable, List, Optional
+import asyncio
+import contextvars
+import math
+import time
+import numpy as np
+
+from ..utils.audio import TARGET_SAMPLE_RATE
+from ..utils.metrics import QUEUE_WAIT_SECONDS, observe_inference
+from ..utils.tracing import current_request_id
+
+# Как часто выводить в лог распределение размеров батчей
+BATCH_STATS_LOG_INTERVAL = 100
+
+# Классы приоритета: интерактивная диктовка и фоновая обработка
+INTERACTIVE = "interactive"
+BATCH = "batch"
+PRIORITY_CLASSES = (INTERACTIVE, BATCH)
+
+# Сколько последних ожиданий в очереди хранится для статистики класса
+WAIT_STATS_WINDOW = 1000
+
+class QueueFullError(Exception):
+    """Очередь инференса переполнена"""
+
+    def __init__(self, queue_depth: int, retry_after: float):
+        super().__init__(f"Очередь инференса переполнена ({queue_depth} запросов)")
+        self.queue_depth = queue_depth
+        self.retry_after = retry_after
+
+class ExecutorClosedError(Exception):
+    """Исполнитель остановлен: модель заменена или выгружена"""
+
+    def __init__(self, retry_after: float = 1):
+        super().__init__("Модель заменена, повторите запрос")
+        self.retry_after = retry_after
+
+class InferenceJob:
+    """Задача инференса и ее статистика ожидания"""
+
+    def __init__(self, method: str, args: tuple, kwargs: dict, queue_depth: int,
+                 batch_key: Optional[Hashable] = None, priority: str = INTERACTIVE):
+        self.method = method
+        self.args = args
+        self.kwargs = kwargs
+        self.queue_depth = queue_depth
+        # Задачи с одинаковым ключом можно объединять в один батч; класс приоритета входит
+        # в ключ, чтобы интерактивный запрос не ждал в батче длинную фоновую задачу
+        self.batch_key = (batch_key, priority) if batch_key is not None else None
+        self.priority = priority
+        # Стоимость задачи - длительность аудио, секунды
+        self.cost = 0.0
+        if args and isinstance(args[0], np.ndarray):
+            self.cost = len(args[0]) / TARGET_SAMPLE_RATE
+        self.batch_size = 1
+        self.enqueued_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.result: Any = None
+        self.future: Optional[asyncio.Future] = None
+        # Контекст поставившего задачу запроса: request_id в логах инференса
+        self.context = contextvars.copy_context()
+        self.request_id = current_request_id.get()
+
+    @property
+    def wait_time(self) -> float:
+        """Время ожидания в очереди, секунды"""
+        if self.started_at is None:
+            return time.monotonic() - self.enqueued_at
+        return self.started_at - self.enqueued_at
+
+    @property
+    def run_time(self) -> float:
+        """Время выполнения инференса, секунды"""
+        if self.started_at is None or self.finished_at is None:
+            return 0.0
+        return self.finished_at - self.started_at
+
+class InferenceExecutor:
+    """Выделенный исполнитель инференса с ограниченной очередью.
+
+    Вызовы модели выполняются в потоках реплик пула, поэтому цикл событий
+    не блокируется. При переполнении очереди новые запросы сразу
+    отклоняются. Лимиты очереди у классов приоритета раздельные
+    (max_queue_size и batch_max_queue_size), поэтому накопившиеся фоновые
+    задачи не приводят к отказам интерактивным запросам.
+
+    Очередь упорядочена по оценке стоимости: первой выполняется задача с
+    наименьшей длительностью аудио плюс batch_offset_s для класса batch
+    минус aging секунд за каждую секунду ожидания. Короткая диктовка не
+    ждет длинный файл, а длинные задачи со временем все равно получают
+    реплику.
+
+    Задачи с одинаковыми batch_key и классом приоритета объединяются в
+    микро-батчи: рабочая задача ждет до batch_max_wait_ms с момента
+    поступления первой задачи или пока не наберется batch_max_size задач
+    и выполняет их одним вызовом transcribe_batch.
+    """
+
+    def __init__(self, pool, max_concurrency: Optional[int] = None, max_queue_size: int = 8,
+                 batch_max_size: int = 1, batch_max_wait_ms: float = 0,
+                 aging: float = 1.0, batch_offset_s: float = 120.0, batch_max_queue_size: int = 8):
+        self.pool = pool
+        # Имя модели для метрик
+        self.model_name = pool.config['model']['model_size']
+        # По умолчанию одновременно выполняется столько задач, сколько выдерживают реплики
+        if max_concurrency is None:
+            max_concurrency = pool.capacity
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue_size = max(0, int(max_queue_size))
+        self.batch_max_queue_size = max(0, int(batch_max_queue_size))
+        self.batch_max_size = max(1, int(batch_max_size))
+        self.batch_max_wait = max(0.0, float(batch_max_wait_ms)) / 1000
+        self.aging = max(0.0, float(aging))
+        self.batch_offset = float(batch_offset_s)
+
+        self._pending: deque = deque()
+        self._cond: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._in_flight = 0
+        self._closed = False
+        # Скользящее среднее времени инференса для оценки Retry-After
+        self._avg_run_time: Optional[float] = None
+        # Распределение размеров выполненных батчей
+        self._batch_sizes: Counter = Counter()
+        self._batches_total = 0
+        # Последние ожидания в очереди по классам приоритета
+        self._wait_times: Dict[str, deque] = {
+            priority: deque(maxlen=WAIT_STATS_WINDOW) for priority in PRIORITY_CLASSES
+        }
+
+    def start(self):
+        """Запуск рабочих задач (требует запущенного цикла событий)"""
+        if self._cond is not None:
+            return
+        self._cond = asyncio.Condition()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        logger.info(f"Исполнитель инференса запущен: потоков {self.max_concurrency}, очередь {self.max_queue_size} "
+                    f"(batch {self.batch_max_queue_size}), "
+                    f"батч до {self.batch_max_size} за {self.batch_max_wait * 1000:.0f} мс")
+
+    async def shutdown(self):
+        """Остановка рабочих задач и пула реплик.
+
+        Задачи, ожидающие в очереди или выполняющиеся в момент остановки,
+        завершаются ExecutorClosedError, чтобы их запросы не ждали вечно.
+        """
+        self._closed = True
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._cond = None
+
+        while self._pending:
+            job = self._pending.popleft()
+            if not job.future.done():
+                job.future.set_exception(ExecutorClosedError())
+        await self.pool.close()
+
+    @property
+    def in_flight(self) -> int:
+        """Количество выполняющихся задач"""
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество задач, ожидающих выполнения"""
+        return len(self._pending)
+
+    def estimate_wait(self, queue_depth: Optional[int] = None) -> float:
+        """Оценка времени ожидания для новой задачи, секунды"""
+        if queue_depth is None:
+            queue_depth = self.queue_depth
+        avg_run_time = self._avg_run_time or 1.0
+        return (queue_depth + self._in_flight) * avg_run_time / self.max_concurrency
+
+    async def submit(self, method: str, *args, batch_key: Optional[Hashable] = None,
+                     priority: str = INTERACTIVE, **kwargs) -> InferenceJob:
+        """Постановка вызова метода транскрайбера в очередь и ожидание результата.
+
+        Если указан batch_key, задача может быть выполнена в составе батча:
+        первым аргументом должно быть аудио, а транскрайбер должен
+        поддерживать transcribe_batch с теми же именованными параметрами.
+        priority - класс приоритета (interactive или batch).
+        """
+        job = await self.enqueue(method, *args, batch_key=batch_key, priority=priority, **kwargs)
+        await job.future
+        return job
+
+    async def enqueue(self, method: str, *args, batch_key: Optional[Hashable] = None,
+                      priority: str = INTERACTIVE, **kwargs) -> InferenceJob:
+        """Постановка задачи в очередь без ожидания результата.
+
+        Переполнение очереди обнаруживается сразу (QueueFullError), а
+        результат ожидается через job.future.
+        """
+        if self._closed:
+            raise ExecutorClosedError()
+        self.start()
+
+        queue_depth = len(self._pending)
+        # Лимит проверяется по задачам своего класса приоритета
+        class_depth = sum(1 for job in self._pending if (job.priority == BATCH) == (priority == BATCH))
+        max_queue_size = self.batch_max_queue_size if priority == BATCH else self.max_queue_size
+        if class_depth >= max_queue_size:
+            retry_after = self.estimate_wait(queue_depth)
+            logger.warning(f"Очередь инференса переполнена: {class_depth} задач класса {priority}, "
+                           f"Retry-After {retry_after:.1f} с")
+            raise QueueFullError(class_depth, retry_after)
+
+        job = InferenceJob(method, args, kwargs, queue_depth, batch_key, priority)
+        job.future = asyncio.get_running_loop().create_future()
+        async with self._cond:
+            self._pending.append(job)
+            self._cond.notify()
+        return job
+
+    def _score(self, job: InferenceJob, now: float) -> float:
+        """Оценка задачи для выбора из очереди: меньше - раньше"""
+        offset = self.batch_offset if job.priority == BATCH else 0.0
+        return job.cost + offset - self.aging * (now - job.enqueued_at)
+
+    def _take_pending(self, batch_key: Optional[Hashable] = None) -> Optional[InferenceJob]:
+        """Извлечение подходящей задачи с наименьшей оценкой, пропуская отмененные"""
+        now = time.monotonic()
+        best = None
+        best_score = 0.0
+        for job in list(self._pending):
+            if job.future.cancelled():
+                # Клиент отключился, пока задача ждала в очереди
+                self._pending.remove(job)
+                continue
+            if batch_key is not None and job.batch_key != batch_key:
+                continue
+            score = self._score(job, now)
+            if best is None or score < best_score:
+                best, best_score = job, score
+        if best is not None:
+            self._pending.remove(best)
+        return best
+
+    async def _next_batch(self) -> List[InferenceJob]:
+        """Ожидание следующей задачи и добор батча из задач с тем же ключом"""
+        async with self._cond:
+            job = None
+            while job is None:
+                await self._cond.wait_for(lambda: len(self._pending) > 0)
+                job = self._take_pending()
+
+            batch = [job]
+            if job.batch_key is None or self.batch_max_size == 1:
+                return batch
+
+            # Окно ожидания отсчитывается от поступления первой задачи:
+            # если она уже ждала в очереди, батч собирается из того, что есть
+            deadline = job.enqueued_at + self.batch_max_wait
+            while len(batch) < self.batch_max_size:
+                other = self._take_pending(job.batch_key)
+                if other is not None:
+                    batch.append(other)
+                    continue
+
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    await asyncio.wait_for(self._cond.wait(), timeout)
+                except asyncio.TimeoutError:
+                    break
+            return batch
+
+    async def _worker(self):
+        """Рабочая задача: берет задачи из очереди и передает их пулу реплик"""
+        while True:
+            batch = await self._next_batch()
+            started_at = time.monotonic()
+            for job in batch:
+                job.started_at = started_at
+                job.batch_size = len(batch)
+                self._record_wait(job)
+
+            self._in_flight += len(batch)
+            try:
+                await self._run_batch(batch)
+            finally:
+                self._in_flight -= len(batch)
+                finished_at = time.monotonic()
+                for job in batch:
+                    job.finished_at = finished_at
+                self._update_run_time(finished_at - started_at)
+                self._record_batch_size(len(batch))
+                observe_inference(
+                    self.model_name,
+                    [job.wait_time for job in batch],
+                    sum(len(job.args[0]) for job in batch if job.args and isinstance(job.args[0], np.ndarray)),
+                    finished_at - started_at
+                )
+
+    async def _run_batch(self, batch: List[InferenceJob]):
+        """Выполнение задачи или батча задач на наименее загруженной реплике"""
+        try:
+            if len(batch) == 1:
+                job = batch[0]
+                # Рабочая задача создана при запуске, поэтому вызов выполняется в контексте запроса
+                call = job.context.run(asyncio.ensure_future, self.pool.run(job.method, *job.args, **job.kwargs))
+                results = [await call]
+            else:
+                call = batch[0].context.run(asyncio.ensure_future, self._run_shared(batch))
+                results = await call
+        except asyncio.CancelledError:
+            # Исполнитель остановлен во время инференса
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_exception(ExecutorClosedError())
+            raise
+        except Exception as e:
+            for job in batch:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            return
+
+        for job, result in zip(batch, results):
+            job.result = result
+            if not job.future.done():
+                job.future.set_result(result)
+
+    async def _run_shared(self, batch: List[InferenceJob]) -> List[Any]:
+        """Вызов transcribe_batch с идентификаторами всех запросов батча в логах"""
+        audios = [job.args[0] for job in batch]
+        request_ids = [job.request_id for job in batch if job.request_id is not None]
+        if not request_ids:
+            return await self.pool.run("transcribe_batch", audios, **batch[0].kwargs)
+        with logger.contextualize(request_id=",".join(request_ids)):
+            return await self.pool.run("transcribe_batch", audios, **batch[0].kwargs)
+
+    def _record_batch_size(self, size: int):
+        """Учет размера батча и периодический вывод распределения"""
+        self._batch_sizes[size] += 1
+        self._batches_total += 1
+        if self._batches_total % BATCH_STATS_LOG_INTERVAL == 0:
+            distribution = ", ".join(f"{k}: {v}" for k, v in sorted(self._batch_sizes.items()))
+            logger.info(f"Распределение размеров батчей за {self._batches_total} батчей: {distribution}")
+
+    def _record_wait(self, job: InferenceJob):
+        """Учет ожидания задачи в очереди по классу приоритета"""
+        priority = job.priority if job.priority in self._wait_times else INTERACTIVE
+        self._wait_times[priority].append(job.wait_time)
+        QUEUE_WAIT_SECONDS.labels(priority=priority).observe(job.wait_time)
+
+    def wait_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Ожидание в очереди по классам приоритета: число задач, среднее и p95, мс"""
+        result = {}
+        for priority, waits in self._wait_times.items():
+            ordered = sorted(waits)
+            result[priority] = {
+                "queued": sum(1 for job in self._pending if job.priority == priority),
+                "samples": len(ordered),
+                "avg_ms": round(1000 * sum(ordered) / len(ordered), 1) if ordered else None,
+                "p95_ms": round(1000 * ordered[max(0, math.ceil(0.95 * len(ordered)) - 1)], 1) if ordered else None,
+            }
+        return result
+
+    def _update_run_time(self, run_time: float):
+        """Обновление скользящего среднего времени инференса"""
+        if self._avg_run_time is None:
+            self._avg_run_time = run_time
+        else:
+            self._avg_run_time = 0.8 * self._avg_run_time + 0.2 * run_time
+
+    def stats(self) -> Dict[str, Any]:
+        """Текущее состояние исполнителя"""
+        return {
+            "queue_depth": self.queue_depth,
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "max_queue_size": self.max_queue_size,
+            "batch_max_queue_size": self.batch_max_queue_size,
+            "avg_run_time": self._avg_run_time,
+            "batch_max_size": self.batch_max_size,
+            "batch_max_wait_ms": self.batch_max_wait * 1000,
+            "batches_total": self._batches_total,
+            "aging": self.aging,
+            "batch_offset_s": self.batch_offset,
+            "queue_wait": self.wait_stats(),
+            "batch_sizes": {str(k): v for k, v in sorted(self._batch_sizes.items())},
+            "replicas": self.pool.stats(),
+        }
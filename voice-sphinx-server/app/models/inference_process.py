@@ -0,0 +1,504 @@
+from multiprocessing import resource_tracker, shared_memory
+from loguru import logger
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import struct
+import threading
+import time
+import numpy as np
+
+from .replica_pool import ReplicaPool, build_replica_specs
+from .whisper_model import TranscriptionCancelled
+
+# Заголовок сообщения: длина JSON-тела, 4 байта big-endian
+HEADER = struct.Struct(">I")
+
+# Сколько ждать появления сокета процесса инференса при подключении, секунды
+CONNECT_TIMEOUT = 600
+# Как часто главный процесс проверяет процессы инференса, секунды
+SUPERVISE_INTERVAL = 1.0
+# Пауза перед перезапуском процесса, который завершается сразу после запуска, секунды
+RESTART_BACKOFF_MAX = 60
+
+# Остановка наблюдения за процессами инференса при завершении сервера
+_stopping = threading.Event()
+
+class InferenceUnavailableError(Exception):
+    """Нет работающих процессов инференса"""
+
+    def __init__(self, retry_after: float = 5):
+        super().__init__("Процессы инференса недоступны, повторите запрос позже")
+        self.retry_after = retry_after
+
+# Ключи-заглушки для аудио, переданного через общую память
+AUDIO_ARG = "__audio__"
+AUDIO_LIST_ARG = "__audios__"
+
+def socket_path(config: Dict[str, Any], index: int) -> str:
+    """Путь к Unix-сокету процесса инференса"""
+    socket_dir = config.get('processes', {}).get('socket_dir', "/tmp/voice-sphinx")
+    return os.path.join(socket_dir, f"inference-{index}.sock")
+
+def process_configs(config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Конфигурации процессов инференса: по одному процессу на реплику модели"""
+    specs = build_replica_specs(config['model'])
+    if specs == [None]:
+        return [config]
+    return [dict(config, model=dict(config['model'], replicas=[spec])) for spec in specs]
+
+async def _send(writer: asyncio.StreamWriter, message: Dict[str, Any]):
+    """Отправка сообщения одним вызовом write, чтобы сообщения не перемешивались"""
+    body = json.dumps(message, ensure_ascii=False).encode('utf-8')
+    writer.write(HEADER.pack(len(body)) + body)
+    await writer.drain()
+
+async def _receive(reader: asyncio.StreamReader) -> Dict[str, Any]:
+    """Чтение одного сообщения (IncompleteReadError при закрытии соединения)"""
+    header = await reader.readexactly(HEADER.size)
+    body = await reader.readexactly(HEADER.unpack(header)[0])
+    return json.loads(body)
+
+def _share_audio(args: tuple) -> Tuple[list, Optional[shared_memory.SharedMemory], List[int]]:
+    """Копирование аудио из аргументов в один сегмент общей памяти.
+
+    Массивы заменяются заглушками с индексами; возвращаются аргументы
+    для передачи, сегмент и длины массивов в сэмплах.
+    """
+    audios: List[np.ndarray] = []
+
+    def placeholder(audio: np.ndarray) -> int:
+        audios.append(np.ascontiguousarray(audio, dtype=np.float32).reshape(-1))
+        return len(audios) - 1
+
+    encoded = []
+    for arg in args:
+        if isinstance(arg, np.ndarray):
+            encoded.append({AUDIO_ARG: placeholder(arg)})
+        elif isinstance(arg, list) and arg and all(isinstance(item, np.ndarray) for item in arg):
+            encoded.append({AUDIO_LIST_ARG: [placeholder(item) for item in arg]})
+        else:
+            encoded.append(arg)
+
+    if not audios:
+        return encoded, None, []
+
+    lengths = [len(audio) for audio in audios]
+    shm = shared_memory.SharedMemory(create=True, size=max(1, sum(lengths) * 4))
+    buffer = np.ndarray((sum(lengths),), dtype=np.float32, buffer=shm.buf)
+    offset = 0
+    for audio in audios:
+        buffer[offset:offset + len(audio)] = audio
+        offset += len(audio)
+    del buffer
+    return encoded, shm, lengths
+
+def _attach_audio(name: str) -> shared_memory.SharedMemory:
+    """Подключение к сегменту общей памяти, созданному HTTP-процессом.
+
+    Сегмент принадлежит HTTP-процессу: трекер ресурсов этого процесса не
+    должен удалять его при выходе.
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+def _restore_args(args: list, shm: Optional[shared_memory.SharedMemory], lengths: List[int]) -> list:
+    """Замена заглушек представлениями аудио в общей памяти (без копирования)"""
+    if shm is None:
+        return args
+
+    views = []
+    offset = 0
+    for length in lengths:
+        views.append(np.ndarray((length,), dtype=np.float32, buffer=shm.buf, offset=offset * 4))
+        offset += length
+
+    restored = []
+    for arg in args:
+        if isinstance(arg, dict) and AUDIO_ARG in arg:
+            restored.append(views[arg[AUDIO_ARG]])
+        elif isinstance(arg, dict) and AUDIO_LIST_ARG in arg:
+            restored.append([views[i] for i in arg[AUDIO_LIST_ARG]])
+        else:
+            restored.append(arg)
+    return restored
+
+class InferenceServer:
+    """Процесс инференса: пул реплик за Unix-сокетом.
+
+    HTTP-процессы передают аудио через общую память, а по сокету идут
+    только короткие JSON-сообщения: вызов метода, сегменты по мере
+    декодирования и результат.
+    """
+
+    def __init__(self, config: Dict[str, Any], path: str):
+        self.config = config
+        self.path = path
+        self.pool: Optional[ReplicaPool] = None
+
+    async def serve(self):
+        """Загрузка модели, прогрев и обслуживание соединений"""
+        from ..utils.audio import synthetic_clip
+
+        started_at = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        self.pool = await loop.run_in_executor(None, lambda: ReplicaPool(config=self.config))
+        await self.pool.warmup(synthetic_clip())
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(self._handle, path=self.path)
+        logger.info(f"Процесс инференса {os.getpid()} готов за {time.perf_counter() - started_at:.2f} с: {self.path}")
+        async with server:
+            await server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Обслуживание соединения HTTP-процесса"""
+        await _send(writer, {
+            "type": "hello",
+            "pid": os.getpid(),
+            "capacity": self.pool.capacity,
+            "replicas": self.pool.stats(),
+        })
+
+        cancelled: Dict[int, threading.Event] = {}
+        tasks = set()
+        try:
+            while True:
+                message = await _receive(reader)
+                if message['type'] == 'cancel':
+                    if message['id'] in cancelled:
+                        cancelled[message['id']].set()
+                    continue
+
+                cancelled[message['id']] = threading.Event()
+                task = asyncio.create_task(self._call(message, writer, cancelled))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            # HTTP-процесс отключился: прерываем его потоковые вызовы
+            for event in cancelled.values():
+                event.set()
+        finally:
+            writer.close()
+
+    async def _call(self, message: Dict[str, Any], writer: asyncio.StreamWriter,
+                    cancelled: Dict[int, threading.Event]):
+        """Выполнение вызова метода транскрайбера и отправка результата"""
+        call_id = message['id']
+        loop = asyncio.get_running_loop()
+        shm = _attach_audio(message['shm']) if message.get('shm') else None
+        try:
+            args = _restore_args(message['args'], shm, message.get('lengths', []))
+            kwargs = dict(message.get('kwargs', {}))
+
+            if message.get('stream'):
+                event = cancelled[call_id]
+
+                def on_segment(segment: Dict[str, Any]):
+                    # Вызывается в потоке реплики
+                    if event.is_set():
+                        raise TranscriptionCancelled()
+                    asyncio.run_coroutine_threadsafe(
+                        _send(writer, {"type": "segment", "id": call_id, "segment": segment}), loop
+                    )
+
+                kwargs['on_segment'] = on_segment
+
+            result = await self.pool.run(message['method'], *args, **kwargs)
+            del args
+            await _send(writer, {"type": "result", "id": call_id, "result": result})
+
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка вызова {message['method']} в процессе инференса: {str(e)}")
+            try:
+                await _send(writer, {"type": "error", "id": call_id, "kind": type(e).__name__, "detail": str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            cancelled.pop(call_id, None)
+            if shm is not None:
+                try:
+                    shm.close()
+                except BufferError:
+                    # Представление аудио еще удерживается: сегмент закроется при выходе
+                    pass
+
+def run_inference_process(config: Dict[str, Any], index: int):
+    """Точка входа процесса инференса"""
+    from ..utils.logging import setup_logging
+
+    setup_logging(config)
+    logger.info(f"Запуск процесса инференса {index} (pid {os.getpid()})")
+    try:
+        asyncio.run(InferenceServer(config, socket_path(config, index)).serve())
+    except KeyboardInterrupt:
+        pass
+
+def _spawn_inference_process(process_config: Dict[str, Any], index: int) -> multiprocessing.Process:
+    """Запуск одного процесса инференса методом spawn"""
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_inference_process,
+        args=(process_config, index),
+        name=f"inference-{index}",
+        daemon=True
+    )
+    process.start()
+    return process
+
+def _supervise(processes: List[multiprocessing.Process], configs: List[Dict[str, Any]]):
+    """Перезапуск аварийно завершившихся процессов инференса (поток главного процесса).
+
+    HTTP-процессы переподключаются к перезапущенному процессу сами; если
+    процесс падает снова вскоре после запуска, пауза перед перезапуском
+    удваивается.
+    """
+    backoff = [SUPERVISE_INTERVAL] * len(processes)
+    started_at = [time.monotonic()] * len(processes)
+    while not _stopping.wait(SUPERVISE_INTERVAL):
+        for index, process in enumerate(processes):
+            if process.is_alive() or _stopping.is_set():
+                continue
+            if time.monotonic() - started_at[index] < RESTART_BACKOFF_MAX:
+                backoff[index] = min(RESTART_BACKOFF_MAX, backoff[index] * 2)
+            else:
+                backoff[index] = SUPERVISE_INTERVAL
+            logger.error(f"Процесс инференса {index} (pid {process.pid}) завершился с кодом {process.exitcode}, "
+                         f"перезапуск через {backoff[index]:.0f} с")
+            if _stopping.wait(backoff[index]):
+                return
+            processes[index] = _spawn_inference_process(configs[index], index)
+            started_at[index] = time.monotonic()
+
+def start_inference_processes(config: Dict[str, Any]) -> List[multiprocessing.Process]:
+    """Запуск процессов инференса, по одному на реплику модели, и наблюдения за ними.
+
+    Используется метод spawn: процессы не наследуют состояние CUDA и
+    потоки родителя. Аварийно завершившийся процесс перезапускается.
+    """
+    configs = process_configs(config)
+    processes = [_spawn_inference_process(process_config, index) for index, process_config in enumerate(configs)]
+    logger.info(f"Запущено процессов инференса: {len(processes)}")
+    _stopping.clear()
+    threading.Thread(target=_supervise, args=(processes, configs), name="inference-supervisor", daemon=True).start()
+    return processes
+
+def stop_inference_processes(processes: List[multiprocessing.Process], timeout: float = 10):
+    """Остановка наблюдения и процессов инференса"""
+    _stopping.set()
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join(timeout)
+
+class _RemoteCall:
+    """Ожидающий результата вызов в процессе инференса"""
+
+    def __init__(self, future: asyncio.Future, on_segment: Optional[Callable[[Dict[str, Any]], None]]):
+        self.future = future
+        self.on_segment = on_segment
+
+class RemoteReplica:
+    """Соединение HTTP-процесса с одним процессом инференса"""
+
+    def __init__(self, index: int, path: str):
+        self.index = index
+        self.path = path
+        self.capacity = 1
+        self.in_flight = 0
+        self.pid: Optional[int] = None
+        self.replicas: List[Dict[str, Any]] = []
+        # Есть ли соединение с процессом; после обрыва процесс исключается из маршрутизации
+        self.alive = False
+        self.failures = 0
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._calls: Dict[int, _RemoteCall] = {}
+        self._ids = itertools.count()
+
+    async def connect(self, timeout: float = CONNECT_TIMEOUT):
+        """Подключение к сокету; процесс инференса может еще загружать модель"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                self._reader, self._writer = await asyncio.open_unix_connection(self.path)
+                break
+            except (FileNotFoundError, ConnectionRefusedError):
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Процесс инференса {self.path} не отвечает")
+                await asyncio.sleep(0.5)
+
+        hello = await _receive(self._reader)
+        self.pid = hello['pid']
+        self.capacity = max(1, int(hello['capacity']))
+        self.replicas = hello['replicas']
+        self._reader_task = asyncio.create_task(self._read_loop())
+        self.alive = True
+        logger.info(f"Подключен процесс инференса {self.index} (pid {self.pid}, емкость {self.capacity})")
+
+    @property
+    def load(self) -> float:
+        """Загрузка процесса относительно его емкости"""
+        return self.in_flight / self.capacity
+
+    async def _read_loop(self):
+        """Разбор ответов процесса инференса"""
+        try:
+            while True:
+                message = await _receive(self._reader)
+                call = self._calls.get(message['id'])
+                if call is None:
+                    continue
+
+                if message['type'] == 'segment':
+                    try:
+                        if call.on_segment is not None:
+                            call.on_segment(message['segment'])
+                    except TranscriptionCancelled:
+                        await _send(self._writer, {"type": "cancel", "id": message['id']})
+                elif message['type'] == 'result':
+                    if not call.future.done():
+                        call.future.set_result(message['result'])
+                elif message['type'] == 'error':
+                    error_class = TranscriptionCancelled if message['kind'] == 'TranscriptionCancelled' else RuntimeError
+                    if not call.future.done():
+                        call.future.set_exception(error_class(message['detail']))
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            logger.error(f"Потеряно соединение с процессом инференса {self.index}: {str(e)}")
+            self.alive = False
+            self.failures += 1
+            for call in self._calls.values():
+                if not call.future.done():
+                    call.future.set_exception(InferenceUnavailableError())
+            self._writer.close()
+            # Главный процесс перезапускает процесс инференса; ждем его сокет
+            self._reader_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        """Повторное подключение к перезапущенному процессу инференса"""
+        while True:
+            try:
+                await self.connect()
+                return
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Процесс инференса {self.index} еще недоступен: {str(e)}")
+                await asyncio.sleep(1)
+
+    async def call(self, method: str, *args, **kwargs) -> Any:
+        """Вызов метода транскрайбера в процессе инференса"""
+        if not self.alive:
+            raise InferenceUnavailableError()
+        on_segment = kwargs.pop('on_segment', None)
+        call_id = next(self._ids)
+        encoded, shm, lengths = _share_audio(args)
+
+        self._calls[call_id] = _RemoteCall(asyncio.get_running_loop().create_future(), on_segment)
+        self.in_flight += 1
+        try:
+            try:
+                await _send(self._writer, {
+                    "type": "call",
+                    "id": call_id,
+                    "method": method,
+                    "args": encoded,
+                    "kwargs": kwargs,
+                    "stream": on_segment is not None,
+                    "shm": shm.name if shm is not None else None,
+                    "lengths": lengths,
+                })
+            except ConnectionError:
+                # Процесс завершился, а чтение ответов еще не обнаружило обрыв
+                raise InferenceUnavailableError()
+            return await self._calls[call_id].future
+        finally:
+            self.in_flight -= 1
+            self._calls.pop(call_id, None)
+            if shm is not None:
+                shm.close()
+                shm.unlink()
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние процесса инференса с точки зрения HTTP-процесса"""
+        return {
+            "index": self.index,
+            "pid": self.pid,
+            "socket": self.path,
+            "alive": self.alive,
+            "failures": self.failures,
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "replicas": self.replicas,
+        }
+
+    def close(self):
+        """Закрытие соединения"""
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+class RemotePool:
+    """Пул процессов инференса с тем же интерфейсом, что и ReplicaPool.
+
+    Используется HTTP-процессами, когда модель загружена в отдельных
+    процессах инференса (processes.enabled).
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.replicas = [RemoteReplica(index, socket_path(config, index))
+                         for index in range(len(process_configs(config)))]
+
+    async def connect(self):
+        """Подключение ко всем процессам инференса"""
+        await asyncio.gather(*[replica.connect() for replica in self.replicas])
+
+    @property
+    def capacity(self) -> int:
+        """Суммарное число одновременных вызовов, которое выдерживают работающие процессы"""
+        return sum(replica.capacity for replica in self.replicas if replica.alive)
+
+    @property
+    def alive(self) -> int:
+        """Число процессов инференса с действующим соединением"""
+        return sum(1 for replica in self.replicas if replica.alive)
+
+    def _least_loaded(self) -> RemoteReplica:
+        """Выбор наименее загруженного из работающих процессов"""
+        alive = [replica for replica in self.replicas if replica.alive]
+        if not alive:
+            raise InferenceUnavailableError()
+        return min(alive, key=lambda replica: (replica.load, replica.in_flight, replica.index))
+
+    async def run(self, method: str, *args, **kwargs) -> Any:
+        """Вызов метода транскрайбера в наименее загруженном процессе"""
+        return await self._least_loaded().call(method, *args, **kwargs)
+
+    async def warmup(self, audio: np.ndarray):
+        """Проверочный вызов каждого процесса (модель в них уже прогрета)"""
+        await asyncio.gather(*[replica.call("transcribe", audio) for replica in self.replicas])
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Состояние всех процессов инференса"""
+        return [replica.stats() for replica in self.replicas]
+
+    def shutdown(self):
+        """Закрытие соединений (процессы инференса останавливает главный процесс)"""
+        for replica in self.replicas:
+            replica.close()
+
+    async def close(self):
+        """Закрытие соединений, как у ReplicaPool.close"""
+        self.shutdown()
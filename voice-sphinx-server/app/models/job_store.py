@@ -0,0 +1,143 @@
+from loguru import logger
+from typing import Any, BinaryIO, Dict, List, Optional
+import json
+import os
+import shutil
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: один процесс сервера, блокировка задач не нужна
+    fcntl = None
+
+# Состояния задачи и файла задачи
+CREATED = "created"
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED_STATUSES = (DONE, FAILED)
+
+class JobStore:
+    """Хранилище фоновых задач транскрипции на диске.
+
+    Каждая задача - каталог с описанием job.json и загруженными файлами.
+    Описание перезаписывается атомарно (через временный файл), поэтому
+    задачи переживают перезапуск сервера, а состояние можно читать из
+    любого HTTP-процесса. Загруженные файлы удаляются после выполнения.
+    """
+
+    def __init__(self, directory: str = "jobs"):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _job_dir(self, job_id: str) -> str:
+        """Каталог задачи"""
+        return os.path.join(self.directory, job_id)
+
+    def input_path(self, job_id: str, index: int) -> str:
+        """Путь к загруженному файлу задачи"""
+        return os.path.join(self._job_dir(job_id), f"input-{index}")
+
+    def create(self, names: List[str], model: Optional[str], webhook_url: Optional[str]) -> Dict[str, Any]:
+        """Описание новой задачи; сохраняется после записи загруженных файлов"""
+        job_id = uuid.uuid4().hex
+        os.makedirs(self._job_dir(job_id))
+        return {
+            "id": job_id,
+            "status": CREATED,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "model": model,
+            "webhook_url": webhook_url,
+            "files": [{"name": name, "status": QUEUED} for name in names],
+        }
+
+    def save_input(self, job_id: str, index: int, source: BinaryIO):
+        """Сохранение загруженного файла на диск без чтения целиком в память"""
+        with open(self.input_path(job_id, index), 'wb') as f:
+            shutil.copyfileobj(source, f)
+
+    def save(self, job: Dict[str, Any]):
+        """Сохранение описания задачи (через временный файл)"""
+        path = os.path.join(self._job_dir(job['id']), "job.json")
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(job, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+
+    def load(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Описание задачи или None, если задачи нет"""
+        # Идентификатор приходит из URL: допускаются только имена каталогов задач
+        if not job_id.isalnum():
+            return None
+        path = os.path.join(self._job_dir(job_id), "job.json")
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def unfinished(self) -> List[str]:
+        """Задачи, не завершенные до перезапуска, в порядке создания"""
+        jobs = []
+        for job_id in os.listdir(self.directory):
+            try:
+                job = self.load(job_id)
+            except Exception as e:
+                logger.warning(f"Не удалось прочитать задачу {job_id}: {str(e)}")
+                continue
+            if job is not None and job['status'] in (QUEUED, RUNNING):
+                jobs.append(job)
+        return [job['id'] for job in sorted(jobs, key=lambda job: job['created_at'])]
+
+    def lock(self, job_id: str) -> Optional[BinaryIO]:
+        """Захват задачи процессом: файл блокировки или None, если задачу выполняет другой процесс.
+
+        Блокировка снимается операционной системой при завершении процесса.
+        """
+        handle = open(os.path.join(self._job_dir(job_id), "lock"), 'ab')
+        if fcntl is None:
+            return handle
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return None
+        return handle
+
+    def remove_inputs(self, job_id: str, count: int):
+        """Удаление загруженных файлов выполненной задачи"""
+        for index in range(count):
+            try:
+                os.unlink(self.input_path(job_id, index))
+            except FileNotFoundError:
+                pass
+
+    def remove(self, job_id: str):
+        """Удаление задачи целиком"""
+        shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+
+    def cleanup(self, retention_s: float) -> int:
+        """Удаление завершенных задач старше retention_s секунд"""
+        now = time.time()
+        removed = 0
+        for job_id in os.listdir(self.directory):
+            try:
+                job = self.load(job_id)
+            except Exception:
+                continue
+            if job is None:
+                # Задача не успела сохраниться (например, сервер остановлен во время загрузки)
+                if now - os.path.getmtime(self._job_dir(job_id)) > retention_s:
+                    self.remove(job_id)
+                continue
+            if job['status'] in FINISHED_STATUSES and now - job['finished_at'] > retention_s:
+                self.remove(job_id)
+                removed += 1
+        if removed:
+            logger.info(f"Удалено завершенных задач: {removed}")
+        return removed
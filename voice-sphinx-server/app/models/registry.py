@@ -0,0 +1,522 @@
+from collections import Counter
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, List, Optional, Union
+import asyncio
+import time
+
+from .executor import InferenceExecutor
+from .inference_process import RemotePool
+from .replica_pool import ReplicaPool, build_replica_specs
+from ..utils.metrics import MODELS_LOADED
+
+# Имя модели, описанной секцией model (прежний формат конфигурации)
+DEFAULT_MODEL_NAME = "default"
+
+# Как часто проверять простаивающие модели, секунды
+IDLE_CHECK_INTERVAL = 30
+
+# Параметры модели, которые применяются без перезагрузки (между запросами)
+LIVE_MODEL_KEYS = ("language", "beam_size", "batch_max_size", "batch_max_wait_ms")
+# Сколько исполнитель замененной модели должен простаивать, чтобы считаться освободившимся, секунды
+DRAIN_SETTLE_S = 1.0
+# Как часто проверять освобождение замененной модели, секунды
+DRAIN_CHECK_INTERVAL = 0.1
+
+# Примерное число параметров моделей Whisper, миллионы
+MODEL_PARAMS_M = {
+    "tiny": 39,
+    "base": 74,
+    "small": 244,
+    "medium": 769,
+    "large": 1550,
+    "turbo": 809,
+    "distil-large": 756,
+    "distil-medium": 394,
+    "distil-small": 166,
+}
+
+# Байт на параметр для типов вычислений CTranslate2
+BYTES_PER_PARAM = {
+    "float32": 4,
+    "float16": 2,
+    "bfloat16": 2,
+    "int8_float32": 1,
+    "int8_float16": 1,
+    "int8_bfloat16": 1,
+    "int8": 1,
+}
+
+# Запас на буферы декодера и активации
+MEMORY_OVERHEAD = 1.3
+
+class ModelUnavailableError(Exception):
+    """Модель нельзя загрузить: бюджет памяти занят моделями с активными запросами"""
+
+    def __init__(self, name: str, retry_after: float = 5):
+        super().__init__(f"Недостаточно памяти для загрузки модели {name}: все загруженные модели заняты")
+        self.retry_after = retry_after
+
+def estimate_memory_mb(model_config: Dict[str, Any]) -> float:
+    """Оценка объема памяти модели по размеру и типу вычислений, МБ"""
+    model_size = str(model_config['model_size'])
+    params = None
+    # Более длинные префиксы проверяются первыми (distil-large раньше large)
+    for prefix in sorted(MODEL_PARAMS_M, key=len, reverse=True):
+        if prefix in model_size:
+            params = MODEL_PARAMS_M[prefix]
+            break
+    if params is None:
+        params = MODEL_PARAMS_M["large"]
+    return params * BYTES_PER_PARAM.get(model_config.get('compute_type', 'float32'), 2) * MEMORY_OVERHEAD
+
+class ModelEntry:
+    """Модель реестра: конфигурация, пул реплик, исполнитель и счетчики"""
+
+    def __init__(self, name: str, config: Dict[str, Any], memory_mb: Dict[str, float], pinned: bool):
+        self.name = name
+        self.config = config
+        # Занимаемая память по типам устройств, МБ
+        self.memory_mb = memory_mb
+        # Модель по умолчанию не выгружается
+        self.pinned = pinned
+
+        self.pool: Optional[Union[ReplicaPool, RemotePool]] = None
+        self.executor: Optional[InferenceExecutor] = None
+        self.leases = 0
+        self.last_used = 0.0
+        self.loading: Optional[asyncio.Task] = None
+
+        self.loads = 0
+        self.hits = 0
+        self.evictions = 0
+        self.idle_unloads = 0
+        self.swaps = 0
+        self.live_updates = 0
+
+    @property
+    def loaded(self) -> bool:
+        """Загружена ли модель"""
+        return self.executor is not None
+
+    @property
+    def busy(self) -> bool:
+        """Есть ли у модели активные запросы"""
+        return self.leases > 0 or (self.executor is not None and
+                                   (self.executor.queue_depth > 0 or self.executor.in_flight > 0))
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние модели"""
+        return {
+            "model_size": self.config['model']['model_size'],
+            "compute_type": self.config['model'].get('compute_type'),
+            "device": self.config['model'].get('device'),
+            "memory_mb": {device: round(mb) for device, mb in self.memory_mb.items()},
+            "loaded": self.loaded,
+            "pinned": self.pinned,
+            "leases": self.leases,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1) if self.loaded else None,
+            "loads": self.loads,
+            "hits": self.hits,
+            "evictions": self.evictions,
+            "idle_unloads": self.idle_unloads,
+            "swaps": self.swaps,
+            "live_updates": self.live_updates,
+        }
+
+class ModelRegistry:
+    """Реестр именованных моделей с ленивой загрузкой.
+
+    Модели загружаются при первом запросе и держатся в пределах бюджета
+    памяти по типам устройств (cuda/cpu): при нехватке памяти выгружаются
+    давно не использовавшиеся модели без активных запросов (LRU). Модели,
+    простаивающие дольше idle_timeout_s, выгружаются фоновой задачей.
+    Модель по умолчанию загружается при старте и не выгружается.
+
+    При изменении конфигурации (reload) параметры декодирования применяются
+    сразу, а модель с измененными параметрами загрузки загружается заново
+    в фоне: запросы переключаются на нее после прогрева, а старая модель
+    выгружается, когда ее запросы завершатся.
+    """
+
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        models_config = config.get('models', {})
+        self.budget_mb: Dict[str, float] = models_config.get('memory_budget_mb', {}) or {}
+        self.idle_timeout = models_config.get('idle_timeout_s', 600)
+        self.default = models_config.get('default', DEFAULT_MODEL_NAME)
+        self.remote = config.get('processes', {}).get('enabled', False)
+
+        self.entries: Dict[str, ModelEntry] = {}
+        for name, (entry_config, memory_mb) in self._registry_configs(config).items():
+            self.entries[name] = ModelEntry(name, entry_config, memory_mb, pinned=name == self.default)
+
+        self._idle_task: Optional[asyncio.Task] = None
+        # Выгрузка замененных моделей после завершения их запросов
+        self._drains: List[asyncio.Task] = []
+        # Память вне записей реестра: загружаемые на замену и еще не выгруженные прежние модели
+        self._reserved_mb: Dict[str, float] = Counter()
+
+    def _registry_configs(self, config: Dict[str, Any]) -> Dict[str, Any]:
+        """Конфигурация и оценка памяти каждой модели реестра"""
+        self.config = config
+        models_config = config.get('models', {})
+        registry = models_config.get('registry', {})
+        if self.default not in registry:
+            registry = dict(registry, **{self.default: {}})
+
+        if self.remote and len(registry) > 1:
+            # Процессы инференса загружают только модель по умолчанию
+            logger.warning("В режиме раздельных процессов доступна только модель по умолчанию")
+            registry = {self.default: registry[self.default]}
+
+        result = {}
+        for name, overrides in registry.items():
+            model_config = self._model_config(overrides)
+            result[name] = (dict(config, model=model_config), self._memory_mb(model_config, overrides))
+        return result
+
+    def _model_config(self, overrides: Dict[str, Any]) -> Dict[str, Any]:
+        """Секция model для модели реестра: параметры модели поверх общих"""
+        if not overrides:
+            return self.config['model']
+        model_config = dict(self.config['model'])
+        model_config.update({key: value for key, value in overrides.items() if key != 'memory_mb'})
+        # Реплики общей секции относятся к модели по умолчанию
+        model_config['replicas'] = overrides.get('replicas', [])
+        return model_config
+
+    @staticmethod
+    def _memory_mb(model_config: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, float]:
+        """Память модели по типам устройств: из memory_mb или оценка по размеру"""
+        memory: Dict[str, float] = Counter()
+        for spec in build_replica_specs(model_config):
+            spec = spec or {}
+            device = spec.get('device', model_config['device'])
+            replica_config = dict(model_config, **spec)
+            memory[device] += overrides.get('memory_mb') or estimate_memory_mb(replica_config)
+        return dict(memory)
+
+    def names(self) -> List[str]:
+        """Имена моделей реестра"""
+        return list(self.entries)
+
+    async def reload(self, config: Dict[str, Any]):
+        """Применение новой конфигурации к моделям реестра"""
+        models_config = config.get('models', {})
+        self.budget_mb = models_config.get('memory_budget_mb', {}) or {}
+        self.idle_timeout = models_config.get('idle_timeout_s', 600)
+        configs = self._registry_configs(config)
+
+        for name, (entry_config, memory_mb) in configs.items():
+            entry = self.entries.get(name)
+            if entry is None:
+                # Новая модель загружается при первом запросе
+                self.entries[name] = ModelEntry(name, entry_config, memory_mb, pinned=name == self.default)
+                logger.info(f"В реестр добавлена модель '{name}'")
+                continue
+
+            if not entry.loaded or self._load_params(entry.config) == self._load_params(entry_config):
+                entry.config, entry.memory_mb = entry_config, memory_mb
+                if entry.loaded:
+                    self._apply_live(entry)
+                continue
+
+            await self._swap(entry, entry_config, memory_mb)
+
+        for name in [name for name in self.entries if name not in configs]:
+            entry = self.entries.pop(name)
+            logger.info(f"Модель '{name}' удалена из реестра")
+            if entry.loaded:
+                executor, entry.executor, entry.pool = entry.executor, None, None
+                self._reserve(entry.memory_mb, 1)
+                self._drains.append(asyncio.create_task(self._drain(name, executor, entry.memory_mb)))
+        self._update_gauge()
+
+    @staticmethod
+    def _load_params(config: Dict[str, Any]) -> Dict[str, Any]:
+        """Параметры модели, изменение которых требует загрузки модели заново"""
+        return {key: value for key, value in config['model'].items() if key not in LIVE_MODEL_KEYS}
+
+    def _apply_live(self, entry: ModelEntry):
+        """Применение параметров декодирования и очереди к загруженной модели"""
+        server_config = entry.config['server']
+        model_config = entry.config['model']
+        entry.pool.config = entry.config
+        for replica in entry.pool.replicas:
+            # Вызовы модели читают язык и beam_size из конфигурации транскрайбера
+            replica.transcriber.config = entry.config
+        executor = entry.executor
+        executor.max_queue_size = max(0, int(server_config.get('max_queue_size', 8)))
+        executor.batch_max_queue_size = max(0, int(server_config.get('batch_max_queue_size', 8)))
+        executor.batch_max_size = max(1, int(model_config.get('batch_max_size', 8)))
+        executor.batch_max_wait = max(0.0, float(model_config.get('batch_max_wait_ms', 10))) / 1000
+        executor.aging = max(0.0, float(server_config.get('priority_aging', 1.0)))
+        executor.batch_offset = float(server_config.get('batch_priority_offset_s', 120))
+        entry.live_updates += 1
+        logger.info(f"Параметры декодирования модели '{entry.name}' обновлены: язык {model_config['language']}, "
+                    f"beam_size {model_config['beam_size']}")
+
+    async def _swap(self, entry: ModelEntry, config: Dict[str, Any], memory_mb: Dict[str, float]):
+        """Загрузка модели с новыми параметрами и атомарное переключение запросов на нее"""
+        started_at = time.perf_counter()
+        logger.info(f"Замена модели '{entry.name}': загрузка {config['model']['model_size']} "
+                    f"({config['model'].get('compute_type')}) в фоне")
+        # До переключения в памяти находятся обе модели
+        try:
+            await self._make_room(entry, memory_mb, extra=True)
+        except ModelUnavailableError:
+            logger.error(f"Модель '{entry.name}' не заменена: прежняя и новая модели вместе не помещаются "
+                         f"в бюджет памяти {self.budget_mb}; используется прежняя, новые параметры "
+                         f"применятся после перезапуска")
+            return
+
+        self._reserve(memory_mb, 1)
+        pool = None
+        try:
+            pool = await run_in_threadpool(ReplicaPool, config=config)
+            from ..utils.audio import synthetic_clip
+            await pool.warmup(synthetic_clip())
+        except Exception as e:
+            # Запросы продолжают обслуживаться прежней моделью
+            logger.error(f"Не удалось загрузить новую модель '{entry.name}', используется прежняя: {str(e)}")
+            if pool is not None:
+                # Реплики новой модели освобождаются до снятия резерва памяти
+                await pool.close()
+            return
+        finally:
+            self._reserve(memory_mb, -1)
+
+        # Переключение без ожидания: новые запросы сразу идут в новый исполнитель
+        old_executor, old_memory_mb = entry.executor, entry.memory_mb
+        entry.config, entry.memory_mb = config, memory_mb
+        entry.pool, entry.executor = pool, self._create_executor(pool)
+        entry.last_used = time.monotonic()
+        entry.swaps += 1
+        self._update_gauge()
+        logger.info(f"Модель '{entry.name}' заменена за {time.perf_counter() - started_at:.2f} с")
+        self._reserve(old_memory_mb, 1)
+        self._drains.append(asyncio.create_task(self._drain(entry.name, old_executor, old_memory_mb)))
+
+    def _reserve(self, memory_mb: Dict[str, float], sign: int):
+        """Учет (sign=1) или освобождение (sign=-1) памяти модели вне записей реестра"""
+        for device, mb in memory_mb.items():
+            self._reserved_mb[device] += sign * mb
+
+    async def _drain(self, name: str, executor: InferenceExecutor, memory_mb: Dict[str, float]):
+        """Выгрузка прежней модели после завершения поставленных в нее запросов.
+
+        Память модели учтена через _reserve до запуска задачи и освобождается после выгрузки.
+        """
+        drain_timeout = self.config.get('models', {}).get('drain_timeout_s', 300)
+        started_at = time.monotonic()
+        # При остановке сервера ожидание прерывается, а модель выгружается сразу
+        try:
+            await self._wait_idle(executor, drain_timeout)
+        finally:
+            await executor.shutdown()
+            self._reserve(memory_mb, -1)
+        self._drains = [task for task in self._drains if not task.done() and task is not asyncio.current_task()]
+        self._update_gauge()
+        logger.info(f"Прежняя модель '{name}' выгружена через {time.monotonic() - started_at:.1f} с после замены")
+
+    async def _wait_idle(self, executor: InferenceExecutor, drain_timeout: float):
+        """Ожидание, пока исполнитель не перестанет получать и выполнять задачи"""
+        started_at = time.monotonic()
+        idle_since = None
+        while time.monotonic() - started_at < drain_timeout:
+            if executor.queue_depth == 0 and executor.in_flight == 0:
+                # Запрос из нескольких вызовов (фрагменты) ставит следующий вызов сразу
+                idle_since = idle_since or time.monotonic()
+                if time.monotonic() - idle_since >= DRAIN_SETTLE_S:
+                    break
+            else:
+                idle_since = None
+            await asyncio.sleep(DRAIN_CHECK_INTERVAL)
+        else:
+            logger.warning(f"Прежняя модель не освободилась за {drain_timeout} с и будет выгружена")
+
+    def _create_executor(self, pool) -> InferenceExecutor:
+        """Исполнитель инференса для пула реплик модели"""
+        server_config = self.config['server']
+        model_config = pool.config['model']
+        executor = InferenceExecutor(
+            pool,
+            max_concurrency=server_config.get('max_concurrency'),
+            max_queue_size=server_config.get('max_queue_size', 8),
+            batch_max_size=model_config.get('batch_max_size', 8),
+            batch_max_wait_ms=model_config.get('batch_max_wait_ms', 10),
+            aging=server_config.get('priority_aging', 1.0),
+            batch_offset_s=server_config.get('batch_priority_offset_s', 120),
+            batch_max_queue_size=server_config.get('batch_max_queue_size', 8)
+        )
+        executor.start()
+        return executor
+
+    async def load(self, name: str, warmup: bool = True) -> ModelEntry:
+        """Загрузка модели (одновременные вызовы ждут одну загрузку)"""
+        entry = self.entries[name]
+        if entry.loaded:
+            return entry
+        if entry.loading is None:
+            entry.loading = asyncio.ensure_future(self._load(entry, warmup))
+        try:
+            await asyncio.shield(entry.loading)
+        finally:
+            if entry.loading is not None and entry.loading.done():
+                entry.loading = None
+        return entry
+
+    async def _load(self, entry: ModelEntry, warmup: bool):
+        """Освобождение памяти, создание пула реплик и исполнителя"""
+        await self._make_room(entry)
+
+        started_at = time.perf_counter()
+        logger.info(f"Загрузка модели '{entry.name}' ({entry.config['model']['model_size']})")
+        if self.remote:
+            # Модель загружена в отдельных процессах инференса
+            pool = RemotePool(entry.config)
+        else:
+            pool = await run_in_threadpool(ReplicaPool, config=entry.config)
+
+        try:
+            if self.remote:
+                await pool.connect()
+            if warmup:
+                from ..utils.audio import synthetic_clip
+                await pool.warmup(synthetic_clip())
+        except BaseException:
+            # Реплики не остаются в памяти после неудачной загрузки
+            await pool.close()
+            raise
+
+        entry.pool = pool
+        entry.executor = self._create_executor(pool)
+        entry.last_used = time.monotonic()
+        entry.loads += 1
+        self._update_gauge()
+        logger.info(f"Модель '{entry.name}' загружена за {time.perf_counter() - started_at:.2f} с")
+
+    def _used_mb(self, device: str) -> float:
+        """Память, занятая загруженными, загружающимися и выгружаемыми моделями на устройстве"""
+        return self._reserved_mb.get(device, 0) + sum(
+            entry.memory_mb.get(device, 0) for entry in self.entries.values()
+            if entry.loaded or entry.loading is not None
+        )
+
+    async def _make_room(self, entry: ModelEntry, memory_mb: Optional[Dict[str, float]] = None,
+                         extra: bool = False):
+        """Выгрузка давно не использовавшихся моделей, пока новая не поместится в бюджет.
+
+        extra - память memory_mb занимается в дополнение к уже загруженной
+        модели entry (замена модели); такая загрузка не превышает бюджет.
+        """
+        memory_mb = entry.memory_mb if memory_mb is None else memory_mb
+        for device, needed in memory_mb.items():
+            budget = self.budget_mb.get(device)
+            if budget is None:
+                continue
+            if needed > budget:
+                logger.warning(f"Модель '{entry.name}' ({needed:.0f} МБ) больше бюджета {device} ({budget} МБ)")
+            additional = needed if extra else 0
+
+            # Память загружаемой модели уже учтена в _used_mb
+            while self._used_mb(device) + additional > budget:
+                candidates = [other for other in self.entries.values()
+                              if other is not entry and other.loaded and not other.pinned
+                              and not other.busy and other.memory_mb.get(device)]
+                if not candidates:
+                    if needed > budget and not extra:
+                        break
+                    raise ModelUnavailableError(entry.name)
+                victim = min(candidates, key=lambda other: other.last_used)
+                victim.evictions += 1
+                logger.info(f"Модель '{victim.name}' выгружена для освобождения памяти {device}")
+                await self._unload(victim)
+
+    async def _unload(self, entry: ModelEntry):
+        """Остановка исполнителя и освобождение реплик модели"""
+        executor, entry.executor, entry.pool = entry.executor, None, None
+        if executor is not None:
+            await executor.shutdown()
+        self._update_gauge()
+
+    async def acquire(self, name: Optional[str] = None) -> ModelEntry:
+        """Модель для запроса: загружается при необходимости и не выгружается до release"""
+        name = name or self.default
+        if name not in self.entries:
+            raise KeyError(name)
+
+        entry = self.entries[name]
+        if entry.loaded:
+            entry.hits += 1
+        entry.leases += 1
+        try:
+            await self.load(name)
+        except BaseException:
+            entry.leases -= 1
+            raise
+        entry.last_used = time.monotonic()
+        return entry
+
+    def release(self, entry: ModelEntry):
+        """Завершение использования модели запросом"""
+        entry.leases -= 1
+        entry.last_used = time.monotonic()
+
+    def start(self):
+        """Запуск фоновой выгрузки простаивающих моделей"""
+        if self.idle_timeout and self._idle_task is None:
+            self._idle_task = asyncio.create_task(self._idle_loop())
+
+    async def _idle_loop(self):
+        """Выгрузка моделей, простаивающих дольше idle_timeout_s"""
+        while True:
+            await asyncio.sleep(min(IDLE_CHECK_INTERVAL, self.idle_timeout))
+            # Во время выгрузки reload или load могут изменить реестр: обходится копия,
+            # а состояние каждой модели проверяется заново после предыдущей выгрузки
+            for entry in list(self.entries.values()):
+                now = time.monotonic()
+                if (self.entries.get(entry.name) is entry and entry.loaded and entry.loading is None
+                        and not entry.pinned and not entry.busy and now - entry.last_used > self.idle_timeout):
+                    entry.idle_unloads += 1
+                    logger.info(f"Модель '{entry.name}' выгружена после {now - entry.last_used:.0f} с простоя")
+                    try:
+                        await self._unload(entry)
+                    except Exception as e:
+                        logger.error(f"Не удалось выгрузить модель '{entry.name}': {str(e)}")
+
+    def _update_gauge(self):
+        """Число загруженных реплик всех моделей"""
+        MODELS_LOADED.set(sum(len(entry.pool.replicas) for entry in self.entries.values() if entry.loaded))
+
+    async def shutdown(self):
+        """Остановка фоновой задачи и выгрузка всех моделей"""
+        if self._idle_task is not None:
+            self._idle_task.cancel()
+            self._idle_task = None
+        for task in self._drains:
+            task.cancel()
+        await asyncio.gather(*self._drains, return_exceptions=True)
+        self._drains = []
+        for entry in self.entries.values():
+            if entry.loaded:
+                await self._unload(entry)
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние реестра: модели, занятая память и счетчики"""
+        devices = set(self.budget_mb) | {device for entry in self.entries.values() for device in entry.memory_mb}
+        return {
+            "default": self.default,
+            "memory_mb": {
+                device: {"used": round(self._used_mb(device)), "budget": self.budget_mb.get(device)}
+                for device in sorted(devices)
+            },
+            "loads": sum(entry.loads for entry in self.entries.values()),
+            "hits": sum(entry.hits for entry in self.entries.values()),
+            "evictions": sum(entry.evictions for entry in self.entries.values()),
+            "idle_unloads": sum(entry.idle_unloads for entry in self.entries.values()),
+            "swaps": sum(entry.swaps for entry in self.entries.values()),
+            "draining": len(self._drains),
+            "models": {name: entry.stats() for name, entry in self.entries.items()},
+        }
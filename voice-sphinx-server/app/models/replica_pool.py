@@ -0,0 +1,153 @@
+from concurrent.futures import ThreadPoolExecutor
+from loguru import logger
+from typing import Any, Dict, List, Optional, Set
+import asyncio
+import contextvars
+import json
+import os
+import numpy as np
+
+from .whisper_model import WhisperTranscriber
+
+def _pin_thread(cores: Optional[Set[int]]):
+    """Привязка текущего потока к набору ядер CPU (только Linux).
+
+    Потоки CTranslate2, созданные из этого потока, наследуют привязку.
+    """
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+def transcriber_class(config: Dict[str, Any]) -> type:
+    """Класс транскрайбера: заглушка для нагрузочного теста (model.stub) или Whisper"""
+    if config['model'].get('stub'):
+        from .stub_model import StubTranscriber
+        return StubTranscriber
+    return WhisperTranscriber
+
+def build_replica_specs(model_config: Dict[str, Any]) -> List[Optional[Dict[str, Any]]]:
+    """Список спецификаций реплик из секции model конфигурации.
+
+    Если список replicas не задан, используется одна реплика с параметрами
+    из самой секции model (прежний формат конфигурации).
+    """
+    specs = [dict(spec) for spec in model_config.get('replicas', [])]
+    if not specs:
+        return [None]
+
+    # Реплики на CPU без явного списка ядер получают непересекающиеся наборы
+    cpu_specs = [spec for spec in specs
+                 if spec.get('device', model_config.get('device')) == 'cpu' and 'cpu_cores' not in spec]
+    if cpu_specs and hasattr(os, "sched_getaffinity"):
+        available = sorted(os.sched_getaffinity(0))
+        default_threads = max(1, len(available) // len(cpu_specs))
+        offset = 0
+        for spec in cpu_specs:
+            threads = spec.get('cpu_threads') or default_threads
+            cores = available[offset:offset + threads]
+            if len(cores) < threads:
+                logger.warning(f"Недостаточно ядер CPU для реплики: нужно {threads}, осталось {len(cores)}")
+            if cores:
+                spec['cpu_cores'] = cores
+                spec['cpu_threads'] = len(cores)
+            offset += threads
+
+    return specs
+
+class Replica:
+    """Экземпляр модели с собственным пулом потоков"""
+
+    def __init__(self, index: int, config: Dict[str, Any], spec: Optional[Dict[str, Any]]):
+        self.index = index
+        self.spec = spec or {}
+        self.capacity = max(1, int(self.spec.get('num_workers', config['model'].get('num_workers', 1))))
+        self.in_flight = 0
+
+        cores = set(self.spec['cpu_cores']) if 'cpu_cores' in self.spec else None
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.capacity,
+            thread_name_prefix=f"replica-{index}",
+            initializer=_pin_thread,
+            initargs=(cores,)
+        )
+        if cores:
+            logger.info(f"Реплика {index} привязана к ядрам CPU: {sorted(cores)}")
+
+        # Модель создается в потоке реплики, чтобы ее потоки унаследовали привязку к ядрам
+        self.transcriber = self.executor.submit(transcriber_class(config), config=config, replica=spec).result()
+
+    @property
+    def load(self) -> float:
+        """Загрузка реплики относительно ее емкости"""
+        return self.in_flight / self.capacity
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние реплики"""
+        return {
+            "index": self.index,
+            "device": self.spec.get('device'),
+            "device_index": self.spec.get('device_index'),
+            "compute_type": self.spec.get('compute_type'),
+            "cpu_cores": self.spec.get('cpu_cores'),
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+        }
+
+    def shutdown(self):
+        """Остановка пула потоков реплики"""
+        self.executor.shutdown(wait=True)
+
+class ReplicaPool:
+    """Пул реплик модели с диспетчеризацией на наименее загруженную реплику"""
+
+    def __init__(self, config_path: str = "config.json", config: Optional[Dict[str, Any]] = None):
+        if config is None:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        self.config = config
+
+        specs = build_replica_specs(self.config['model'])
+        logger.info(f"Создание пула из {len(specs)} реплик модели")
+        self.replicas = [Replica(i, self.config, spec) for i, spec in enumerate(specs)]
+
+    @property
+    def capacity(self) -> int:
+        """Суммарное число одновременных вызовов, которое выдерживает пул"""
+        return sum(replica.capacity for replica in self.replicas)
+
+    def _least_loaded(self) -> Replica:
+        """Выбор наименее загруженной реплики"""
+        return min(self.replicas, key=lambda replica: (replica.load, replica.in_flight, replica.index))
+
+    async def run(self, method: str, *args, **kwargs) -> Any:
+        """Вызов метода транскрайбера на наименее загруженной реплике"""
+        replica = self._least_loaded()
+        replica.in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            bound = getattr(replica.transcriber, method)
+            # run_in_executor не переносит contextvars: без копии контекста теряется request_id в логах
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(replica.executor, lambda: context.run(bound, *args, **kwargs))
+        finally:
+            replica.in_flight -= 1
+
+    async def warmup(self, audio: np.ndarray):
+        """Прогревочный инференс на каждой реплике"""
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(replica.executor, contextvars.copy_context().run, replica.transcriber.transcribe, audio)
+            for replica in self.replicas
+        ])
+
+    def stats(self) -> List[Dict[str, Any]]:
+        """Состояние всех реплик"""
+        return [replica.stats() for replica in self.replicas]
+
+    def shutdown(self):
+        """Остановка всех реплик"""
+        for replica in self.replicas:
+            replica.shutdown()
+
+    async def close(self):
+        """Остановка реплик вне цикла событий: ожидание текущего инференса не блокирует сервер"""
+        await asyncio.get_running_loop().run_in_executor(None, self.shutdown)
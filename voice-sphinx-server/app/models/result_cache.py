@@ -0,0 +1,222 @@
+from collections import OrderedDict
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import os
+import numpy as np
+
+# Оценка накладных расходов на запись в памяти, байты
+ENTRY_OVERHEAD_BYTES = 256
+
+class ResultCache:
+    """Кэш результатов транскрипции с адресацией по содержимому.
+
+    Ключ - хэш декодированного PCM вместе с параметрами декодирования.
+    Результаты хранятся в LRU-кэше в памяти с ограничением объема и,
+    опционально, на диске с отдельным ограничением объема (при
+    переполнении удаляются давно не использовавшиеся записи). Одновременные запросы с одинаковым ключом
+    ожидают одно и то же вычисление (single-flight).
+    """
+
+    def __init__(self, max_memory_mb: float = 64, disk_dir: Optional[str] = None, max_disk_mb: float = 256):
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.max_disk_bytes = int(max_disk_mb * 1024 * 1024)
+        self.disk_dir = disk_dir
+
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._memory_bytes = 0
+        # Записи на диске от давно не использовавшихся к недавним: ключ -> размер файла
+        self._disk_entries: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._in_flight: Dict[str, asyncio.Task] = {}
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.shared = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._scan_disk()
+
+    @staticmethod
+    def make_key(audio: np.ndarray, options: Dict[str, Any]) -> str:
+        """Ключ кэша: хэш PCM и параметров декодирования"""
+        digest = hashlib.blake2b(digest_size=20)
+        digest.update(np.ascontiguousarray(audio, dtype=np.float32).tobytes())
+        digest.update(json.dumps(options, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _disk_path(self, key: str) -> str:
+        """Путь к файлу записи на диске"""
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _scan_disk(self):
+        """Учет записей, сохраненных до перезапуска (порядок - по времени изменения)"""
+        files = []
+        for name in os.listdir(self.disk_dir):
+            path = os.path.join(self.disk_dir, name)
+            if name.endswith(".tmp"):
+                # Запись, прерванная остановкой сервера
+                self._remove_files([path])
+            elif name.endswith(".json"):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(files):
+            self._index_disk(key, size)
+        self._remove_files([self._disk_path(key) for key in self._evict_disk()])
+        logger.info(f"Дисковый кэш {self.disk_dir}: записей {len(self._disk_entries)}, "
+                    f"{self._disk_bytes / 1024 / 1024:.1f} МБ")
+
+    def _index_disk(self, key: str, size: int):
+        """Учет записи на диске как самой недавней"""
+        if key in self._disk_entries:
+            self._disk_bytes -= self._disk_entries.pop(key)
+        self._disk_entries[key] = size
+        self._disk_bytes += size
+
+    def _evict_disk(self) -> List[str]:
+        """Ключи самых старых записей, которые нужно удалить с диска для соблюдения лимита"""
+        evicted = []
+        while self._disk_bytes > self.max_disk_bytes and self._disk_entries:
+            key, size = self._disk_entries.popitem(last=False)
+            self._disk_bytes -= size
+            self.disk_evictions += 1
+            evicted.append(key)
+        return evicted
+
+    @staticmethod
+    def _remove_files(paths: List[str]):
+        """Удаление файлов записей"""
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Не удалось удалить запись кэша {path}: {str(e)}")
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        """Чтение записи с диска"""
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"Не удалось прочитать запись кэша {key}: {str(e)}")
+            return None
+
+    def _write_disk(self, key: str, value: Any) -> Optional[int]:
+        """Запись результата на диск (через временный файл); размер файла или None при ошибке"""
+        path = self._disk_path(key)
+        try:
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(value, f, ensure_ascii=False)
+            os.replace(temp_path, path)
+            return os.path.getsize(path)
+        except Exception as e:
+            logger.warning(f"Не удалось сохранить запись кэша {key}: {str(e)}")
+            return None
+
+    def _remember(self, key: str, value: Any):
+        """Добавление записи в память с вытеснением самых старых"""
+        size = len(json.dumps(value, ensure_ascii=False).encode('utf-8')) + ENTRY_OVERHEAD_BYTES
+        if size > self.max_memory_bytes:
+            return
+
+        if key in self._entries:
+            self._memory_bytes -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._memory_bytes += size
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self._memory_bytes -= evicted_size
+            self.evictions += 1
+
+    async def get(self, key: str) -> Optional[Any]:
+        """Поиск результата в памяти, затем на диске"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        if self.disk_dir:
+            value = await run_in_threadpool(self._read_disk, key)
+            if value is not None:
+                self._remember(key, value)
+                if key in self._disk_entries:
+                    self._disk_entries.move_to_end(key)
+                self.disk_hits += 1
+                return value
+
+        return None
+
+    async def put(self, key: str, value: Any):
+        """Сохранение результата в памяти и на диске"""
+        self._remember(key, value)
+        if self.disk_dir:
+            size = await run_in_threadpool(self._write_disk, key, value)
+            if size is None:
+                return
+            # Учет ведется в цикле событий, файлы удаляются в пуле потоков
+            self._index_disk(key, size)
+            evicted = self._evict_disk()
+            if evicted:
+                await run_in_threadpool(self._remove_files, [self._disk_path(evicted_key) for evicted_key in evicted])
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Tuple[Any, str]:
+        """Результат из кэша или общего вычисления.
+
+        Возвращает результат и источник: 'hit', 'shared' или 'miss'.
+        """
+        value = await self.get(key)
+        if value is not None:
+            return value, "hit"
+
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.shared += 1
+            # shield: отключение одного клиента не отменяет вычисление для остальных
+            return await asyncio.shield(task), "shared"
+
+        self.misses += 1
+        task = asyncio.ensure_future(self._compute(key, compute))
+        self._in_flight[key] = task
+        return await asyncio.shield(task), "miss"
+
+    async def _compute(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Вычисление результата и сохранение его в кэш"""
+        try:
+            value = await compute()
+            await self.put(key, value)
+            return value
+        finally:
+            self._in_flight.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кэша"""
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "memory_bytes": self._memory_bytes,
+            "max_memory_bytes": self.max_memory_bytes,
+            "disk_entries": len(self._disk_entries),
+            "disk_bytes": self._disk_bytes,
+            "max_disk_bytes": self.max_disk_bytes if self.disk_dir else None,
+            "disk_evictions": self.disk_evictions,
+            "in_flight": len(self._in_flight),
+        }
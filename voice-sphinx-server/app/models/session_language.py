@@ -0,0 +1,105 @@
+from collections import Counter, OrderedDict
+from loguru import logger
+from typing import Any, Dict, List, Optional, Tuple
+import time
+
+class SessionLanguage:
+    """Язык сессии: последние определения, выбранный язык и уверенность"""
+
+    def __init__(self):
+        # Последние определения языка: (язык, вероятность)
+        self.detections: List[Tuple[str, float]] = []
+        self.language: Optional[str] = None
+        self.confidence = 0.0
+        self.expires_at = 0.0
+        # Уверенность упала: следующая фраза определяет язык заново
+        self.needs_detection = True
+
+class SessionLanguageCache:
+    """Кэш языка по идентификатору сессии.
+
+    Язык определяется моделью на первых detect_utterances фразах сессии;
+    затем язык, набравший наибольшую суммарную вероятность, используется без
+    повторного определения (без лишнего прохода энкодера), пока не истечет
+    TTL. Если распознавание с сохраненным языком дает низкий средний log-prob
+    (признак неверного языка), язык определяется заново на следующей фразе.
+    """
+
+    def __init__(self, ttl_s: float = 1800, detect_utterances: int = 2, min_confidence: float = 0.7,
+                 min_avg_logprob: float = -1.0, max_sessions: int = 10000):
+        self.ttl = ttl_s
+        self.detect_utterances = max(1, int(detect_utterances))
+        self.min_confidence = min_confidence
+        self.min_avg_logprob = min_avg_logprob
+        self.max_sessions = max_sessions
+
+        self._sessions: "OrderedDict[str, SessionLanguage]" = OrderedDict()
+
+        self.hits = 0
+        self.detections = 0
+        self.redetections = 0
+        self.expired = 0
+
+    def _session(self, session_id: str) -> SessionLanguage:
+        """Сессия по идентификатору; просроченная сессия начинается заново"""
+        now = time.monotonic()
+        session = self._sessions.get(session_id)
+        if session is not None and session.expires_at < now:
+            self.expired += 1
+            session = None
+        if session is None:
+            session = SessionLanguage()
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session_id)
+        session.expires_at = now + self.ttl
+        return session
+
+    def language_for(self, session_id: str) -> Optional[str]:
+        """Язык для следующей фразы сессии или None, если его нужно определить"""
+        session = self._session(session_id)
+        if session.needs_detection or session.language is None:
+            return None
+        self.hits += 1
+        return session.language
+
+    def record_detection(self, session_id: str, language: str, probability: float):
+        """Учет языка, определенного моделью"""
+        session = self._session(session_id)
+        self.detections += 1
+        session.detections = (session.detections + [(language, probability)])[-self.detect_utterances:]
+
+        totals: Counter = Counter()
+        for detected, detected_probability in session.detections:
+            totals[detected] += detected_probability
+        best, total = totals.most_common(1)[0]
+        session.confidence = total / len(session.detections)
+
+        # Язык закрепляется после нескольких уверенных определений
+        confirmed = len(session.detections) >= self.detect_utterances and session.confidence >= self.min_confidence
+        if confirmed and (session.language != best or session.needs_detection):
+            logger.info(f"Язык сессии {session_id}: {best} (уверенность {session.confidence:.2f})")
+        session.language = best
+        session.needs_detection = not confirmed
+
+    def record_result(self, session_id: str, avg_logprob: Optional[float]):
+        """Проверка результата, распознанного с сохраненным языком"""
+        if avg_logprob is None or avg_logprob >= self.min_avg_logprob:
+            return
+        session = self._session(session_id)
+        if not session.needs_detection:
+            self.redetections += 1
+            session.needs_detection = True
+            logger.info(f"Уверенность распознавания сессии {session_id} упала (avg_logprob {avg_logprob:.2f}), "
+                        f"язык будет определен заново")
+
+    def stats(self) -> Dict[str, Any]:
+        """Счетчики кэша языков"""
+        return {
+            "sessions": len(self._sessions),
+            "hits": self.hits,
+            "detections": self.detections,
+            "redetections": self.redetections,
+            "expired": self.expired,
+        }
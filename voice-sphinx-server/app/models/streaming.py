@@ -0,0 +1,228 @@
+from loguru import logger
+from typing import Any, Dict, List, Optional
+import numpy as np
+import re
+
+from .executor import InferenceExecutor, QueueFullError
+from ..utils.audio import TARGET_SAMPLE_RATE
+
+# Сколько символов подтвержденного текста передавать модели как подсказку
+PROMPT_MAX_CHARS = 200
+# Длина кадра для проверки нового аудио на тишину, сэмплы (30 мс)
+ENERGY_FRAME_SAMPLES = 480
+# Сколько тишины оставлять в начале окна перед следующей фразой, секунды
+SILENCE_KEEP_S = 0.5
+# Меньше этого нового аудио в конце потока не распознается заново, секунды
+FINISH_MIN_NEW_S = 0.3
+
+_NORMALIZE_RE = re.compile(r"[^\w]+", re.UNICODE)
+
+def _normalize(word: str) -> str:
+    """Нормализация слова для сравнения гипотез"""
+    return _NORMALIZE_RE.sub("", word).lower()
+
+def _join_words(words: List[Dict[str, Any]]) -> str:
+    """Склейка слов faster-whisper (слова уже содержат ведущие пробелы)"""
+    return "".join(word['word'] for word in words).strip()
+
+class StreamingSession:
+    """Потоковое распознавание одного соединения.
+
+    Аудио накапливается в буфере фиксированного размера. На каждом шаге
+    окно буфера распознается заново, а слова, совпавшие в двух
+    последовательных гипотезах (LocalAgreement), считаются окончательными:
+    они отправляются как финальный сегмент, а аудио до их конца удаляется
+    из буфера. Остаток гипотезы отправляется как промежуточный результат.
+
+    Кодировщик Whisper обрабатывает окно целиком, поэтому результат для
+    уже слышанного аудио нельзя переиспользовать после добавления нового.
+    Чтобы вычисления на шаге не росли с длиной потока, окно не содержит
+    подтвержденного аудио, а тишина без неподтвержденных слов удаляется
+    из буфера без вызова модели (silence_rms - порог RMS, 0 - выключено).
+    Если к концу потока после последнего шага добавлено меньше
+    FINISH_MIN_NEW_S аудио, остаток гипотезы этого шага подтверждается
+    без повторного распознавания.
+    """
+
+    def __init__(self, executor: InferenceExecutor, step_ms: float = 1000, max_buffer_s: float = 30,
+                 silence_rms: float = 0.01):
+        self.executor = executor
+        self.step_samples = int(TARGET_SAMPLE_RATE * step_ms / 1000)
+        self.max_samples = int(TARGET_SAMPLE_RATE * max_buffer_s)
+        self.silence_rms = silence_rms
+
+        # Буфер выделяется один раз, память соединения ограничена
+        self._buffer = np.zeros(self.max_samples, dtype=np.float32)
+        self._length = 0
+        # Абсолютное время начала буфера от начала потока, секунды
+        self._offset = 0.0
+        self._since_step = 0
+
+        self._previous: List[Dict[str, Any]] = []
+        self._committed_text = ""
+
+        # Конец буфера на момент последнего распознавания, сэмплы от начала буфера
+        self._recognized_length = 0
+        # Заканчивалось ли последнее распознанное окно тишиной
+        self._tail_silent = False
+
+        # Статистика шагов: распознано, пропущено на тишине, конец потока без вызова модели
+        self.steps = 0
+        self.silent_steps = 0
+        self.reused_finishes = 0
+        self.recognized_seconds = 0.0
+
+    @property
+    def buffered_seconds(self) -> float:
+        """Длительность аудио в буфере, секунды"""
+        return self._length / TARGET_SAMPLE_RATE
+
+    @property
+    def step_due(self) -> bool:
+        """Накопилось ли достаточно нового аудио для следующего шага"""
+        return self._since_step >= self.step_samples
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика шагов: вызовы модели, пропущенные паузы и длительность распознанных окон"""
+        return {
+            "steps": self.steps,
+            "silent_steps": self.silent_steps,
+            "reused_finishes": self.reused_finishes,
+            "recognized_seconds": round(self.recognized_seconds, 2),
+        }
+
+    def append(self, audio: np.ndarray):
+        """Добавление фрагмента аудио в буфер"""
+        overflow = self._length + len(audio) - self.max_samples
+        if overflow > 0:
+            # Буфер переполнен без подтвержденных слов: отбрасываем самое старое аудио
+            logger.warning(f"Буфер потока переполнен, отброшено {overflow / TARGET_SAMPLE_RATE:.2f} с аудио")
+            self._trim(min(overflow, self._length))
+            if len(audio) > self.max_samples:
+                self._offset += (len(audio) - self.max_samples) / TARGET_SAMPLE_RATE
+                audio = audio[-self.max_samples:]
+
+        self._buffer[self._length:self._length + len(audio)] = audio
+        self._length += len(audio)
+        self._since_step += len(audio)
+
+    def _trim(self, samples: int):
+        """Удаление обработанного аудио из начала буфера"""
+        if samples <= 0:
+            return
+        remaining = self._length - samples
+        self._buffer[:remaining] = self._buffer[samples:self._length]
+        self._length = remaining
+        self._offset += samples / TARGET_SAMPLE_RATE
+        self._recognized_length = max(0, self._recognized_length - samples)
+
+    def _silent(self, start: int, end: int) -> bool:
+        """Нет ли речи на участке [start, end) буфера: RMS каждого кадра ниже silence_rms"""
+        if not self.silence_rms:
+            return False
+        frames = (end - start) // ENERGY_FRAME_SAMPLES
+        if frames < 1:
+            return False
+        window = self._buffer[start:start + frames * ENERGY_FRAME_SAMPLES].reshape(frames, ENERGY_FRAME_SAMPLES)
+        energy = np.einsum('ij,ij->i', window, window) / ENERGY_FRAME_SAMPLES
+        return bool(energy.max() < self.silence_rms ** 2)
+
+    def _prompt(self) -> Optional[str]:
+        """Хвост подтвержденного текста как подсказка для модели"""
+        if not self._committed_text:
+            return None
+        return self._committed_text[-PROMPT_MAX_CHARS:]
+
+    async def _recognize(self) -> Optional[List[Dict[str, Any]]]:
+        """Распознавание текущего окна; слова возвращаются с абсолютным временем"""
+        window = self._buffer[:self._length].copy()
+        try:
+            job = await self.executor.submit("transcribe_words", window, self._prompt())
+        except QueueFullError:
+            logger.warning("Очередь инференса переполнена, шаг потокового распознавания пропущен")
+            return None
+
+        self.steps += 1
+        self.recognized_seconds += self._length / TARGET_SAMPLE_RATE
+        self._recognized_length = self._length
+        # Слово, обрезанное концом окна, модель может не вернуть: тишину после
+        # него можно пропускать, только если окно уже заканчивалось паузой
+        self._tail_silent = self._silent(max(0, self._length - int(SILENCE_KEEP_S * TARGET_SAMPLE_RATE)),
+                                         self._length)
+        return [
+            {"start": self._offset + word['start'], "end": self._offset + word['end'], "word": word['word']}
+            for word in job.result
+        ]
+
+    def _commit(self, words: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Фиксация слов как окончательных и удаление их аудио из буфера"""
+        if not words:
+            return None
+
+        end = words[-1]['end']
+        self._trim(min(self._length, int(round((end - self._offset) * TARGET_SAMPLE_RATE))))
+
+        text = _join_words(words)
+        self._committed_text = f"{self._committed_text} {text}".strip()
+        return {"type": "final", "text": text, "start": words[0]['start'], "end": end}
+
+    async def step(self) -> List[Dict[str, Any]]:
+        """Шаг распознавания: возвращает финальные и промежуточные сообщения"""
+        self._since_step = 0
+        if self._length == 0:
+            return []
+
+        if not self._previous and self._tail_silent and self._silent(self._recognized_length, self._length):
+            # Пауза без неподтвержденных слов: модель не вызывается, а тишина
+            # удаляется из буфера, оставляя запас перед началом следующей фразы
+            self.silent_steps += 1
+            self._trim(self._length - int(SILENCE_KEEP_S * TARGET_SAMPLE_RATE))
+            self._recognized_length = self._length
+            return []
+
+        hypothesis = await self._recognize()
+        if hypothesis is None:
+            return []
+
+        # Подтверждаем общий префикс двух последовательных гипотез
+        agreed = 0
+        for previous, current in zip(self._previous, hypothesis):
+            if _normalize(previous['word']) != _normalize(current['word']):
+                break
+            agreed += 1
+
+        # Буфер почти заполнен: подтверждаем всю гипотезу, кроме последнего слова
+        if self._length + self.step_samples >= self.max_samples and agreed < len(hypothesis) - 1:
+            agreed = len(hypothesis) - 1
+
+        messages = []
+        final = self._commit(hypothesis[:agreed])
+        if final is not None:
+            messages.append(final)
+
+        self._previous = hypothesis[agreed:]
+        if self._previous:
+            messages.append({
+                "type": "partial",
+                "text": _join_words(self._previous),
+                "start": self._previous[0]['start'],
+                "end": self._previous[-1]['end']
+            })
+        return messages
+
+    async def finish(self) -> List[Dict[str, Any]]:
+        """Распознавание остатка буфера в конце потока"""
+        if self._length == 0:
+            return []
+
+        if self._recognized_length and self._length - self._recognized_length < FINISH_MIN_NEW_S * TARGET_SAMPLE_RATE:
+            # После последнего шага почти ничего не добавлено (например, stop
+            # сразу после шага): подтверждается остаток его гипотезы
+            self.reused_finishes += 1
+            hypothesis = self._previous
+        else:
+            hypothesis = await self._recognize()
+        self._previous = []
+        final = self._commit(hypothesis or [])
+        self._trim(self._length)
+        return [final] if final is not None else []
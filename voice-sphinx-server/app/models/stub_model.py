@@ -0,0 +1,106 @@
+from loguru import logger
+from typing import Any, Callable, Dict, List, Optional, Union
+import hashlib
+import time
+import numpy as np
+import soundfile as sf
+
+from .whisper_model import CONFIG_LANGUAGE
+from ..utils.audio import TARGET_SAMPLE_RATE
+
+# Длина сегмента заглушки, секунды
+SEGMENT_SECONDS = 5.0
+# Слов в секунду аудио для потокового распознавания
+WORDS_PER_SECOND = 2
+
+class StubTranscriber:
+    """Детерминированная заглушка WhisperTranscriber для нагрузочного тестирования.
+
+    Модель не загружается: каждый вызов спит delay_ms плюс rtf * длительность
+    аудио и возвращает текст, зависящий только от содержимого аудио. Так
+    можно измерить накладные расходы HTTP и приема аудио на любой машине
+    без GPU. Включается секцией model.stub конфигурации.
+    """
+
+    def __init__(self, config_path: str = "config.json", config: Optional[Dict[str, Any]] = None,
+                 replica: Optional[Dict[str, Any]] = None):
+        self.config = config
+        stub_config = config['model']['stub']
+        self.delay = stub_config.get('delay_ms', 50) / 1000
+        self.rtf = stub_config.get('rtf', 0.0)
+        logger.info(f"Используется заглушка модели: задержка {self.delay * 1000:.0f} мс, RTF {self.rtf}")
+
+    @staticmethod
+    def _load(audio: Union[str, np.ndarray]) -> np.ndarray:
+        """Аудио из массива или файла (режим отладки)"""
+        if isinstance(audio, str):
+            audio, _ = sf.read(audio, dtype='float32')
+        return audio
+
+    @staticmethod
+    def _text(audio: np.ndarray) -> str:
+        """Текст, однозначно определяемый содержимым аудио"""
+        digest = hashlib.blake2b(np.ascontiguousarray(audio).tobytes(), digest_size=4).hexdigest()
+        return f"stub {digest} {len(audio) / TARGET_SAMPLE_RATE:.2f}s"
+
+    def _sleep(self, samples: int):
+        """Имитация времени инференса"""
+        time.sleep(self.delay + self.rtf * samples / TARGET_SAMPLE_RATE)
+
+    def transcribe(self, audio: Union[str, np.ndarray]) -> str:
+        """Транскрипция аудио: путь к файлу или массив float32 16kHz моно"""
+        audio = self._load(audio)
+        self._sleep(len(audio))
+        return self._text(audio)
+
+    def transcribe_segments(self, audio: Union[str, np.ndarray],
+                            on_segment: Optional[Callable[[Dict[str, Any]], None]] = None,
+                            language: Optional[str] = CONFIG_LANGUAGE) -> Dict[str, Any]:
+        """Транскрипция с передачей каждого сегмента в on_segment"""
+        audio = self._load(audio)
+        duration = len(audio) / TARGET_SAMPLE_RATE
+        segment_samples = int(SEGMENT_SECONDS * TARGET_SAMPLE_RATE)
+
+        segments = []
+        for start in range(0, len(audio), segment_samples):
+            chunk = audio[start:start + segment_samples]
+            self._sleep(len(chunk))
+            item = {
+                "start": start / TARGET_SAMPLE_RATE,
+                "end": min(duration, (start + len(chunk)) / TARGET_SAMPLE_RATE),
+                "text": self._text(chunk)
+            }
+            segments.append(item)
+            if on_segment is not None:
+                on_segment(item)
+
+        return {
+            "text": " ".join(item['text'] for item in segments),
+            "segments": segments,
+            **self._language_info(language),
+        }
+
+    def _language_info(self, language: Optional[str]) -> Dict[str, Any]:
+        """Язык результата: заданный или язык конфигурации с полной уверенностью"""
+        if language is None or language == CONFIG_LANGUAGE:
+            language = self.config['model'].get('language') or "en"
+        return {"language": language, "language_probability": 1.0, "avg_logprob": -0.2}
+
+    def transcribe_language(self, audio: Union[str, np.ndarray], language: Optional[str] = None) -> Dict[str, Any]:
+        """Транскрипция с заданным языком или с определением языка"""
+        return {"text": self.transcribe(audio), **self._language_info(language)}
+
+    def transcribe_words(self, audio: np.ndarray, initial_prompt: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Транскрипция окна потокового распознавания с временными метками слов"""
+        self._sleep(len(audio))
+        duration = len(audio) / TARGET_SAMPLE_RATE
+        count = int(duration * WORDS_PER_SECOND)
+        return [
+            {"start": i / WORDS_PER_SECOND, "end": (i + 1) / WORDS_PER_SECOND, "word": f" w{i}"}
+            for i in range(count)
+        ]
+
+    def transcribe_batch(self, audios: List[np.ndarray]) -> List[str]:
+        """Пакетная транскрипция: одна задержка на батч, как у настоящей модели"""
+        self._sleep(sum(len(audio) for audio in audios))
+        return [self._text(audio) for audio in audios]
@@ -1,31 +1,69 @@
 from faster_whisper import WhisperModel
+from faster_whisper.audio import pad_or_trim
+from faster_whisper.tokenizer import Tokenizer
 from loguru import logger
+import numpy as np
 import json
 import os
 import sys
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from ..utils.logging import transcript
+
+# Максимальная длина последовательности токенов декодера Whisper
+MAX_DECODE_LENGTH = 448
+# Пороги отсева тишины, как в faster-whisper
+NO_SPEECH_THRESHOLD = 0.6
+LOG_PROB_THRESHOLD = -1.0
+
+# Значение параметра language: язык из конфигурации модели
+CONFIG_LANGUAGE = "config"
+
+def join_segments(texts: List[str]) -> str:
+    """Текст из сегментов: как у батча, без ведущих и двойных пробелов"""
+    return " ".join(text for text in (text.strip() for text in texts) if text)
+
+class TranscriptionCancelled(Exception):
+    """Транскрипция прервана: результат больше никому не нужен"""
 
 class WhisperTranscriber:
-    def __init__(self, config_path: str = "config.json"):
-        """Инициализация модели Whisper"""
-        with open(config_path, 'r', encoding='utf-8') as f:
-            self.config = json.load(f)
+    def __init__(self, config_path: str = "config.json", config: Optional[Dict[str, Any]] = None,
+                 replica: Optional[Dict[str, Any]] = None):
+        """Инициализация модели Whisper.
+
+        replica - параметры конкретной реплики (device, device_index,
+        compute_type, cpu_threads, num_workers); если не задана, параметры
+        берутся из секции model конфигурации.
+        """
+        if config is None:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        self.config = config
         
         model_config = self.config['model']
         logger.info(f"Загрузка модели Whisper {model_config['model_size']}...")
         
         try:
-            # Устанавливаем переменную окружения для выбора GPU из конфигурации
-            if 'cuda_device' in model_config:
-                os.environ["CUDA_VISIBLE_DEVICES"] = str(model_config['cuda_device'])
-                logger.info(f"Используется GPU: {model_config['cuda_device']}")
+            if replica is None:
+                # Устанавливаем переменную окружения для выбора GPU из конфигурации
+                if 'cuda_device' in model_config:
+                    os.environ["CUDA_VISIBLE_DEVICES"] = str(model_config['cuda_device'])
+                    logger.info(f"Используется GPU: {model_config['cuda_device']}")
+                replica = {}
+            
+            device = replica.get('device', model_config['device'])
+            compute_type = replica.get('compute_type', model_config['compute_type'])
             
             # Инициализируем модель с правильными параметрами
             self.model = WhisperModel(
                 model_size_or_path=model_config['model_size'],
-                device=model_config['device'],
-                compute_type=model_config['compute_type']
+                device=device,
+                device_index=replica.get('device_index', 0),
+                compute_type=compute_type,
+                cpu_threads=replica.get('cpu_threads', model_config.get('cpu_threads', 0)),
+                num_workers=replica.get('num_workers', model_config.get('num_workers', 1))
             )
-            logger.info("Модель успешно загружена")
+            logger.info(f"Модель успешно загружена ({device}:{replica.get('device_index', 0)}, {compute_type})")
             
         except Exception as e:
             logger.error(f"Ошибка при инициализации модели: {str(e)}")
@@ -36,17 +74,17 @@ class WhisperTranscriber:
             logger.error("4. Достаточно ли VRAM для загрузки модели")
             raise
         
-    def transcribe(self, audio_path: str) -> str:
-        """Транскрипция аудиофайла"""
+    def transcribe(self, audio: Union[str, np.ndarray]) -> str:
+        """Транскрипция аудио: путь к файлу или массив float32 16kHz моно"""
         try:
             segments, _ = self.model.transcribe(
-                audio_path,
+                audio,
                 language=self.config['model']['language'],
                 beam_size=self.config['model']['beam_size']
             )
             
-            text = " ".join([segment.text for segment in segments])
-            logger.info(f"Текст успешно распознан: {text[:100]}...")
+            text = join_segments([segment.text for segment in segments])
+            logger.debug(f"Текст успешно распознан: {transcript(text)}")
             return text
             
         except Exception as e:
@@ -55,4 +93,180 @@ class WhisperTranscriber:
             logger.error("1. Корректность входного аудиофайла")
             logger.error("2. Достаточно ли VRAM для обработки")
             logger.error("3. Не произошло ли отключение GPU")
-            raise 
\ No newline at end of file
+            raise
+
+    def _language(self, language: Optional[str]) -> Optional[str]:
+        """Язык декодирования: из конфигурации, заданный или None (определить)"""
+        if language == CONFIG_LANGUAGE:
+            return self.config['model']['language']
+        return language
+
+    def transcribe_segments(self, audio: Union[str, np.ndarray],
+                            on_segment: Optional[Callable[[Dict[str, Any]], None]] = None,
+                            language: Optional[str] = CONFIG_LANGUAGE) -> Dict[str, Any]:
+        """Транскрипция с передачей каждого сегмента в on_segment сразу после декодирования"""
+        try:
+            segments, info = self.model.transcribe(
+                audio,
+                language=self._language(language),
+                beam_size=self.config['model']['beam_size']
+            )
+            
+            result_segments = []
+            log_probs = []
+            for segment in segments:
+                item = {"start": segment.start, "end": segment.end, "text": segment.text.strip()}
+                result_segments.append(item)
+                log_probs.append(segment.avg_logprob)
+                if on_segment is not None:
+                    on_segment(item)
+            
+            text = join_segments([item['text'] for item in result_segments])
+            logger.debug(f"Текст успешно распознан: {transcript(text)}")
+            return {
+                "text": text,
+                "segments": result_segments,
+                "language": info.language,
+                "language_probability": info.language_probability,
+                "avg_logprob": float(np.mean(log_probs)) if log_probs else None,
+            }
+            
+        except TranscriptionCancelled:
+            logger.info("Транскрипция прервана: клиент отключился")
+            raise
+        except Exception as e:
+            logger.error(f"Ошибка при транскрипции: {str(e)}")
+            raise
+
+    def transcribe_language(self, audio: Union[str, np.ndarray], language: Optional[str] = None) -> Dict[str, Any]:
+        """Транскрипция с заданным языком или с определением языка (language=None).
+
+        Возвращает текст, язык с вероятностью и средний log-prob сегментов,
+        по которому можно судить, подходит ли заданный язык.
+        """
+        try:
+            segments, info = self.model.transcribe(
+                audio,
+                language=self._language(language),
+                beam_size=self.config['model']['beam_size']
+            )
+            
+            texts = []
+            log_probs = []
+            for segment in segments:
+                texts.append(segment.text)
+                log_probs.append(segment.avg_logprob)
+            
+            text = join_segments(texts)
+            logger.debug(f"Текст успешно распознан ({info.language}, {info.language_probability:.2f}): {transcript(text)}")
+            return {
+                "text": text,
+                "language": info.language,
+                "language_probability": info.language_probability,
+                "avg_logprob": float(np.mean(log_probs)) if log_probs else None,
+            }
+            
+        except Exception as e:
+            logger.error(f"Ошибка при транскрипции: {str(e)}")
+            raise
+
+    def transcribe_words(self, audio: np.ndarray, initial_prompt: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Транскрипция окна потокового распознавания с временными метками слов"""
+        try:
+            segments, _ = self.model.transcribe(
+                audio,
+                language=self.config['model']['language'],
+                beam_size=self.config['model']['beam_size'],
+                initial_prompt=initial_prompt,
+                word_timestamps=True,
+                condition_on_previous_text=False
+            )
+            
+            words = []
+            for segment in segments:
+                for word in segment.words or []:
+                    words.append({"start": word.start, "end": word.end, "word": word.word})
+            return words
+            
+        except Exception as e:
+            logger.error(f"Ошибка при потоковой транскрипции: {str(e)}")
+            raise
+
+    def transcribe_batch(self, audios: List[np.ndarray]) -> List[str]:
+        """Пакетная транскрипция нескольких коротких клипов одним вызовом модели.
+
+        Клипы не длиннее одного окна Whisper (30 с) кодируются и декодируются
+        вместе; более длинные транскрибируются по отдельности.
+        """
+        if len(audios) == 1:
+            return [self.transcribe(audios[0])]
+
+        try:
+            texts: List[str] = [""] * len(audios)
+            n_samples = self.model.feature_extractor.n_samples
+
+            short_indices = []
+            for i, audio in enumerate(audios):
+                if len(audio) <= n_samples:
+                    short_indices.append(i)
+                else:
+                    texts[i] = self.transcribe(audio)
+
+            if len(short_indices) == 1:
+                texts[short_indices[0]] = self.transcribe(audios[short_indices[0]])
+            elif short_indices:
+                batch_texts = self._decode_batch([audios[i] for i in short_indices])
+                for i, text in zip(short_indices, batch_texts):
+                    texts[i] = text
+
+            logger.debug(f"Батч из {len(audios)} клипов успешно распознан")
+            return texts
+
+        except Exception as e:
+            logger.error(f"Ошибка при пакетной транскрипции: {str(e)}")
+            raise
+
+    def _decode_batch(self, audios: List[np.ndarray]) -> List[str]:
+        """Кодирование и декодирование батча клипов в пределах одного окна"""
+        model_config = self.config['model']
+
+        features = np.stack([pad_or_trim(self.model.feature_extractor(audio)) for audio in audios])
+        encoder_output = self.model.encode(features)
+
+        # Язык общий из конфигурации либо определяется для каждого клипа
+        languages = [model_config['language']] * len(audios)
+        if model_config['language'] is None:
+            detected = self.model.model.detect_language(encoder_output)
+            languages = [probs[0][0][2:-2] for probs in detected]
+
+        tokenizers = {
+            language: Tokenizer(
+                self.model.hf_tokenizer,
+                self.model.model.is_multilingual,
+                task="transcribe",
+                language=language
+            )
+            for language in set(languages)
+        }
+        prompts = [
+            self.model.get_prompt(tokenizers[language], [], without_timestamps=True)
+            for language in languages
+        ]
+
+        results = self.model.model.generate(
+            encoder_output,
+            prompts,
+            beam_size=model_config['beam_size'],
+            max_length=MAX_DECODE_LENGTH,
+            return_scores=True,
+            return_no_speech_prob=True
+        )
+
+        texts = []
+        for language, result in zip(languages, results):
+            # Отбрасываем клипы без речи, чтобы не получать галлюцинации
+            if result.no_speech_prob > NO_SPEECH_THRESHOLD and result.scores[0] < LOG_PROB_THRESHOLD:
+                texts.append("")
+                continue
+            texts.append(tokenizers[language].decode(result.sequences_ids[0]).strip())
+        return texts
@@ -0,0 +1,283 @@
+from contextlib import contextmanager
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, Optional, Tuple
+import asyncio
+import time
+
+from .config import read_changed_config, set_config
+from .models.autotune import apply_autotune
+from .models.executor import InferenceExecutor
+from .models.registry import ModelEntry, ModelRegistry
+from .models.result_cache import ResultCache
+from .models.session_language import SessionLanguageCache
+from .utils.audio import synthetic_clip
+from .utils.vad import compact_silence
+
+# Параметры, которые применяются только после перезапуска сервера
+RESTART_KEYS = [
+    ("server", "host"), ("server", "port"), ("server", "log_level"), ("server", "max_concurrency"),
+    ("models", "default"), ("processes",), ("cache",), ("sessions",), ("logging",), ("jobs",),
+]
+
+class Runtime:
+    """Состояние процесса сервера: реестр моделей и кэш результатов.
+
+    Модель по умолчанию загружается в фоновой задаче при старте приложения,
+    после чего выполняется прогревочный инференс на синтетическом клипе.
+    Только после этого сервер сообщает о готовности. Остальные модели
+    реестра загружаются при первом запросе.
+
+    После запуска файл конфигурации проверяется каждые config_poll_s
+    секунд; изменения применяются без перезапуска (см. ModelRegistry.reload).
+
+    При остановке (SIGTERM) сервер переходит в режим draining: новые
+    запросы отклоняются с 503, а начатые завершаются в пределах
+    drain_timeout_s.
+    """
+
+    def __init__(self):
+        self.config: Optional[Dict[str, Any]] = None
+        self.models: Optional[ModelRegistry] = None
+        self.cache: Optional[ResultCache] = None
+        self.sessions: Optional[SessionLanguageCache] = None
+        self.ready = False
+        self.error: Optional[str] = None
+        # Длительность фаз запуска, секунды
+        self.phases: Dict[str, float] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._watch_task: Optional[asyncio.Task] = None
+        self.reloads = 0
+        self.draining = False
+        # Срок завершения начатых запросов при остановке (time.monotonic)
+        self.drain_deadline: Optional[float] = None
+        # Запросы /transcribe, обрабатываемые в данный момент
+        self.active_requests = 0
+
+    @property
+    def executor(self) -> Optional[InferenceExecutor]:
+        """Исполнитель инференса модели по умолчанию"""
+        if self.models is None:
+            return None
+        return self.models.entries[self.models.default].executor
+
+    @property
+    def accepting(self) -> bool:
+        """Принимает ли сервер новые запросы"""
+        return self.ready and not self.draining
+
+    def inference_processes(self) -> Optional[Dict[str, int]]:
+        """Число работающих процессов инференса (только в режиме раздельных процессов)"""
+        if self.models is None or not self.models.remote or not self.ready:
+            return None
+        pool = self.executor.pool
+        return {"alive": pool.alive, "total": len(pool.replicas)}
+
+    @property
+    def status(self) -> str:
+        """Состояние сервера: starting, ready, draining или failed"""
+        if self.draining:
+            return "draining"
+        if self.error is not None:
+            return "failed"
+        return "ready" if self.ready else "starting"
+
+    @contextmanager
+    def track_request(self):
+        """Учет запроса, обрабатываемого в данный момент"""
+        self.active_requests += 1
+        try:
+            yield
+        finally:
+            self.active_requests -= 1
+
+    def begin_drain(self, delay_s: float = 0.0):
+        """Переход в режим draining: новые запросы отклоняются, начатые завершаются.
+
+        delay_s - сколько сервер еще принимает соединения (и отвечает 503 на
+        проверки готовности), чтобы балансировщик успел исключить его.
+        """
+        if self.draining:
+            return
+        self.draining = True
+        drain_timeout = self.config['server'].get('drain_timeout_s', 60) if self.config else 60
+        self.drain_deadline = time.monotonic() + delay_s + drain_timeout
+        logger.info(f"Остановка сервера: новые запросы не принимаются, начатые завершатся "
+                    f"в течение {delay_s + drain_timeout:.0f} с (активных запросов: {self.active_requests})")
+
+    def drain_remaining(self) -> float:
+        """Время до срока завершения начатых запросов, секунды"""
+        if self.drain_deadline is None:
+            return self.config['server'].get('drain_timeout_s', 60) if self.config else 60
+        return max(0.0, self.drain_deadline - time.monotonic())
+
+    def load(self) -> Dict[str, Any]:
+        """Нагрузка сервера для балансировщика: очереди, выполняющиеся задачи и оценка ожидания"""
+        body: Dict[str, Any] = {
+            "status": self.status,
+            "ready": self.ready,
+            "draining": self.draining,
+            "active_requests": self.active_requests,
+        }
+        if self.models is None or not self.ready:
+            return body
+        processes = self.inference_processes()
+        if processes is not None:
+            body["inference_processes"] = processes
+
+        models = {}
+        for name, entry in self.models.entries.items():
+            if not entry.loaded:
+                continue
+            executor = entry.executor
+            models[name] = {
+                "queue_depth": executor.queue_depth,
+                "in_flight": executor.in_flight,
+                "max_concurrency": executor.max_concurrency,
+                "max_queue_size": executor.max_queue_size,
+                "estimated_wait_s": round(executor.estimate_wait(), 2),
+            }
+        default = models[self.models.default]
+        body.update(
+            queue_depth=sum(model['queue_depth'] for model in models.values()),
+            in_flight=sum(model['in_flight'] for model in models.values()),
+            # Оценка ожидания нового запроса к модели по умолчанию
+            estimated_wait_s=default['estimated_wait_s'],
+            models=models,
+        )
+        return body
+
+    def start(self, config: Dict[str, Any]):
+        """Запуск загрузки модели в фоновой задаче"""
+        self.config = config
+        self._task = asyncio.create_task(self._start())
+
+    async def _start(self):
+        """Загрузка модели, прогрев и переход в состояние готовности"""
+        started_at = time.perf_counter()
+        try:
+            if self.config.get('autotune', {}).get('enabled', False):
+                # Решение берется из кэша; замер выполняется только при первом запуске на машине
+                with self._phase("autotune"):
+                    self.config = await run_in_threadpool(apply_autotune, self.config)
+
+            self.models = ModelRegistry(self.config)
+            with self._phase("model_load"):
+                default = await self.models.load(self.models.default, warmup=False)
+
+            cache_config = self.config.get('cache', {})
+            if cache_config.get('enabled', True):
+                self.cache = ResultCache(
+                    max_memory_mb=cache_config.get('max_memory_mb', 64),
+                    disk_dir=cache_config.get('disk_dir'),
+                    max_disk_mb=cache_config.get('max_disk_mb', 256)
+                )
+
+            sessions_config = self.config.get('sessions', {})
+            if sessions_config.get('enabled', True):
+                self.sessions = SessionLanguageCache(
+                    ttl_s=sessions_config.get('ttl_s', 1800),
+                    detect_utterances=sessions_config.get('detect_utterances', 2),
+                    min_confidence=sessions_config.get('min_confidence', 0.7),
+                    min_avg_logprob=sessions_config.get('min_avg_logprob', -1.0)
+                )
+
+            with self._phase("warmup"):
+                await self._warmup(default)
+
+            self.models.start()
+            self._start_watch()
+            self.ready = True
+            self.phases["total"] = time.perf_counter() - started_at
+            logger.info(f"Сервер готов к работе за {self.phases['total']:.2f} с "
+                        f"(фазы: {', '.join(f'{k} {v:.2f} с' for k, v in self.phases.items())})")
+
+        except Exception as e:
+            self.error = str(e)
+            logger.error(f"Не удалось подготовить модель к работе: {str(e)}")
+
+    async def _warmup(self, entry: ModelEntry):
+        """Прогревочный инференс на каждой реплике и загрузка модели VAD"""
+        clip = synthetic_clip()
+
+        if self.config.get('vad', {}).get('enabled', True):
+            await run_in_threadpool(compact_silence, clip)
+
+        await entry.pool.warmup(clip)
+
+    @contextmanager
+    def _phase(self, name: str):
+        """Измерение и логирование длительности фазы запуска"""
+        started_at = time.perf_counter()
+        logger.info(f"Фаза запуска '{name}' начата")
+        yield
+        self.phases[name] = time.perf_counter() - started_at
+        logger.info(f"Фаза запуска '{name}' завершена за {self.phases[name]:.2f} с")
+
+    def _start_watch(self):
+        """Запуск отслеживания изменений файла конфигурации"""
+        poll_s = self.config['server'].get('config_poll_s', 2)
+        if not poll_s:
+            return
+        if self.models.remote:
+            # Модель загружена в процессах инференса, которые читают конфигурацию при запуске
+            logger.info("Горячая перезагрузка конфигурации недоступна в режиме раздельных процессов")
+            return
+        self._watch_task = asyncio.create_task(self._watch_config(poll_s))
+
+    async def _watch_config(self, poll_s: float):
+        """Проверка файла конфигурации и применение изменений"""
+        while True:
+            await asyncio.sleep(poll_s)
+            try:
+                config = await run_in_threadpool(read_changed_config)
+                if config is not None:
+                    await self.reload(config)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Конфигурация не применена, продолжает действовать прежняя: {str(e)}")
+
+    async def reload(self, config: Dict[str, Any]):
+        """Применение новой конфигурации без перезапуска.
+
+        Параметры, читаемые при каждом запросе (VAD, фрагменты, лимиты
+        загрузки, декодирование), действуют со следующего запроса; модель с
+        измененными параметрами загрузки заменяется после прогрева.
+        """
+        logger.info("Файл конфигурации изменен, применение новой конфигурации")
+        if config.get('autotune', {}).get('enabled', False):
+            # Только сохраненное решение: замер на работающем сервере конкурировал бы
+            # с обработкой запросов, поэтому новый замер откладывается до перезапуска
+            config = await run_in_threadpool(apply_autotune, config, cached_only=True)
+
+        for path in RESTART_KEYS:
+            if self._lookup(self.config, path) != self._lookup(config, path):
+                logger.warning(f"Параметр {'.'.join(path)} применится только после перезапуска сервера")
+
+        self.config = config
+        set_config(config)
+        await self.models.reload(config)
+        self.reloads += 1
+        logger.info("Новая конфигурация применена")
+
+    @staticmethod
+    def _lookup(config: Dict[str, Any], path: Tuple[str, ...]) -> Any:
+        """Значение параметра конфигурации по пути из секции и ключа"""
+        value: Any = config
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        return value
+
+    async def shutdown(self):
+        """Остановка исполнителей и выгрузка моделей"""
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            self._watch_task = None
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        self.ready = False
+        if self.models is not None:
+            await self.models.shutdown()
+
+runtime = Runtime()
@@ -2,7 +2,173 @@ import soundfile as sf
 import numpy as np
 from loguru import logger
 import tempfile
+import io
 import os
+from typing import BinaryIO, List, Optional, Tuple
+
+# Частота дискретизации, с которой работает Whisper
+TARGET_SAMPLE_RATE = 16000
+# Сколько кадров декодируется за один шаг (10 секунд при 16 kHz)
+DECODE_BLOCK_FRAMES = 160000
+# Допустимые параметры заголовка загруженного файла
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+MAX_CHANNELS = 8
+# Во сколько раз буфер декодирования может превышать объем 16 kHz моно той же длительности
+DECODED_SIZE_ALLOWANCE = 2
+
+class AudioTooLongError(ValueError):
+    """Длительность аудио превышает лимит"""
+
+    def __init__(self, duration: float, limit: float):
+        super().__init__(f"Длительность аудио {duration:.1f} с превышает лимит {limit:.0f} с")
+        self.duration = duration
+        self.limit = limit
+
+class DecodedAudioTooLargeError(AudioTooLongError):
+    """Буфер декодирования превышает лимит (частота или число каналов слишком велики для длительности)"""
+
+    def __init__(self, size: int, limit: int):
+        ValueError.__init__(self, f"Декодированное аудио ({size // (1024 * 1024)} МБ) превышает лимит "
+                                  f"{limit // (1024 * 1024)} МБ")
+        self.size = size
+        self.limit = limit
+
+def detect_audio_format(contents: bytes) -> str:
+    """Определение формата загруженного аудио по сигнатуре"""
+    if contents[:4] == b"fLaC":
+        return "flac"
+    if contents[:4] == b"OggS":
+        return "opus"
+    if contents[:4] == b"RIFF":
+        return "wav"
+    return "unknown"
+
+def decode_audio(contents: bytes) -> Tuple[np.ndarray, int]:
+    """Декодирование аудиофайла (WAV, FLAC, Ogg/Opus) из памяти сразу в float32"""
+    audio_data, sample_rate = sf.read(io.BytesIO(contents), dtype='float32')
+    return audio_data, sample_rate
+
+def max_decoded_bytes(max_duration_s: Optional[float]) -> Optional[int]:
+    """Предельный размер буфера декодирования для лимита длительности, байты"""
+    if not max_duration_s:
+        return None
+    return int(max_duration_s * TARGET_SAMPLE_RATE * 4 * DECODED_SIZE_ALLOWANCE)
+
+def decode_audio_file(source: BinaryIO, max_duration_s: Optional[float] = None) -> Tuple[np.ndarray, int]:
+    """Потоковое декодирование аудиофайла в заранее выделенный буфер float32.
+
+    До выделения памяти по заголовку файла проверяются частота
+    дискретизации, число каналов, длительность и размер буфера (не больше
+    DECODED_SIZE_ALLOWANCE объемов 16 kHz моно той же длительности), поэтому
+    поддельный заголовок не приводит к выделению гигабайт. Декодирование идет
+    блоками прямо в буфер, без промежуточных копий.
+    """
+    with sf.SoundFile(source) as f:
+        frames, sample_rate, channels = f.frames, f.samplerate, f.channels
+        if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+            raise ValueError(f"Недопустимая частота дискретизации: {sample_rate} Hz")
+        if not 1 <= channels <= MAX_CHANNELS:
+            raise ValueError(f"Недопустимое число каналов: {channels}")
+
+        duration = frames / sample_rate
+        if max_duration_s and duration > max_duration_s:
+            raise AudioTooLongError(duration, max_duration_s)
+        limit = max_decoded_bytes(max_duration_s)
+        if limit is not None and frames * channels * 4 > limit:
+            # Длительность в пределах лимита, но частота или число каналов раздувают буфер
+            raise DecodedAudioTooLargeError(frames * channels * 4, limit)
+
+        shape = (frames,) if channels == 1 else (frames, channels)
+        audio_data = np.empty(shape, dtype=np.float32)
+        position = 0
+        while position < frames:
+            block = f.read(dtype='float32', out=audio_data[position:position + DECODE_BLOCK_FRAMES])
+            if len(block) == 0:
+                break
+            position += len(block)
+    return audio_data[:position], sample_rate
+
+class PcmDecoder:
+    """Пошаговое преобразование потока PCM int16 в float32.
+
+    Если размер потока известен (Content-Length), буфер float32 выделяется
+    один раз заранее; иначе блоки собираются и объединяются в конце.
+    """
+
+    def __init__(self, channels: int = 1, expected_bytes: Optional[int] = None):
+        if channels < 1:
+            raise ValueError(f"Некорректное количество каналов: {channels}")
+        self.channels = channels
+        self._buffer = np.empty(expected_bytes // 2, dtype=np.float32) if expected_bytes else None
+        self._blocks: List[np.ndarray] = []
+        self._samples = 0
+        # Нечетный байт, оставшийся от предыдущего блока
+        self._tail = b""
+        self.bytes_received = 0
+
+    def feed(self, data: bytes):
+        """Преобразование очередного блока байт"""
+        self.bytes_received += len(data)
+        if self._tail:
+            data = self._tail + data
+        usable = len(data) - len(data) % 2
+        self._tail = data[usable:]
+        if usable == 0:
+            return
+
+        samples = np.frombuffer(data, dtype='<i2', count=usable // 2)
+        if self._buffer is not None and self._samples + len(samples) <= len(self._buffer):
+            target = self._buffer[self._samples:self._samples + len(samples)]
+            np.multiply(samples, 1.0 / 32768.0, out=target, casting='unsafe')
+        else:
+            if self._buffer is not None:
+                # Поток длиннее заявленного: дальше блоки собираются отдельно
+                self._blocks.append(self._buffer[:self._samples])
+                self._buffer = None
+            self._blocks.append(samples.astype(np.float32) * (1.0 / 32768.0))
+        self._samples += len(samples)
+
+    def result(self) -> np.ndarray:
+        """Декодированное аудио; при нескольких каналах - массив (кадры, каналы)"""
+        frame_size = 2 * self.channels
+        if self.bytes_received % frame_size != 0:
+            raise ValueError(f"Размер PCM-данных ({self.bytes_received} байт) не кратен размеру фрейма ({frame_size} байт)")
+
+        if self._buffer is not None:
+            audio_data = self._buffer[:self._samples]
+        elif self._blocks:
+            audio_data = np.concatenate(self._blocks).astype(np.float32, copy=False)
+        else:
+            audio_data = np.zeros(0, dtype=np.float32)
+
+        if self.channels > 1:
+            audio_data = audio_data.reshape(-1, self.channels)
+        return audio_data
+
+def synthetic_clip(seconds: float = 1.0) -> np.ndarray:
+    """Детерминированный синтетический клип для прогрева модели"""
+    t = np.arange(int(TARGET_SAMPLE_RATE * seconds), dtype=np.float32) / TARGET_SAMPLE_RATE
+    noise = np.random.default_rng(0).normal(0.0, 0.01, len(t)).astype(np.float32)
+    return (0.1 * np.sin(2 * np.pi * 220.0 * t) + noise).astype(np.float32)
+
+def pcm16_to_float32(contents: bytes, channels: int = 1) -> np.ndarray:
+    """Преобразование сырого PCM (int16, little-endian) в float32 без копирования на диск"""
+    if channels < 1:
+        raise ValueError(f"Некорректное количество каналов: {channels}")
+    
+    frame_size = 2 * channels
+    if len(contents) % frame_size != 0:
+        raise ValueError(f"Размер PCM-данных ({len(contents)} байт) не кратен размеру фрейма ({frame_size} байт)")
+    
+    samples = np.frombuffer(contents, dtype='<i2')
+    audio_data = samples.astype(np.float32)
+    audio_data *= 1.0 / 32768.0
+    
+    if channels > 1:
+        audio_data = audio_data.reshape(-1, channels)
+    
+    return audio_data
 
 def validate_audio(audio_data: np.ndarray, sample_rate: int) -> bool:
     """Проверка аудио на соответствие требованиям"""
@@ -10,14 +176,18 @@ def validate_audio(audio_data: np.ndarray, sample_rate: int) -> bool:
         logger.error("Аудио должно быть моно")
         return False
         
-    if sample_rate != 16000:
+    if sample_rate != TARGET_SAMPLE_RATE:
         logger.error(f"Частота дискретизации должна быть 16kHz, получено {sample_rate}Hz")
         return False
+    
+    if len(audio_data) == 0:
+        logger.error("Аудио не содержит данных")
+        return False
         
     return True
 
 def save_audio(audio_data: np.ndarray, sample_rate: int) -> str:
-    """Сохранение аудио во временный WAV файл"""
+    """Сохранение аудио во временный WAV файл (используется только в режиме отладки)"""
     try:
         with tempfile.NamedTemporaryFile(suffix='.wav', delete=False) as temp_file:
             sf.write(temp_file.name, audio_data, sample_rate)
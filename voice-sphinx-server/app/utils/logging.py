@@ -1,29 +1,112 @@
 from loguru import logger
-import json
+from typing import Any, Dict, Tuple
 import sys
+import threading
+import time
 
-def setup_logging(config_path: str = "config.json"):
-    """Настройка логирования"""
-    with open(config_path, 'r', encoding='utf-8') as f:
-        config = json.load(f)
-    
+# Номер уровня DEBUG в loguru
+DEBUG_LEVEL_NO = 10
+
+# Как выводить текст распознавания: full, truncate или redact
+_transcripts: Dict[str, Any] = {"mode": "truncate", "max_chars": 100}
+
+def transcript(text: str) -> str:
+    """Текст распознавания для лога: целиком, усеченный или скрытый по конфигурации"""
+    mode = _transcripts['mode']
+    if mode == "full":
+        return text
+    if mode == "redact":
+        return f"<скрыто, {len(text)} символов>"
+    max_chars = _transcripts['max_chars']
+    return text if len(text) <= max_chars else text[:max_chars] + "..."
+
+def is_request_record(record: Dict[str, Any]) -> bool:
+    """Структурированная запись о запросе (выводится в отдельный файл)"""
+    return "request_record" in record['extra']
+
+class DebugRateLimit:
+    """Фильтр loguru: не больше rate_per_s отладочных строк в секунду с одного места вызова.
+
+    Фильтр вызывается в потоке, который пишет в лог, до постановки записи в
+    очередь, поэтому отброшенные строки ничего не стоят. Записи о запросах
+    в основной лог не попадают.
+    """
+
+    def __init__(self, rate_per_s: float):
+        self.rate = rate_per_s
+        self.dropped = 0
+        # Место вызова -> (доступные строки, время обновления)
+        self._buckets: Dict[Tuple[str, int], Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record: Dict[str, Any]) -> bool:
+        if is_request_record(record):
+            return False
+        if not self.rate or record['level'].no > DEBUG_LEVEL_NO:
+            return True
+
+        key = (record['name'], record['line'])
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.rate, now))
+            tokens = min(self.rate, tokens + (now - updated_at) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self.dropped += 1
+                return False
+            self._buckets[key] = (tokens - 1, now)
+        return True
+
+def setup_logging(config: Dict[str, Any]):
+    """Настройка логирования.
+
+    Вывод выполняется фоновым потоком loguru (enqueue): запись в файл или
+    консоль не задерживает обработку запросов. Для каждого запроса в
+    logging.request_log пишется одна JSON-строка.
+    """
     log_level = config['server']['log_level']
-    
+    logging_config = config.get('logging', {})
+    enqueue = logging_config.get('enqueue', True)
+    debug_rate = logging_config.get('debug_rate_per_s', 20)
+
+    _transcripts['mode'] = logging_config.get('transcripts', "truncate")
+    _transcripts['max_chars'] = logging_config.get('transcript_max_chars', 100)
+
     # Удаляем стандартный обработчик
     logger.remove()
-    
+
+    # Идентификатор запроса добавляется в каждую строку лога ("-" вне запроса)
+    logger.configure(extra={"request_id": "-"})
+
     # Добавляем вывод в консоль
     logger.add(
         sys.stderr,
-        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
-        level=log_level.upper()
+        format="<green>{time:YYYY-MM-DD HH:mm:ss}</green> | <level>{level: <8}</level> | <magenta>{extra[request_id]}</magenta> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>",
+        level=log_level.upper(),
+        filter=DebugRateLimit(debug_rate),
+        enqueue=enqueue
     )
-    
+
     # Добавляем вывод в файл
     logger.add(
         "logs/server.log",
         rotation="500 MB",
         retention="10 days",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
-        level=log_level.upper()
-    ) 
\ No newline at end of file
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {extra[request_id]} | {name}:{function}:{line} - {message}",
+        level=log_level.upper(),
+        filter=DebugRateLimit(debug_rate),
+        enqueue=enqueue
+    )
+
+    # Структурированные записи о запросах: одна JSON-строка на запрос
+    request_log = logging_config.get('request_log', "logs/requests.jsonl")
+    if request_log:
+        logger.add(
+            request_log,
+            rotation="500 MB",
+            retention="10 days",
+            format="{message}",
+            level="INFO",
+            filter=is_request_record,
+            enqueue=enqueue
+        )
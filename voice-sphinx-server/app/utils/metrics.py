@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+from prometheus_client import Counter, Gauge, Histogram
+from typing import List
+import time
+
+from .audio import TARGET_SAMPLE_RATE
+from .tracing import record_timing
+
+# Метки ограничены небольшими наборами значений (этап, эндпоинт, код ответа,
+# модель), чтобы сбор метрик каждые несколько секунд оставался дешевым
+
+# Границы гистограмм этапов: от 1 мс до 60 с
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# Границы гистограммы real-time factor
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5)
+
+STAGE_SECONDS = Histogram(
+    "voice_sphinx_stage_seconds",
+    "Длительность этапов обработки запроса",
+    ["stage"],
+    buckets=STAGE_BUCKETS
+)
+
+REQUESTS = Counter(
+    "voice_sphinx_requests_total",
+    "Число запросов",
+    ["endpoint"]
+)
+
+ERRORS = Counter(
+    "voice_sphinx_errors_total",
+    "Число запросов, завершившихся ошибкой",
+    ["endpoint", "status"]
+)
+
+AUDIO_SECONDS = Counter(
+    "voice_sphinx_audio_seconds_total",
+    "Секунды аудио, обработанные моделью",
+    ["model"]
+)
+
+INFERENCE_SECONDS = Counter(
+    "voice_sphinx_inference_seconds_total",
+    "Суммарное время инференса",
+    ["model"]
+)
+
+REAL_TIME_FACTOR = Histogram(
+    "voice_sphinx_real_time_factor",
+    "Отношение времени инференса к длительности аудио",
+    ["model"],
+    buckets=RTF_BUCKETS
+)
+
+QUEUE_WAIT_SECONDS = Histogram(
+    "voice_sphinx_queue_wait_seconds",
+    "Ожидание задачи в очереди инференса по классу приоритета",
+    ["priority"],
+    buckets=STAGE_BUCKETS
+)
+
+IN_FLIGHT = Gauge(
+    "voice_sphinx_in_flight_requests",
+    "Запросы, обрабатываемые в данный момент",
+    multiprocess_mode="livesum"
+)
+
+MODELS_LOADED = Gauge(
+    "voice_sphinx_models_loaded",
+    "Число загруженных реплик модели",
+    multiprocess_mode="max"
+)
+
+def record_stage(stage: str, seconds: float):
+    """Учет длительности этапа, измеренной вне observe_stage"""
+    STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    record_timing(stage, seconds)
+
+@contextmanager
+def observe_stage(stage: str):
+    """Измерение длительности этапа обработки запроса"""
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started_at)
+
+def observe_inference(model: str, wait_times: List[float], audio_samples: int, run_time: float):
+    """Учет выполненного батча инференса: ожидание каждой задачи, время модели и RTF"""
+    for wait_time in wait_times:
+        STAGE_SECONDS.labels(stage="queue_wait").observe(wait_time)
+        STAGE_SECONDS.labels(stage="inference").observe(run_time)
+    if audio_samples <= 0:
+        return
+
+    audio_seconds = audio_samples / TARGET_SAMPLE_RATE
+    AUDIO_SECONDS.labels(model=model).inc(audio_seconds)
+    INFERENCE_SECONDS.labels(model=model).inc(run_time)
+    REAL_TIME_FACTOR.labels(model=model).observe(run_time / audio_seconds)
@@ -0,0 +1,38 @@
+from loguru import logger
+from typing import Optional
+import signal
+import threading
+import uvicorn
+
+from ..runtime import runtime
+
+class DrainingServer(uvicorn.Server):
+    """Сервер uvicorn с плавной остановкой по SIGTERM/SIGINT.
+
+    По первому сигналу сервер переходит в режим draining: новые запросы и
+    проверки готовности получают 503. Через drain_delay_s секунд (время,
+    за которое балансировщик исключает сервер) uvicorn перестает принимать
+    соединения и ждет завершения начатых запросов не дольше
+    timeout_graceful_shutdown, после чего останавливает приложение.
+    Повторный сигнал останавливает сервер без задержки.
+    """
+
+    def __init__(self, config: uvicorn.Config, drain_delay_s: float = 0.0):
+        super().__init__(config)
+        self.drain_delay_s = max(0.0, drain_delay_s)
+        self._delay_timer: Optional[threading.Timer] = None
+
+    def handle_exit(self, sig: int, frame) -> None:
+        if runtime.draining or not self.drain_delay_s:
+            if self._delay_timer is not None:
+                self._delay_timer.cancel()
+            runtime.begin_drain()
+            super().handle_exit(sig, frame)
+            return
+
+        logger.info(f"Получен сигнал {signal.Signals(sig).name}: остановка через {self.drain_delay_s:.0f} с")
+        runtime.begin_drain(self.drain_delay_s)
+        # Обработчик сигнала не должен блокироваться: остановка uvicorn откладывается таймером
+        self._delay_timer = threading.Timer(self.drain_delay_s, super().handle_exit, (sig, frame))
+        self._delay_timer.daemon = True
+        self._delay_timer.start()
@@ -0,0 +1,186 @@
+from collections import Counter
+from fastapi import Request
+from contextvars import ContextVar
+from loguru import logger
+from starlette.concurrency import run_in_threadpool
+from typing import Any, Dict, Optional
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+# Заголовок с идентификатором запроса (генерирует клиент)
+REQUEST_ID_HEADER = "X-Request-ID"
+# Максимальная длина принимаемого идентификатора
+MAX_REQUEST_ID_LENGTH = 64
+# Служебные пути не учитываются профилировщиком
+SERVICE_PATH_PREFIXES = ("/health", "/metrics", "/admin")
+
+# Длительности этапов текущего запроса для заголовка Server-Timing, секунды
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+# Поля структурированной записи о текущем запросе (модель, длительность аудио и т.д.)
+request_fields: ContextVar[Optional[Dict[str, Any]]] = ContextVar("request_fields", default=None)
+# Идентификатор текущего запроса (для логов батча из нескольких запросов)
+current_request_id: ContextVar[Optional[str]] = ContextVar("current_request_id", default=None)
+
+def make_request_id(value: Optional[str]) -> str:
+    """Идентификатор запроса из заголовка клиента или новый"""
+    if value and len(value) <= MAX_REQUEST_ID_LENGTH and value.isprintable():
+        return value
+    return uuid.uuid4().hex
+
+def record_timing(stage: str, seconds: float):
+    """Добавление длительности этапа к таймингам текущего запроса"""
+    timings = request_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def record_field(name: str, value: Any):
+    """Добавление поля к структурированной записи о текущем запросе"""
+    fields = request_fields.get()
+    if fields is not None:
+        fields[name] = value
+
+def server_timing_header(timings: Dict[str, float]) -> str:
+    """Значение заголовка Server-Timing: длительности этапов в миллисекундах"""
+    return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+class SamplingProfiler:
+    """Выборочный профилировщик стеков всех потоков процесса.
+
+    Фоновый поток с заданным интервалом снимает стеки через
+    sys._current_frames() на протяжении следующих N запросов и сохраняет
+    их в свернутом формате (folded stacks), который принимают flamegraph.pl
+    и speedscope.
+    """
+
+    def __init__(self, output_dir: str = "logs/profiles", interval_ms: float = 5):
+        self.output_dir = output_dir
+        self.interval = interval_ms / 1000
+        self.remaining = 0
+        self.last_dump: Optional[str] = None
+
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._started_at = 0.0
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def active(self) -> bool:
+        """Идет ли профилирование"""
+        return self._thread is not None
+
+    def start(self, requests: int):
+        """Профилирование следующих requests запросов"""
+        with self._lock:
+            if self._thread is not None:
+                raise RuntimeError("Профилирование уже запущено")
+            self.remaining = max(1, int(requests))
+            self._stacks = Counter()
+            self._samples = 0
+            self._started_at = time.time()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="sampling-profiler", daemon=True)
+            self._thread.start()
+        logger.info(f"Профилирование запущено на {self.remaining} запросов")
+
+    def request_finished(self):
+        """Учет завершенного запроса; после последнего профиль сохраняется"""
+        with self._lock:
+            if self._thread is None:
+                return
+            self.remaining -= 1
+            if self.remaining > 0:
+                return
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        thread.join()
+        self.last_dump = self._dump()
+
+    def _sample_loop(self):
+        """Снятие стеков всех потоков, кроме собственного"""
+        own_id = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self._stacks[";".join(reversed(stack))] += 1
+            self._samples += 1
+
+    def _dump(self) -> str:
+        """Сохранение профиля в формате folded stacks"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self._stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Профиль сохранен: {path} ({self._samples} выборок за {time.time() - self._started_at:.1f} с)")
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        """Состояние профилировщика"""
+        return {
+            "active": self.active,
+            "remaining_requests": self.remaining if self.active else 0,
+            "samples": self._samples,
+            "last_dump": self.last_dump,
+        }
+
+profiler = SamplingProfiler()
+
+def log_request_record(request: Request, request_id: str, status: int,
+                       timings: Dict[str, float], fields: Dict[str, Any]):
+    """Одна JSON-строка о запросе: идентификатор, статус, длительности этапов и поля обработчика"""
+    record = {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "request_id": request_id,
+        "method": request.method,
+        "path": request.url.path,
+        "status": status,
+        "duration_ms": round(timings["total"] * 1000, 1),
+        "stages_ms": {stage: round(seconds * 1000, 1) for stage, seconds in timings.items() if stage != "total"},
+        **fields,
+    }
+    logger.bind(request_record=True).info(json.dumps(record, ensure_ascii=False))
+
+async def trace_request(request: Request, call_next):
+    """Middleware: идентификатор запроса в логах, заголовок Server-Timing и запись о запросе"""
+    request_id = make_request_id(request.headers.get(REQUEST_ID_HEADER))
+    timings: Dict[str, float] = {}
+    fields: Dict[str, Any] = {}
+    timings_token = request_timings.set(timings)
+    fields_token = request_fields.set(fields)
+    request_id_token = current_request_id.set(request_id)
+    started_at = time.perf_counter()
+    status = 500
+    try:
+        with logger.contextualize(request_id=request_id):
+            response = await call_next(request)
+        status = response.status_code
+    finally:
+        request_timings.reset(timings_token)
+        request_fields.reset(fields_token)
+        current_request_id.reset(request_id_token)
+        timings["total"] = time.perf_counter() - started_at
+        if not request.url.path.startswith(SERVICE_PATH_PREFIXES):
+            log_request_record(request, request_id, status, timings, fields)
+
+    response.headers[REQUEST_ID_HEADER] = request_id
+    response.headers["Server-Timing"] = server_timing_header(timings)
+
+    if profiler.active and not request.url.path.startswith(SERVICE_PATH_PREFIXES):
+        await run_in_threadpool(profiler.request_finished)
+    return response
@@ -0,0 +1,81 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from loguru import logger
+from typing import Optional
+import time
+
+from ..config import get_config
+from .metrics import record_stage
+
+# Пути, для которых действует отдельный лимит загрузки
+JOBS_PATH_PREFIX = "/jobs"
+
+class UploadTooLargeError(HTTPException):
+    """Тело запроса превышает лимит загрузки"""
+
+    def __init__(self, limit: int):
+        super().__init__(status_code=413, detail=f"Размер загрузки превышает лимит {limit // (1024 * 1024)} МБ")
+        self.limit = limit
+
+def upload_limit_bytes(path: str) -> Optional[int]:
+    """Лимит размера тела запроса для пути, байты (None - без ограничения)"""
+    config = get_config()
+    if path.startswith(JOBS_PATH_PREFIX):
+        limit_mb = config.get('jobs', {}).get('max_upload_mb', 2048)
+    else:
+        limit_mb = config['server'].get('max_upload_mb', 100)
+    if not limit_mb:
+        return None
+    return int(limit_mb * 1024 * 1024)
+
+class UploadLimitMiddleware:
+    """ASGI middleware: ограничение размера тела запроса до его буферизации.
+
+    Запрос с Content-Length больше лимита отклоняется с 413 без чтения
+    тела. Если длина заранее неизвестна (chunked), тело считается по мере
+    поступления и чтение прерывается исключением UploadTooLargeError, как
+    только лимит превышен, - до того, как multipart-парсер или обработчик
+    сохранит тело целиком.
+
+    Здесь же измеряется этап upload_read: время от первого чтения тела до
+    получения его последней части. Для multipart-загрузки это единственное
+    место, где его можно измерить, потому что парсер Starlette получает
+    тело целиком до вызова обработчика.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] not in ("POST", "PUT"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = upload_limit_bytes(scope['path'])
+        headers = dict(scope['headers'])
+        content_length = headers.get(b'content-length')
+        if (limit is not None and content_length is not None and content_length.isdigit()
+                and int(content_length) > limit):
+            logger.warning(f"Загрузка отклонена: {int(content_length)} байт при лимите {limit} байт")
+            response = JSONResponse(status_code=413, content={"detail": UploadTooLargeError(limit).detail})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+        started_at: Optional[float] = None
+
+        async def limited_receive():
+            nonlocal received, started_at
+            if started_at is None:
+                started_at = time.perf_counter()
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if limit is not None and received > limit:
+                    logger.warning(f"Загрузка прервана: получено больше {limit} байт")
+                    raise UploadTooLargeError(limit)
+                if not message.get('more_body', False):
+                    record_stage("upload_read", time.perf_counter() - started_at)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,73 @@
+from loguru import logger
+from typing import List, Tuple
+import numpy as np
+
+from .audio import TARGET_SAMPLE_RATE
+
+class CompactedAudio:
+    """Аудио после удаления тишины и соответствие времени исходному аудио"""
+
+    def __init__(self, audio: np.ndarray, chunks: List[Tuple[int, int]], original_samples: int):
+        self.audio = audio
+        # Участки речи исходного аудио (начало, конец) в сэмплах
+        self.chunks = chunks
+        self.original_samples = original_samples
+
+    @property
+    def has_speech(self) -> bool:
+        """Найдена ли в аудио речь"""
+        return len(self.chunks) > 0
+
+    @property
+    def removed_seconds(self) -> float:
+        """Сколько секунд тишины удалено"""
+        return (self.original_samples - len(self.audio)) / TARGET_SAMPLE_RATE
+
+    @property
+    def boundaries(self) -> List[int]:
+        """Границы участков речи в сжатом аудио (места сокращенных пауз), сэмплы"""
+        result = []
+        position = 0
+        for start, end in self.chunks[:-1]:
+            position += end - start
+            result.append(position)
+        return result
+
+    def original_time(self, time: float) -> float:
+        """Перевод времени в сжатом аудио во время в исходном аудио, секунды"""
+        sample = time * TARGET_SAMPLE_RATE
+        compact_start = 0
+        for start, end in self.chunks:
+            length = end - start
+            if sample <= compact_start + length:
+                return (start + sample - compact_start) / TARGET_SAMPLE_RATE
+            compact_start += length
+        return self.original_samples / TARGET_SAMPLE_RATE
+
+def compact_silence(audio: np.ndarray, threshold: float = 0.5, min_silence_ms: int = 500,
+                    keep_silence_ms: int = 200, min_speech_ms: int = 250) -> CompactedAudio:
+    """Удаление тишины с помощью VAD (Silero из faster-whisper).
+
+    Паузы длиннее min_silence_ms сокращаются до keep_silence_ms, тишина в
+    начале и конце записи отбрасывается. Если речь не найдена, возвращается
+    пустое аудио.
+    """
+    # Импорт здесь: модель VAD нужна только при включенной предобработке
+    from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+    options = VadOptions(
+        threshold=threshold,
+        min_speech_duration_ms=min_speech_ms,
+        min_silence_duration_ms=min_silence_ms,
+        speech_pad_ms=keep_silence_ms // 2
+    )
+    timestamps = get_speech_timestamps(audio, vad_options=options)
+    chunks = [(item['start'], item['end']) for item in timestamps]
+
+    if not chunks:
+        return CompactedAudio(np.zeros(0, dtype=np.float32), [], len(audio))
+
+    compacted = np.concatenate([audio[start:end] for start, end in chunks])
+    result = CompactedAudio(compacted, chunks, len(audio))
+    logger.debug(f"VAD: {len(chunks)} участков речи, удалено {result.removed_seconds:.2f} с тишины")
+    return result
@@ -1,21 +1,42 @@
+import time
+
+# Время начала запуска процесса: отсчет фаз старта
+_process_started_at = time.perf_counter()
+
+import argparse
 import uvicorn
 from fastapi import FastAPI
 from loguru import logger
-import json
 import os
+import shutil
 
 from app.api.transcription import router as transcription_router
+from app.api.streaming import router as streaming_router
+from app.api.admin import router as admin_router
+from app.api.health import router as health_router
+from app.api.jobs import job_runner, router as jobs_router
+from app.api.metrics import router as metrics_router
+from app.config import load_config
+from app.models.autotune import apply_autotune
+from app.models.inference_process import start_inference_processes, stop_inference_processes
+from app.runtime import runtime
 from app.utils.logging import setup_logging
+from app.utils.shutdown import DrainingServer
+from app.utils.tracing import trace_request
+from app.utils.upload import UploadLimitMiddleware
+
+_imports_done_at = time.perf_counter()
 
 # Создаем директорию для логов
 os.makedirs("logs", exist_ok=True)
 
-# Настраиваем логирование
-setup_logging()
+# Загружаем конфигурацию (один раз за процесс)
+config = load_config()
 
-# Загружаем конфигурацию
-with open("config.json", 'r', encoding='utf-8') as f:
-    config = json.load(f)
+# Настраиваем логирование
+setup_logging(config)
+logger.info(f"Фаза запуска 'imports' завершена за {_imports_done_at - _process_started_at:.2f} с")
+logger.info(f"Фаза запуска 'config' завершена за {time.perf_counter() - _imports_done_at:.2f} с")
 
 app = FastAPI(
     title="VoiceSphinx Server",
@@ -23,23 +44,101 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Подключаем роутер
+# Ограничение размера загрузки до чтения тела запроса
+app.add_middleware(UploadLimitMiddleware)
+# Идентификатор запроса и Server-Timing
+app.middleware("http")(trace_request)
+
+# Подключаем роутеры
 app.include_router(transcription_router)
+app.include_router(streaming_router)
+app.include_router(health_router)
+app.include_router(metrics_router)
+app.include_router(admin_router)
+app.include_router(jobs_router)
+
+@app.on_event("startup")
+async def startup():
+    """Загрузка модели в фоне: сервер сразу принимает соединения, /health/ready сообщает о готовности"""
+    logger.info(f"Сервер принимает соединения через {time.perf_counter() - _process_started_at:.2f} с после запуска")
+    runtime.start(config)
+    # Фоновые задачи ждут готовности модели
+    job_runner.start(config)
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Остановка фоновых задач и исполнителя инференса.
+
+    К этому моменту uvicorn дождался завершения начатых HTTP-запросов;
+    фоновые задачи дораспознают текущий файл до срока остановки.
+    """
+    runtime.begin_drain()
+    await job_runner.shutdown(timeout=runtime.drain_remaining())
+    await runtime.shutdown()
+    # Дожидаемся вывода записей из очереди логирования
+    await logger.complete()
 
 @app.get("/")
 async def root():
     """Корневой эндпоинт"""
     return {
-        "status": "ok",
+        "status": "ok" if runtime.accepting else runtime.status,
         "message": "VoiceSphinx Server работает",
         "version": "1.0.0"
     }
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="VoiceSphinx Server")
+    parser.add_argument("--reload", action="store_true",
+                        help="Режим разработки: перезапуск при изменении кода")
+    args = parser.parse_args()
+
     server_config = config['server']
-    uvicorn.run(
-        "main:app",
-        host=server_config['host'],
-        port=server_config['port'],
-        reload=True
-    )
+    # Сколько ждать завершения начатых запросов при остановке, секунды
+    drain_timeout = server_config.get('drain_timeout_s', 60)
+    processes_config = config.get('processes', {})
+    if processes_config.get('enabled', False):
+        # Раздельные процессы: легкие HTTP-процессы и процессы инференса с моделью.
+        # Автонастройка выполняется до запуска процессов, HTTP-процессы берут решение из кэша
+        if config.get('autotune', {}).get('enabled', False):
+            config = apply_autotune(config)
+        inference_processes = start_inference_processes(config)
+
+        # Метрики HTTP-процессов собираются через общий каталог
+        metrics_dir = os.path.join(processes_config.get('socket_dir', "/tmp/voice-sphinx"), "metrics")
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir, exist_ok=True)
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = metrics_dir
+        try:
+            uvicorn.run(
+                "main:app",
+                host=server_config['host'],
+                port=server_config['port'],
+                workers=processes_config.get('http_workers', 2),
+                log_level=server_config['log_level'].lower(),
+                timeout_graceful_shutdown=drain_timeout
+            )
+        finally:
+            stop_inference_processes(inference_processes)
+    elif args.reload:
+        # Перезагрузчик импортирует приложение заново в дочернем процессе
+        uvicorn.run(
+            "main:app",
+            host=server_config['host'],
+            port=server_config['port'],
+            reload=True
+        )
+    else:
+        # Рабочий режим: без перезагрузчика и повторного импорта модуля;
+        # по SIGTERM сервер сначала сообщает балансировщику об остановке
+        server = DrainingServer(
+            uvicorn.Config(
+                app,
+                host=server_config['host'],
+                port=server_config['port'],
+                log_level=server_config['log_level'].lower(),
+                timeout_graceful_shutdown=drain_timeout
+            ),
+            drain_delay_s=server_config.get('drain_delay_s', 0)
+        )
+        server.run()
@@ -0,0 +1,40 @@
+"""Автонастройка типа вычислений, числа потоков и реплик модели.
+
+Замеряет варианты настройки на эталонном клипе на текущей машине, выбирает
+вариант с наибольшей пропускной способностью при заданной задержке p95
+(autotune.latency_target_ms) и сохраняет решение в autotune.cache_path.
+Сервер с autotune.enabled использует сохраненное решение при запуске.
+
+Примеры:
+    python scripts/autotune.py             # замер, если решения для машины еще нет
+    python scripts/autotune.py --force     # повторный замер
+"""
+import argparse
+import json
+import os
+import sys
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import load_config
+from app.models.autotune import autotune
+from app.utils.logging import setup_logging
+
+def main():
+    parser = argparse.ArgumentParser(description="Автонастройка модели VoiceSphinx Server")
+    parser.add_argument("--config", default=None, help="Файл конфигурации сервера (по умолчанию config.json)")
+    parser.add_argument("--force", action="store_true", help="Замерить заново, даже если решение сохранено")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    os.makedirs("logs", exist_ok=True)
+    setup_logging(config)
+
+    decision = autotune(config, force=args.force)
+    if decision is None:
+        raise SystemExit("Задайте autotune.reference_clip: WAV 16 kHz с речью длиной 10-30 секунд")
+    print(json.dumps(decision, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,380 @@
+"""Нагрузочное тестирование сервера транскрипции.
+
+Воспроизводит каталог WAV-файлов на POST /transcribe с фиксированной
+конкурентностью (--concurrency) или с фиксированной частотой поступления
+запросов (--rate) и выводит пропускную способность, перцентили задержки,
+долю ошибок и real-time factor. Результаты сохраняются в JSON и могут
+сравниваться с сохраненным базовым прогоном (--baseline).
+
+В режиме --stub скрипт сам запускает сервер с заглушкой модели
+(model.stub), чтобы измерить накладные расходы HTTP и приема аудио без GPU.
+
+Примеры:
+    python scripts/bench.py samples/ --concurrency 4 --requests 200
+    python scripts/bench.py samples/ --rate 10 --duration 60 --output run.json --baseline base.json
+    python scripts/bench.py samples/ --stub --stub-delay-ms 50 --concurrency 8
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse
+
+from loguru import logger
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(SERVER_DIR)
+
+# Метрики, по которым сравнивается прогон с базовым: True - чем больше, тем лучше
+COMPARED_METRICS = {
+    "throughput_rps": True,
+    "latency_p50_ms": False,
+    "latency_p95_ms": False,
+    "latency_p99_ms": False,
+    "error_rate": False,
+    "rtf_mean": False,
+}
+
+class Clip:
+    """Аудиофайл, подготовленный к отправке"""
+
+    def __init__(self, path: str, mode: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            data = f.read()
+        with wave.open(path, 'rb') as wav_file:
+            self.duration = wav_file.getnframes() / wav_file.getframerate()
+            sample_rate = wav_file.getframerate()
+            channels = wav_file.getnchannels()
+            frames = wav_file.readframes(wav_file.getnframes())
+
+        if mode == "pcm":
+            self.body = frames
+            self.headers = {
+                "Content-Type": "application/octet-stream",
+                "X-Sample-Rate": str(sample_rate),
+                "X-Channels": str(channels),
+            }
+        else:
+            boundary = uuid.uuid4().hex
+            self.body = (
+                f"--{boundary}\r\n"
+                f"Content-Disposition: form-data; name=\"file\"; filename=\"{os.path.basename(path)}\"\r\n"
+                f"Content-Type: audio/wav\r\n\r\n"
+            ).encode('utf-8') + data + f"\r\n--{boundary}--\r\n".encode('utf-8')
+            self.headers = {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+def load_clips(directory: str, mode: str) -> List[Clip]:
+    """Загрузка всех WAV-файлов каталога"""
+    paths = sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.lower().endswith(".wav")
+    )
+    if not paths:
+        raise SystemExit(f"В каталоге {directory} нет WAV-файлов")
+    return [Clip(path, mode) for path in paths]
+
+def parse_server_timing(value: Optional[str]) -> Dict[str, float]:
+    """Разбор заголовка Server-Timing: этап -> миллисекунды"""
+    timings = {}
+    for item in (value or "").split(","):
+        name, _, params = item.strip().partition(";")
+        if params.startswith("dur="):
+            timings[name] = float(params[4:])
+    return timings
+
+class Runner:
+    """Отправка запросов и сбор результатов"""
+
+    def __init__(self, url: str, clips: List[Clip], timeout: float):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.path = parsed.path or "/transcribe"
+        self.clips = clips
+        self.timeout = timeout
+        self.results: List[Dict[str, Any]] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._counter = 0
+
+    def _connection(self) -> http.client.HTTPConnection:
+        """Keep-alive соединение текущего потока"""
+        if getattr(self._local, "connection", None) is None:
+            self._local.connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._local.connection
+
+    def _next_clip(self) -> Clip:
+        """Файлы воспроизводятся по кругу"""
+        with self._lock:
+            clip = self.clips[self._counter % len(self.clips)]
+            self._counter += 1
+        return clip
+
+    def send(self, scheduled_at: Optional[float] = None):
+        """Один запрос. Задержка отсчитывается от запланированного времени
+        отправки, чтобы очередь на стороне клиента не скрывала задержки сервера."""
+        clip = self._next_clip()
+        started_at = scheduled_at if scheduled_at is not None else time.perf_counter()
+        result = {"file": os.path.basename(clip.path), "audio_seconds": clip.duration}
+        try:
+            connection = self._connection()
+            headers = dict(clip.headers, **{"X-Request-ID": uuid.uuid4().hex})
+            connection.request("POST", self.path, body=clip.body, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            result["status"] = response.status
+            result["timings"] = parse_server_timing(response.getheader("Server-Timing"))
+        except Exception as e:
+            result["status"] = None
+            result["error"] = str(e)
+            self._local.connection = None
+        result["latency"] = time.perf_counter() - started_at
+
+        with self._lock:
+            self.results.append(result)
+
+    def run_concurrency(self, concurrency: int, requests: Optional[int], duration: Optional[float]):
+        """Замкнутая нагрузка: concurrency клиентов, каждый отправляет запросы подряд"""
+        deadline = time.perf_counter() + duration if duration else None
+        remaining = [requests]
+
+        def client():
+            while True:
+                with self._lock:
+                    if remaining[0] is not None:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                if deadline is not None and time.perf_counter() >= deadline:
+                    return
+                self.send()
+
+        threads = [threading.Thread(target=client) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def run_rate(self, rate: float, requests: Optional[int], duration: Optional[float], max_in_flight: int):
+        """Открытая нагрузка: запросы отправляются с фиксированной частотой независимо от ответов"""
+        total = requests if requests is not None else int(rate * duration)
+        interval = 1.0 / rate
+        started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+            for i in range(total):
+                scheduled_at = started_at + i * interval
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                pool.submit(self.send, scheduled_at)
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Сводные метрики прогона"""
+    ok = [r for r in results if r["status"] == 200]
+    latencies = [r["latency"] for r in ok]
+    audio_seconds = sum(r["audio_seconds"] for r in ok)
+    rtfs = [r["latency"] / r["audio_seconds"] for r in ok if r["audio_seconds"] > 0]
+    model_rtfs = [r["timings"]["inference"] / 1000 / r["audio_seconds"]
+                  for r in ok if "inference" in r.get("timings", {}) and r["audio_seconds"] > 0]
+
+    def ms(value: Optional[float]) -> Optional[float]:
+        return round(value * 1000, 1) if value is not None else None
+
+    statuses: Dict[str, int] = {}
+    for r in results:
+        key = str(r["status"]) if r["status"] is not None else "connection_error"
+        statuses[key] = statuses.get(key, 0) + 1
+
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "error_rate": round(1 - len(ok) / len(results), 4) if results else None,
+        "statuses": statuses,
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed > 0 else None,
+        "audio_seconds_per_second": round(audio_seconds / elapsed, 2) if elapsed > 0 else None,
+        "latency_p50_ms": ms(percentile(latencies, 50)),
+        "latency_p95_ms": ms(percentile(latencies, 95)),
+        "latency_p99_ms": ms(percentile(latencies, 99)),
+        "latency_max_ms": ms(max(latencies) if latencies else None),
+        # Задержка запроса относительно длительности аудио
+        "rtf_mean": round(sum(rtfs) / len(rtfs), 4) if rtfs else None,
+        # Время модели (inference из Server-Timing) относительно длительности аудио
+        "model_rtf_mean": round(sum(model_rtfs) / len(model_rtfs), 4) if model_rtfs else None,
+    }
+
+def compare(summary: Dict[str, Any], baseline: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Сравнение с базовым прогоном: изменение метрик в процентах"""
+    comparison = {}
+    for metric, higher_is_better in COMPARED_METRICS.items():
+        current, base = summary.get(metric), baseline.get(metric)
+        if current is None or base is None:
+            continue
+        change = (current - base) / base * 100 if base else 0.0
+        regression = change < 0 if higher_is_better else change > 0
+        comparison[metric] = {
+            "baseline": base,
+            "current": current,
+            "change_pct": round(change, 1),
+            "regression": regression and change != 0,
+        }
+    return comparison
+
+def free_port() -> int:
+    """Свободный TCP-порт для сервера-заглушки"""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def start_stub_server(config_path: str, delay_ms: float, rtf: float, timeout: float = 60):
+    """Запуск сервера с заглушкой модели; возвращает процесс и URL"""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    port = free_port()
+    config['model']['stub'] = {"delay_ms": delay_ms, "rtf": rtf}
+    config['model']['replicas'] = []
+    config['server'].update(host="127.0.0.1", port=port)
+    config.setdefault('cache', {})['enabled'] = False
+    config.setdefault('processes', {})['enabled'] = False
+
+    stub_config = tempfile.NamedTemporaryFile('w', suffix=".json", delete=False, encoding='utf-8')
+    json.dump(config, stub_config)
+    stub_config.close()
+
+    env = dict(os.environ, VOICE_SPHINX_CONFIG=stub_config.name)
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=SERVER_DIR, env=env)
+
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit("Сервер-заглушка завершился при запуске")
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/health/ready")
+            if connection.getresponse().status == 200:
+                return process, f"http://127.0.0.1:{port}/transcribe", stub_config.name
+        except OSError:
+            pass
+        time.sleep(0.2)
+
+    process.terminate()
+    raise SystemExit("Сервер-заглушка не стал готов вовремя")
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочное тестирование VoiceSphinx Server")
+    parser.add_argument("audio_dir", help="Каталог с WAV-файлами (16 kHz моно)")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/transcribe", help="Адрес эндпоинта /transcribe")
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=None, help="Фиксированное число одновременных клиентов")
+    load.add_argument("--rate", type=float, default=None, help="Фиксированная частота запросов, запросов/с")
+    parser.add_argument("--requests", type=int, default=None, help="Число запросов")
+    parser.add_argument("--duration", type=float, default=None, help="Длительность прогона, с")
+    parser.add_argument("--max-in-flight", type=int, default=256, help="Предел одновременных запросов в режиме --rate")
+    parser.add_argument("--mode", choices=["multipart", "pcm"], default="multipart",
+                        help="Загрузка WAV-файлом или сырым PCM")
+    parser.add_argument("--warmup", type=int, default=2, help="Прогревочные запросы перед измерением")
+    parser.add_argument("--timeout", type=float, default=120, help="Таймаут запроса, с")
+    parser.add_argument("--output", help="Файл для сохранения результатов в JSON")
+    parser.add_argument("--baseline", help="JSON базового прогона для сравнения")
+    parser.add_argument("--fail-on-regression", type=float, default=None,
+                        help="Код возврата 1, если метрика ухудшилась больше чем на указанный процент")
+    parser.add_argument("--stub", action="store_true", help="Запустить сервер с заглушкой модели")
+    parser.add_argument("--stub-delay-ms", type=float, default=50, help="Задержка заглушки на вызов, мс")
+    parser.add_argument("--stub-rtf", type=float, default=0.0, help="Дополнительная задержка заглушки на секунду аудио")
+    parser.add_argument("--config", default=os.path.join(SERVER_DIR, "config.json"),
+                        help="Конфигурация сервера для режима --stub")
+    args = parser.parse_args()
+
+    if args.concurrency is None and args.rate is None:
+        args.concurrency = 1
+    if args.requests is None and args.duration is None:
+        args.requests = 100
+
+    clips = load_clips(args.audio_dir, args.mode)
+    logger.info(f"Загружено файлов: {len(clips)}, общая длительность {sum(c.duration for c in clips):.1f} с")
+
+    server = None
+    stub_config_path = None
+    url = args.url
+    if args.stub:
+        server, url, stub_config_path = start_stub_server(args.config, args.stub_delay_ms, args.stub_rtf)
+        logger.info(f"Сервер-заглушка запущен: {url}")
+
+    try:
+        if args.warmup > 0:
+            warmup = Runner(url, clips, args.timeout)
+            for _ in range(args.warmup):
+                warmup.send()
+
+        runner = Runner(url, clips, args.timeout)
+        started_at = time.perf_counter()
+        if args.rate is not None:
+            logger.info(f"Открытая нагрузка: {args.rate} запросов/с")
+            runner.run_rate(args.rate, args.requests, args.duration, args.max_in_flight)
+        else:
+            logger.info(f"Замкнутая нагрузка: {args.concurrency} клиентов")
+            runner.run_concurrency(args.concurrency, args.requests, args.duration)
+        elapsed = time.perf_counter() - started_at
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+            os.unlink(stub_config_path)
+
+    summary = summarize(runner.results, elapsed)
+    report = {
+        "parameters": {
+            "url": url,
+            "concurrency": args.concurrency,
+            "rate": args.rate,
+            "requests": args.requests,
+            "duration": args.duration,
+            "mode": args.mode,
+            "stub": {"delay_ms": args.stub_delay_ms, "rtf": args.stub_rtf} if args.stub else None,
+            "files": len(clips),
+        },
+        "summary": summary,
+    }
+
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(summary, baseline.get("summary", baseline))
+        if args.fail_on_regression is not None:
+            for metric, item in report["comparison"].items():
+                if item["regression"] and abs(item["change_pct"]) > args.fail_on_regression:
+                    logger.error(f"Регрессия {metric}: {item['baseline']} -> {item['current']} ({item['change_pct']:+.1f}%)")
+                    exit_code = 1
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"Результаты сохранены в {args.output}")
+
+    sys.exit(exit_code)
+
+if __name__ == "__main__":
+    main()
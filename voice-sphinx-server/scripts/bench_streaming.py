@@ -0,0 +1,170 @@
+"""Измерение стоимости потокового распознавания.
+
+Подает запись в сессию потокового распознавания (StreamingSession) кадрами
+быстрее реального времени, без HTTP и WebSocket, и измеряет процессорное
+время процесса на секунду аудио для потоков разной длины. Если вычисления
+на шаге не зависят от длины потока, процессорное время на секунду аудио
+для 5, 30 и 120 с примерно одинаково, а среднее время шага в последней
+четверти потока не больше, чем в первой.
+
+Запись (WAV 16 kHz) повторяется по кругу до нужной длительности. Модель
+загружается в процессе по секции model конфигурации; параметры сессии
+берутся из секции streaming, порог тишины можно переопределить
+(--silence-rms 0 выключает пропуск пауз для сравнения).
+
+Примеры:
+    python scripts/bench_streaming.py --audio speech.wav
+    python scripts/bench_streaming.py --audio speech.wav --durations 5 30 120 --output streaming.json
+    python scripts/bench_streaming.py --audio speech.wav --silence-rms 0 --output no_skip.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import wave
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from loguru import logger
+
+# Добавляем корневую директорию проекта в PYTHONPATH
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(SERVER_DIR)
+
+from app.config import load_config
+from app.models.executor import InferenceExecutor
+from app.models.replica_pool import ReplicaPool
+from app.models.streaming import StreamingSession
+from app.utils.audio import TARGET_SAMPLE_RATE, pcm16_to_float32, synthetic_clip
+
+def load_wav(path: str) -> np.ndarray:
+    """Чтение WAV-файла PCM int16 16 kHz; многоканальная запись сводится в моно"""
+    with wave.open(path, 'rb') as wav_file:
+        if wav_file.getframerate() != TARGET_SAMPLE_RATE or wav_file.getsampwidth() != 2:
+            raise SystemExit(f"Ожидается WAV PCM int16 {TARGET_SAMPLE_RATE} Hz: {path}")
+        channels = wav_file.getnchannels()
+        audio = pcm16_to_float32(wav_file.readframes(wav_file.getnframes()), channels)
+    return audio.mean(axis=1) if channels > 1 else audio
+
+def mean_ms(values: List[float]) -> Optional[float]:
+    """Среднее в миллисекундах"""
+    return round(sum(values) / len(values) * 1000, 1) if values else None
+
+async def run_stream(executor: InferenceExecutor, audio: np.ndarray, streaming_config: Dict[str, Any],
+                     silence_rms: float, frame_ms: float) -> Dict[str, Any]:
+    """Один поток: подача аудио кадрами, шаги распознавания и завершение"""
+    session = StreamingSession(
+        executor,
+        step_ms=streaming_config.get('step_ms', 1000),
+        max_buffer_s=streaming_config.get('max_buffer_s', 30),
+        silence_rms=silence_rms
+    )
+    frame_samples = int(TARGET_SAMPLE_RATE * frame_ms / 1000)
+    # Процессорное время каждого шага (включая потоки реплик модели)
+    step_cpu: List[float] = []
+    finals = 0
+
+    cpu_started_at = time.process_time()
+    wall_started_at = time.perf_counter()
+    for start in range(0, len(audio), frame_samples):
+        session.append(audio[start:start + frame_samples])
+        if session.step_due:
+            step_started_at = time.process_time()
+            messages = await session.step()
+            step_cpu.append(time.process_time() - step_started_at)
+            finals += sum(1 for message in messages if message['type'] == "final")
+    finals += len(await session.finish())
+    cpu = time.process_time() - cpu_started_at
+    wall = time.perf_counter() - wall_started_at
+
+    duration = len(audio) / TARGET_SAMPLE_RATE
+    quarter = max(1, len(step_cpu) // 4)
+    stats = session.stats()
+    return {
+        "duration_s": round(duration, 1),
+        "cpu_s": round(cpu, 2),
+        "wall_s": round(wall, 2),
+        "cpu_per_audio_s": round(cpu / duration, 4),
+        "finals": finals,
+        **stats,
+        # Средняя длина окна, переданного модели
+        "window_s_mean": round(stats['recognized_seconds'] / stats['steps'], 2) if stats['steps'] else None,
+        "step_cpu_ms_first_quarter": mean_ms(step_cpu[:quarter]),
+        "step_cpu_ms_last_quarter": mean_ms(step_cpu[-quarter:]),
+    }
+
+async def run(config: Dict[str, Any], audio: np.ndarray, durations: List[float],
+              silence_rms: float, frame_ms: float) -> List[Dict[str, Any]]:
+    """Загрузка модели, прогрев и прогон потоков заданной длительности"""
+    pool = ReplicaPool(config=config)
+    executor = InferenceExecutor(pool)
+    executor.start()
+    try:
+        await pool.warmup(synthetic_clip())
+        results = []
+        for duration in durations:
+            # Запись повторяется по кругу до нужной длительности
+            stream_audio = np.resize(audio, int(duration * TARGET_SAMPLE_RATE)).astype(np.float32)
+            result = await run_stream(executor, stream_audio, config.get('streaming', {}), silence_rms, frame_ms)
+            logger.info(f"Поток {duration:.0f} с: {result['cpu_per_audio_s'] * 1000:.1f} мс CPU на секунду аудио, "
+                        f"шагов {result['steps']} (пропущено на тишине {result['silent_steps']}), "
+                        f"шаг {result['step_cpu_ms_first_quarter']} -> {result['step_cpu_ms_last_quarter']} мс CPU")
+            results.append(result)
+        return results
+    finally:
+        await executor.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость потокового распознавания VoiceSphinx Server")
+    parser.add_argument("--audio", help="WAV-файл с речью (16 kHz); по умолчанию синтетический сигнал")
+    parser.add_argument("--durations", type=float, nargs="+", default=[5, 30, 120],
+                        help="Длительности потоков, с")
+    parser.add_argument("--silence-rms", type=float, default=None,
+                        help="Порог RMS тишины (по умолчанию streaming.silence_rms, 0 - выключено)")
+    parser.add_argument("--frame-ms", type=float, default=100, help="Размер кадра, подаваемого в сессию, мс")
+    parser.add_argument("--config", default=os.path.join(SERVER_DIR, "config.json"), help="Конфигурация сервера")
+    parser.add_argument("--stub", action="store_true", help="Заглушка модели вместо Whisper (проверка скрипта)")
+    parser.add_argument("--output", help="Файл для сохранения результатов в JSON")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    # Одна реплика: измеряется стоимость одной сессии, а не параллелизм
+    config['model']['replicas'] = []
+    if args.stub:
+        config['model']['stub'] = {"delay_ms": 0, "rtf": 0.0}
+
+    if args.audio:
+        audio = load_wav(args.audio)
+    else:
+        logger.warning("Запись не задана (--audio): используется синтетический сигнал, результаты не отражают речь")
+        audio = synthetic_clip(10.0)
+
+    silence_rms = args.silence_rms
+    if silence_rms is None:
+        silence_rms = config.get('streaming', {}).get('silence_rms', 0.01)
+
+    results = asyncio.run(run(config, audio, args.durations, silence_rms, args.frame_ms))
+    report = {
+        "parameters": {
+            "audio": args.audio,
+            "model_size": config['model']['model_size'],
+            "device": config['model'].get('device'),
+            "step_ms": config.get('streaming', {}).get('step_ms', 1000),
+            "max_buffer_s": config.get('streaming', {}).get('max_buffer_s', 30),
+            "silence_rms": silence_rms,
+            "frame_ms": args.frame_ms,
+            "stub": args.stub,
+        },
+        "results": results,
+    }
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        logger.info(f"Результаты сохранены в {args.output}")
+
+if __name__ == "__main__":
+    main()